@@ -6,10 +6,13 @@ import os
 from flask import Flask
 from flask_cors import CORS
 from .extensions import db, migrate, login_manager
-from .config import get_config, CORSHeaderConfig
+from .config import get_config, CORSHeaderConfig, CommsConfig, JobConfig
 from .blueprints import register_blueprints
+from .utils.CheckKeys import init_key_registry
 from .schemas.container_ssh_refresh_task import start_container_ssh_refresh_scheduler
 from .schemas.container_cleanup_task import start_container_cleanup_scheduler
+from .schemas.machine_liveness_task import start_machine_liveness_monitor
+from .schemas.job_worker import start_job_workers
 
 
 def create_app(config: str | None = None):
@@ -28,14 +31,23 @@ def create_app(config: str | None = None):
     migrate.init_app(app, db)
     # cache.init_app(app)
     login_manager.init_app(app)
+    # Node 通信用的 RSA 密钥只在这里加载一次，后续按 mtime 热重载
+    init_key_registry(app)
 
     register_blueprints(app)
 
     # 启动“每5分钟刷新容器上次 SSH 登录时间”的后台任务。
     # Flask debug 模式下父进程和子进程都会执行 create_app，这里仅在 reloader 子进程启动任务，避免重复线程。
-    if (not app.debug) or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+    # TESTING 或 BACKGROUND_TASKS_ENABLED=false 时不启动任何后台任务，需要的测试自行启动。
+    background = app.config.get("BACKGROUND_TASKS_ENABLED", True) and not app.config.get("TESTING")
+    if background and ((not app.debug) or os.environ.get("WERKZEUG_RUN_MAIN") == "true"):
         start_container_ssh_refresh_scheduler(app, interval_seconds=300)
         # 启动容器定时清理任务（每20分钟扫描一次到期容器并释放）
         start_container_cleanup_scheduler(app, interval_seconds=1200)
+        # 启动机器存活监控（并发探测各节点，列表接口不再同步探测）
+        start_machine_liveness_monitor(app, interval_seconds=CommsConfig.MACHINE_LIVENESS_INTERVAL)
+        # 启动持久化任务队列执行器（创建/删除容器、机器维护过渡等耗时操作），并接管上次退出时未完成的任务
+        if JobConfig.JOB_WORKERS > 0:
+            start_job_workers(app, workers=JobConfig.JOB_WORKERS)
 
     return app
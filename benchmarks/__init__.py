@@ -0,0 +1,12 @@
+"""离线微基准（不依赖数据库与 Node），在仓库上级目录执行：python -m <包名>.benchmarks.<模块>"""
+
+import json
+import os
+
+
+def make_payload(size: int) -> bytes:
+    """与真实报文相近的 JSON 请求体（UTF-8），用随机十六进制填充到约 size 字节。"""
+    body = {"config": {"container_name": "bench_container", "pad": ""}}
+    base = len(json.dumps(body))
+    body["config"]["pad"] = os.urandom(max(0, size - base) // 2).hex()
+    return json.dumps(body).encode('utf-8')
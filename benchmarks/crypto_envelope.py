@@ -0,0 +1,242 @@
+"""
+CheckKeys 报文微基准：encryption -> signature -> decryption -> verify_signature -> get_verified_msg 各阶段
+以及完整往返（build_envelope + get_verified_msg）的 ops/s 与 p50/p99 延迟。
+
+- 离线运行：密钥在临时目录中生成，Ctrl 与 Node 使用同一对密钥（回环），不读取仓库中的 pem 文件
+- 单线程与线程池两种并发度（--threads 可重复）
+- cached：密钥已在 KeyRegistry 中；cold：每次操作前清空缓存，计入 PEM 解析开销（引入缓存前的行为）
+- --output 写出 JSON，--baseline 与之前保存的 JSON 逐项对比 ops/s
+
+    python -m <包名>.benchmarks.crypto_envelope [--payload-size BYTES ...] [--threads N ...] [--json] \\
+        [--output FILE] [--baseline FILE]
+"""
+
+import argparse
+import base64
+import datetime as dt
+import json
+import os
+import platform
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import cryptography
+from cryptography.hazmat.primitives import serialization
+
+from ..config import KeyConfig
+from ..utils import CheckKeys
+from ..utils.CheckKeys import ED25519, SIGNATURE_SUITES, KeyRegistry, generate_keys, generate_signing_keys
+from ..utils.node_transport import build_envelope
+from . import make_payload
+
+STAGES = ("encryption", "signature", "decryption", "verify_signature", "get_verified_msg", "envelope")
+KEY_MODES = ("cached", "cold")
+
+
+def _write_pem(path: str, key) -> str:
+    if hasattr(key, "private_bytes"):
+        data = key.private_bytes(encoding=serialization.Encoding.PEM,
+                                 format=serialization.PrivateFormat.PKCS8,
+                                 encryption_algorithm=serialization.NoEncryption())
+    else:
+        data = key.public_bytes(encoding=serialization.Encoding.PEM,
+                                format=serialization.PublicFormat.SubjectPublicKeyInfo)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def _loopback_registry(dir_path: str, suite: str) -> KeyRegistry:
+    """生成回环密钥：本端公钥同时作为“Node 公钥”，加密后可由本端私钥解密。"""
+    private_key, public_key = generate_keys()
+    private_path = _write_pem(os.path.join(dir_path, "private.pem"), private_key)
+    public_path = _write_pem(os.path.join(dir_path, "public.pem"), public_key)
+    signing_path = node_signing_path = None
+    if suite == ED25519:
+        signing_private, signing_public = generate_signing_keys(ED25519)
+        signing_path = _write_pem(os.path.join(dir_path, "signing_private.pem"), signing_private)
+        node_signing_path = _write_pem(os.path.join(dir_path, "signing_public.pem"), signing_public)
+    return KeyRegistry(private_path, public_path, public_path, signing_path, node_signing_path)
+
+
+def _stage_fns(message: str, suite: str) -> dict[str, Callable[[], object]]:
+    data = message.encode('utf-8')
+    enc = CheckKeys.encryption(message)
+    sig = CheckKeys.signature(message, suite)
+    received = {"message": enc, "signature": sig, "sig_suite": suite}
+
+    def _round_trip():
+        body = build_envelope(CheckKeys.encryption(message), CheckKeys.signature(message, suite), suite)
+        # Node 侧：base64 解码后校验
+        msg = CheckKeys.get_verified_msg({"message": base64.b64decode(body["message"]),
+                                          "signature": base64.b64decode(body["signature"]),
+                                          "sig_suite": body.get("sig_suite")})
+        if not msg:
+            raise RuntimeError("envelope round trip failed verification")
+
+    return {
+        "encryption": lambda: CheckKeys.encryption(message),
+        "signature": lambda: CheckKeys.signature(message, suite),
+        "decryption": lambda: CheckKeys.decryption(enc),
+        "verify_signature": lambda: CheckKeys.verify_signature(data, sig, suite),
+        "get_verified_msg": lambda: CheckKeys.get_verified_msg(received),
+        "envelope": _round_trip,
+    }
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def _measure(fn: Callable[[], object], iterations: int, threads: int,
+             before: Callable[[], None] | None = None) -> dict:
+    latencies = [0.0] * iterations
+
+    def _one(i: int) -> None:
+        if before is not None:
+            before()
+        started = time.perf_counter()
+        fn()
+        latencies[i] = time.perf_counter() - started
+
+    wall_started = time.perf_counter()
+    if threads <= 1:
+        for i in range(iterations):
+            _one(i)
+    else:
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="bench") as executor:
+            list(executor.map(_one, range(iterations)))
+    wall = time.perf_counter() - wall_started
+
+    latencies.sort()
+    return {
+        "ops_per_sec": iterations / wall if wall > 0 else float("inf"),
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "mean_ms": sum(latencies) / iterations * 1000,
+    }
+
+
+def run(iterations: int = 200, payload_sizes: list[int] | None = None, threads: list[int] | None = None,
+        key_modes: list[str] | None = None, stages: list[str] | None = None,
+        suite: str | None = None, warmup: int = 5) -> dict:
+    """
+    返回 {"meta": {...}, "results": [...]}；results 每项为一个 (stage, payload_bytes, threads, keys) 组合：
+    {"stage", "suite", "payload_bytes", "threads", "keys", "iterations", "ops_per_sec", "p50_ms", "p99_ms", "mean_ms"}
+    基准期间临时替换 CheckKeys.key_registry，结束后恢复。
+    """
+    suite = suite or KeyConfig.SIGNATURE_SUITE
+    if suite not in SIGNATURE_SUITES:
+        raise ValueError(f"unknown signature suite: {suite}")
+    payload_sizes = payload_sizes or [256, 4096, 65536]
+    threads = threads or [1, os.cpu_count() or 4]
+    key_modes = key_modes or list(KEY_MODES)
+    stages = stages or list(STAGES)
+
+    results = []
+    original = CheckKeys.key_registry
+    with tempfile.TemporaryDirectory(prefix="bench-keys-") as dir_path:
+        registry = _loopback_registry(dir_path, suite)
+        CheckKeys.key_registry = registry
+        try:
+            for size in payload_sizes:
+                message = make_payload(size).decode('utf-8')
+                registry.preload()
+                fns = _stage_fns(message, suite)
+                for stage in stages:
+                    for _ in range(warmup):
+                        fns[stage]()
+                    for mode in key_modes:
+                        # 线程池下 cold 模式各线程会互相填充缓存，结果介于 cold 与 cached 之间
+                        before = registry.clear if mode == "cold" else None
+                        registry.preload()
+                        for n in threads:
+                            stats = _measure(fns[stage], iterations, n, before)
+                            results.append({
+                                "stage": stage,
+                                "suite": suite,
+                                "payload_bytes": len(message),
+                                "threads": n,
+                                "keys": mode,
+                                "iterations": iterations,
+                                **stats,
+                            })
+        finally:
+            CheckKeys.key_registry = original
+
+    meta = {
+        "python": platform.python_version(),
+        "cryptography": cryptography.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "created_at": dt.datetime.utcnow().isoformat(timespec="seconds") + "Z",
+    }
+    return {"meta": meta, "results": results}
+
+
+def _result_key(r: dict) -> tuple:
+    return (r["stage"], r["suite"], r["payload_bytes"], r["threads"], r["keys"])
+
+
+def compare(baseline: dict, current: dict) -> list[dict]:
+    """逐项对比两次结果：ops_change 为 ops/s 的相对变化（-0.2 表示慢了 20%）；只保留两边都有的组合。"""
+    old = {_result_key(r): r for r in baseline.get("results", [])}
+    out = []
+    for r in current.get("results", []):
+        prev = old.get(_result_key(r))
+        if prev is None or not prev.get("ops_per_sec"):
+            continue
+        out.append({
+            "stage": r["stage"], "suite": r["suite"], "payload_bytes": r["payload_bytes"],
+            "threads": r["threads"], "keys": r["keys"],
+            "baseline_ops": prev["ops_per_sec"], "ops_per_sec": r["ops_per_sec"],
+            "ops_change": r["ops_per_sec"] / prev["ops_per_sec"] - 1,
+            "p99_change": (r["p99_ms"] / prev["p99_ms"] - 1) if prev.get("p99_ms") else None,
+        })
+    return out
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="CheckKeys 报文各阶段与完整往返的吞吐/延迟")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--payload-size", type=int, action="append", help="可重复，默认 256/4096/65536")
+    parser.add_argument("--threads", type=int, action="append", help="可重复，默认 1 与 CPU 核数")
+    parser.add_argument("--keys", action="append", choices=KEY_MODES, help="可重复，默认 cached 与 cold")
+    parser.add_argument("--stage", action="append", choices=STAGES, help="可重复，默认全部")
+    parser.add_argument("--suite", choices=sorted(SIGNATURE_SUITES), help="默认 KeyConfig.SIGNATURE_SUITE")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出到标准输出")
+    parser.add_argument("--output", help="把 JSON 结果写入文件，便于不同版本之间对比")
+    parser.add_argument("--baseline", help="之前 --output 保存的 JSON，输出 ops/s 变化")
+    args = parser.parse_args(argv)
+
+    report = run(args.iterations, args.payload_size, args.threads, args.keys, args.stage, args.suite)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    diff = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            diff = compare(json.load(f), report)
+    if args.json:
+        if diff is not None:
+            report = dict(report, comparison=diff)
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'stage':<18}{'bytes':>8}{'thr':>5}{'keys':>8}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for r in report["results"]:
+        print(f"{r['stage']:<18}{r['payload_bytes']:>8}{r['threads']:>5}{r['keys']:>8}"
+              f"{r['ops_per_sec']:>12.0f}{r['p50_ms']:>10.3f}{r['p99_ms']:>10.3f}")
+    if diff:
+        print(f"\nvs baseline {args.baseline}:")
+        for d in diff:
+            print(f"{d['stage']:<18}{d['payload_bytes']:>8}{d['threads']:>5}{d['keys']:>8}{d['ops_change']:>+12.1%}")
+
+
+if __name__ == "__main__":
+    main()
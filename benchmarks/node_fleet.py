@@ -0,0 +1,547 @@
+"""
+本地模拟 Node 集群：在一个进程中启动 N 个假 Node，供压测 Ctrl（心跳、调度、批量接口、列表查询）使用。
+
+- 每个假 Node 监听独立的回环地址 127.0.x.y，所有 Node 共用同一端口（与真实部署中每台机器都是 :5789 一致），
+  Ctrl 只需把 CommsConfig.NODE_URL_MIDDLE 指向该端口
+- 使用真实报文：RSA 报文（CheckKeys.get_verified_msg）、会话通道（node_session.NodeSessionStore）、/batch 批量报文
+- 可配置的延迟分布、失败率/丢连接率、容器状态过渡（creating/starting/stopping 经过一段时间后到达终态）
+- 仅支持 Linux（整个 127.0.0.0/8 均为回环地址）
+
+    python -m <包名>.benchmarks.node_fleet --nodes 200 --containers-per-node 25 --latency lognormal:20,0.5 \\
+        [--failure-rate 0.01] [--drop-rate 0] [--port 5789] [--ephemeral-keys] [--probe] [--json]
+
+不带 --probe 时常驻运行直到 Ctrl-C；--probe 对整个集群做一轮 /machine_status + /container_status 巡检并输出耗时。
+代码中使用：
+
+    with FakeNodeFleet(FleetConfig(nodes=200, containers_per_node=25)) as fleet:
+        CommsConfig.NODE_URL_MIDDLE = fleet.url_middle
+        fleet.seed_database()        # 在 app_context 中写入对应的 machines / containers 记录
+        ...
+"""
+
+import argparse
+import base64
+import datetime as dt
+import json
+import math
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ..config import KeyConfig
+from ..constant import ContainerStatus, MachineStatus
+from ..utils import CheckKeys
+from ..utils.CheckKeys import KeyRegistry
+from ..utils.node_session import HANDSHAKE_ENDPOINT, NodeSessionStore, SessionError, is_session_message
+from ..utils.node_transport import BATCH_ENDPOINT
+
+
+@dataclass
+class Latency:
+    """
+    响应延迟分布，单位毫秒：
+    fixed:a / uniform:a,b / exponential:a（均值）/ lognormal:a,b（中位数 a，对数标准差 b）
+    """
+    kind: str = "fixed"
+    a: float = 0.0
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "Latency":
+        kind, _, params = spec.partition(":")
+        values = [float(v) for v in params.split(",") if v.strip()] if params else []
+        if kind not in ("fixed", "uniform", "exponential", "lognormal"):
+            raise ValueError(f"unknown latency distribution: {kind}")
+        return cls(kind, *(values + [0.0, 0.0])[:2])
+
+    def sample(self, rng: random.Random) -> float:
+        """返回秒。"""
+        if self.kind == "uniform":
+            ms = rng.uniform(self.a, max(self.a, self.b))
+        elif self.kind == "exponential":
+            ms = rng.expovariate(1.0 / self.a) if self.a > 0 else 0.0
+        elif self.kind == "lognormal":
+            ms = rng.lognormvariate(math.log(self.a), self.b) if self.a > 0 else 0.0
+        else:
+            ms = self.a
+        return max(0.0, ms) / 1000
+
+
+@dataclass
+class FleetConfig:
+    nodes: int = 10
+    containers_per_node: int = 0
+    port: int = 0
+    latency: Latency = field(default_factory=Latency)
+    # 按接口覆盖延迟，如 {"/create_container": Latency("uniform", 500, 2000)}
+    endpoint_latency: dict[str, Latency] = field(default_factory=dict)
+    # 返回 500 + error_reason 的概率（批量报文中按条计算）
+    failure_rate: float = 0.0
+    # 读完请求后直接断开连接、不返回响应的概率（Ctrl 侧表现为网络错误）
+    drop_rate: float = 0.0
+    # creating/starting/stopping 到达终态所需秒数，以及以 failed 结束的概率
+    transition_seconds: float = 1.0
+    transition_failure_rate: float = 0.0
+    # 关闭后模拟旧版 Node：对应接口返回无 error_reason 的 404
+    supports_batch: bool = True
+    supports_session: bool = True
+    supports_containers_status: bool = True
+    seed: int | None = None
+
+
+@dataclass
+class FakeContainer:
+    name: str
+    status: ContainerStatus = ContainerStatus.ONLINE
+    # 过渡中的目标状态与到达时间
+    target: ContainerStatus | None = None
+    ready_at: float = 0.0
+    last_ssh: str | None = None
+    accounts: dict[str, str] = field(default_factory=dict)
+
+    def current(self) -> ContainerStatus:
+        if self.target is not None and time.time() >= self.ready_at:
+            self.status, self.target = self.target, None
+        return self.status
+
+
+def _not_found() -> tuple[int, dict]:
+    return 404, {"success": 0, "error_reason": "not_found"}
+
+
+def _ok(**fields) -> tuple[int, dict]:
+    return 200, {"success": 1, **fields}
+
+
+class FakeNode:
+    """单个假 Node 的状态与接口实现；handle() 的入参为已校验的明文消息。"""
+
+    def __init__(self, ip: str, config: FleetConfig, rng: random.Random):
+        self.ip = ip
+        self.config = config
+        self.rng = rng
+        self.machine_status = MachineStatus.ONLINE
+        # 为 False 时模拟机器不可达：所有请求直接断开
+        self.reachable = True
+        self.containers: dict[str, FakeContainer] = {}
+        self.sessions = NodeSessionStore()
+        self.lock = threading.Lock()
+        self.http_requests = 0
+        self.commands: dict[str, int] = {}
+        self.injected_failures = 0
+        self.dropped = 0
+
+    def _transition(self, c: FakeContainer, via: ContainerStatus, target: ContainerStatus) -> None:
+        failed = self.rng.random() < self.config.transition_failure_rate
+        c.status = via
+        c.target = ContainerStatus.FAILED if failed else target
+        c.ready_at = time.time() + self.config.transition_seconds
+
+    def _container(self, msg: dict) -> FakeContainer | None:
+        return self.containers.get(((msg or {}).get("config") or {}).get("container_name") or "")
+
+    def handle(self, endpoint: str, msg: dict) -> tuple[int, dict]:
+        handler = _ENDPOINTS.get(endpoint)
+        if handler is None or (endpoint == BATCH_ENDPOINT and not self.config.supports_batch) \
+                or (endpoint == "/containers_status" and not self.config.supports_containers_status):
+            return 404, {"message": "not found"}
+        with self.lock:
+            self.commands[endpoint] = self.commands.get(endpoint, 0) + 1
+            if endpoint != BATCH_ENDPOINT:
+                if self.rng.random() < self.config.failure_rate:
+                    self.injected_failures += 1
+                    return 500, {"success": 0, "error_reason": "node_internal_error"}
+                return handler(self, msg)
+        # 批量报文逐条调用 handle，不能持有锁
+        return handler(self, msg)
+
+    ##################################
+    # 接口实现：响应格式与 Ctrl 侧 container_tasks / machine_tasks / heartbeat 的解析保持一致
+
+    def _machine_status(self, msg):
+        return _ok(machine_status=self.machine_status.value)
+
+    def _container_status(self, msg):
+        c = self._container(msg)
+        if c is None:
+            return _not_found()
+        return _ok(container_name=c.name, container_status=c.current().value)
+
+    def _containers_status(self, msg):
+        items = []
+        for name in ((msg or {}).get("config") or {}).get("container_names") or []:
+            c = self.containers.get(name)
+            if c is None:
+                items.append({"container_name": name, "error_reason": "not_found"})
+            else:
+                items.append({"container_name": name, "container_status": c.current().value})
+        return _ok(containers=items)
+
+    def _last_ssh_time(self, msg):
+        c = self._container(msg)
+        if c is None or c.last_ssh is None:
+            return _not_found()
+        return _ok(last_ssh_connect_time=c.last_ssh)
+
+    def _create(self, msg):
+        name = ((msg or {}).get("config") or {}).get("name") or ""
+        if not name:
+            return 400, {"success": 0, "error_reason": "invalid_payload"}
+        if name in self.containers:
+            return 409, {"success": 0, "error_reason": "container_exists"}
+        c = self.containers[name] = FakeContainer(name)
+        owner = (msg or {}).get("owner_name")
+        if owner:
+            c.accounts[owner] = "root"
+        self._transition(c, ContainerStatus.CREATING, ContainerStatus.ONLINE)
+        return _ok()
+
+    def _remove(self, msg):
+        # 与真实 Node 一致：success 0=SUCCESS, 1=NOTFOUND, 2=FAILED
+        c = self._container(msg)
+        if c is None:
+            return 200, {"success": 1}
+        self.containers.pop(c.name, None)
+        return 200, {"success": 0}
+
+    def _start(self, msg):
+        c = self._container(msg)
+        if c is None:
+            return _not_found()
+        self._transition(c, ContainerStatus.STARTING, ContainerStatus.ONLINE)
+        return _ok()
+
+    def _stop(self, msg):
+        c = self._container(msg)
+        if c is None:
+            return _not_found()
+        self._transition(c, ContainerStatus.STOPPING, ContainerStatus.OFFLINE)
+        return _ok()
+
+    def _set_account(self, msg):
+        c = self._container(msg)
+        if c is None:
+            return _not_found()
+        config = msg.get("config") or {}
+        c.accounts[str(config.get("user_name"))] = str(config.get("role"))
+        return _ok()
+
+    def _remove_account(self, msg):
+        c = self._container(msg)
+        if c is None:
+            return _not_found()
+        c.accounts.pop(str((msg.get("config") or {}).get("user_name")), None)
+        return _ok()
+
+    def _batch(self, msg):
+        results = []
+        for cmd in ((msg or {}).get("config") or {}).get("commands") or []:
+            code, out = self.handle(cmd.get("endpoint") or "", cmd.get("payload") or {})
+            results.append(dict(out, status_code=code))
+        return _ok(results=results)
+
+
+_ENDPOINTS = {
+    "/machine_status": FakeNode._machine_status,
+    "/container_status": FakeNode._container_status,
+    "/containers_status": FakeNode._containers_status,
+    "/container_last_ssh_time": FakeNode._last_ssh_time,
+    "/create_container": FakeNode._create,
+    "/remove_container": FakeNode._remove,
+    "/start_container": FakeNode._start,
+    "/stop_container": FakeNode._stop,
+    "/restart_container": FakeNode._start,
+    "/add_collaborator": FakeNode._set_account,
+    "/update_role": FakeNode._set_account,
+    "/remove_collaborator": FakeNode._remove_account,
+    BATCH_ENDPOINT: FakeNode._batch,
+}
+
+
+class _NodeServer(ThreadingHTTPServer):
+    daemon_threads = True
+    block_on_close = False
+    request_queue_size = 128
+
+    def __init__(self, address, node: FakeNode, registry: KeyRegistry | None):
+        super().__init__(address, _NodeHandler)
+        self.node = node
+        self.registry = registry
+
+
+class _NodeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, code: int, out: dict) -> None:
+        data = json.dumps(out).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _open(self, body: dict) -> tuple[dict | None, tuple[int, dict] | None]:
+        node = self.server.node
+        if is_session_message(body):
+            try:
+                return node.sessions.open(body), None
+            except SessionError as e:
+                return None, (401, {"success": 0, "error_reason": e.reason})
+        try:
+            msg = CheckKeys.get_verified_msg({"message": base64.b64decode(body.get("message") or ""),
+                                              "signature": base64.b64decode(body.get("signature") or ""),
+                                              "sig_suite": body.get("sig_suite")}, self.server.registry)
+        except Exception:
+            msg = {}
+        if not msg:
+            return None, (401, {"success": 0, "error_reason": "invalid_signature"})
+        return msg, None
+
+    def do_POST(self):
+        node: FakeNode = self.server.node
+        config = node.config
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        with node.lock:
+            node.http_requests += 1
+            drop = not node.reachable or node.rng.random() < config.drop_rate
+            if drop:
+                node.dropped += 1
+        endpoint = self.path[len("/api"):] if self.path.startswith("/api") else self.path
+        delay = config.endpoint_latency.get(endpoint, config.latency).sample(node.rng)
+        if delay:
+            time.sleep(delay)
+        if drop:
+            self.close_connection = True
+            return
+
+        try:
+            body = json.loads(raw or b"{}")
+        except ValueError:
+            return self._reply(400, {"success": 0, "error_reason": "invalid_json"})
+        if endpoint == HANDSHAKE_ENDPOINT and not config.supports_session:
+            return self._reply(404, {"message": "not found"})
+        msg, err = self._open(body)
+        if err is not None:
+            return self._reply(*err)
+        if endpoint == HANDSHAKE_ENDPOINT:
+            return self._reply(200, {"success": 1 if node.sessions.accept_handshake(msg) else 0})
+        self._reply(*node.handle(endpoint, msg))
+
+    def log_message(self, *args):
+        pass
+
+
+def fleet_ip(index: int) -> str:
+    """第 index 台假 Node 的回环地址：127.0.1.1, 127.0.1.2, ... 每 254 个换一个网段。"""
+    return f"127.0.{1 + index // 254}.{1 + index % 254}"
+
+
+class FakeNodeFleet:
+    """
+    N 个假 Node。registry 为 Node 侧密钥（private 解密、node_public 为 Ctrl 公钥），
+    为空时使用进程级 key_registry —— 默认配置下 Ctrl 与 Node 公钥读取同一文件，即回环密钥。
+    """
+
+    def __init__(self, config: FleetConfig | None = None, registry: KeyRegistry | None = None):
+        self.config = config or FleetConfig()
+        self.registry = registry
+        seed = self.config.seed if self.config.seed is not None else random.randrange(1 << 30)
+        self.nodes: dict[str, FakeNode] = {}
+        for i in range(self.config.nodes):
+            node = FakeNode(fleet_ip(i), self.config, random.Random(seed + i))
+            for j in range(self.config.containers_per_node):
+                node.containers[f"sim_{i}_{j}"] = FakeContainer(f"sim_{i}_{j}")
+            self.nodes[node.ip] = node
+        self.port = self.config.port
+        self._servers: list[_NodeServer] = []
+        self._threads: list[threading.Thread] = []
+
+    @property
+    def ips(self) -> list[str]:
+        return list(self.nodes)
+
+    @property
+    def url_middle(self) -> str:
+        """赋给 CommsConfig.NODE_URL_MIDDLE。"""
+        return f":{self.port}/api"
+
+    def start(self) -> "FakeNodeFleet":
+        if self._servers:
+            return self
+        for ip, node in self.nodes.items():
+            server = _NodeServer((ip, self.port), node, self.registry)
+            # 第一个 Node 绑定 0 端口时由系统分配，其余 Node 复用该端口
+            self.port = server.server_address[1]
+            self._servers.append(server)
+            t = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.1},
+                                 daemon=True, name=f"fake-node-{ip}")
+            t.start()
+            self._threads.append(t)
+        print(f"[node-fleet] {len(self.nodes)} fake node(s) listening on 127.0.x.y:{self.port}")
+        return self
+
+    def stop(self) -> None:
+        servers, self._servers = self._servers, []
+        if not servers:
+            return
+        # shutdown 会等待一个轮询周期，并行关闭避免节点多时逐个等待
+        with ThreadPoolExecutor(max_workers=min(32, len(servers))) as executor:
+            list(executor.map(lambda s: s.shutdown(), servers))
+        for server in servers:
+            server.server_close()
+        self._threads.clear()
+
+    def __enter__(self) -> "FakeNodeFleet":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def node(self, ip: str) -> FakeNode:
+        return self.nodes[ip]
+
+    def set_reachable(self, ip: str, reachable: bool) -> None:
+        with self.nodes[ip].lock:
+            self.nodes[ip].reachable = reachable
+
+    def set_machine_status(self, ip: str, status: MachineStatus) -> None:
+        with self.nodes[ip].lock:
+            self.nodes[ip].machine_status = status
+
+    def record_ssh_login(self, ip: str, container_name: str, when: dt.datetime | None = None) -> None:
+        with self.nodes[ip].lock:
+            c = self.nodes[ip].containers[container_name]
+            c.last_ssh = (when or dt.datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+
+    def stats(self) -> dict:
+        commands: dict[str, int] = {}
+        out = {"nodes": len(self.nodes), "containers": 0, "http_requests": 0,
+               "injected_failures": 0, "dropped": 0}
+        for node in self.nodes.values():
+            with node.lock:
+                out["containers"] += len(node.containers)
+                out["http_requests"] += node.http_requests
+                out["injected_failures"] += node.injected_failures
+                out["dropped"] += node.dropped
+                for endpoint, n in node.commands.items():
+                    commands[endpoint] = commands.get(endpoint, 0) + n
+        out["commands"] = commands
+        return out
+
+    def seed_database(self) -> dict:
+        """
+        在当前 app_context 中为每个假 Node 写入 machines 记录（machine_ip 与假 Node 一致）及其容器记录，
+        一次提交。返回 {machine_ip: machine_id}。
+        """
+        from ..extensions import db
+        from ..models.containers import Container
+        from ..models.machine import Machine
+        from ..constant import MachineTypes
+
+        machines = {}
+        for i, (ip, node) in enumerate(self.nodes.items()):
+            machine = Machine(machine_name=f"sim-node-{i}", machine_ip=ip, machine_type=MachineTypes.CPU,
+                              machine_status=node.machine_status, machine_description="fake node fleet",
+                              cpu_core_number=64, memory_size_gb=512, gpu_number=0, gpu_type="",
+                              max_swap_gb=64, disk_size_gb=4096, max_cpu_core_number=64,
+                              max_gpu_number=0, max_memory_gb=512)
+            db.session.add(machine)
+            machines[ip] = machine
+        db.session.flush()
+        for ip, node in self.nodes.items():
+            for j, c in enumerate(node.containers.values()):
+                db.session.add(Container(name=c.name, image="sim:latest", machine_id=machines[ip].id,
+                                         container_status=c.current(), port=20000 + j,
+                                         memory_gb=1, swap_gb=0, gpu_number=0, cpu_number=1))
+        db.session.commit()
+        return {ip: m.id for ip, m in machines.items()}
+
+
+def probe(fleet: FakeNodeFleet, max_in_flight: int | None = None) -> dict:
+    """用 Ctrl 的异步客户端对整个集群巡检一轮：每台机器一次 /machine_status，每个容器一次 /container_status。"""
+    from ..config import CommsConfig
+    from ..utils.async_node_transport import NodeRequest, run_node_requests
+
+    original = CommsConfig.NODE_URL_MIDDLE
+    CommsConfig.NODE_URL_MIDDLE = fleet.url_middle
+    try:
+        requests = [NodeRequest(ip, "/machine_status", {"config": {}}) for ip in fleet.ips]
+        for ip, node in fleet.nodes.items():
+            requests.extend(NodeRequest(ip, "/container_status", {"config": {"container_name": name}})
+                            for name in node.containers)
+        before = fleet.stats()["http_requests"]
+        started = time.perf_counter()
+        results = run_node_requests(requests, max_in_flight=max_in_flight)
+        elapsed = time.perf_counter() - started
+    finally:
+        CommsConfig.NODE_URL_MIDDLE = original
+    errors = sum(1 for r in results if not isinstance(r, dict) or "error" in r or r.get("success") != 1)
+    return {
+        "requests": len(requests),
+        "http_requests": fleet.stats()["http_requests"] - before,
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "commands_per_sec": len(requests) / elapsed if elapsed > 0 else float("inf"),
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="本地模拟 Node 集群")
+    parser.add_argument("--nodes", type=int, default=10)
+    parser.add_argument("--containers-per-node", type=int, default=10)
+    parser.add_argument("--port", type=int, default=5789, help="所有假 Node 共用的端口，0 为系统分配")
+    parser.add_argument("--latency", default="fixed:0", help="fixed:a / uniform:a,b / exponential:a / lognormal:a,b（毫秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--transition-seconds", type=float, default=1.0)
+    parser.add_argument("--transition-failure-rate", type=float, default=0.0)
+    parser.add_argument("--no-batch", action="store_true", help="模拟不支持 /batch 的旧版 Node")
+    parser.add_argument("--no-session", action="store_true", help="模拟不支持会话通道的旧版 Node")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--ephemeral-keys", action="store_true",
+                        help="使用临时生成的回环密钥（--probe 时 Ctrl 与假 Node 在同一进程，无需仓库中的 pem 文件）")
+    parser.add_argument("--probe", action="store_true", help="巡检一轮后退出")
+    parser.add_argument("--max-in-flight", type=int)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    config = FleetConfig(
+        nodes=args.nodes, containers_per_node=args.containers_per_node, port=args.port,
+        latency=Latency.parse(args.latency), failure_rate=args.failure_rate, drop_rate=args.drop_rate,
+        transition_seconds=args.transition_seconds, transition_failure_rate=args.transition_failure_rate,
+        supports_batch=not args.no_batch, supports_session=not args.no_session, seed=args.seed,
+    )
+    with tempfile.TemporaryDirectory(prefix="fleet-keys-") as dir_path:
+        if args.ephemeral_keys:
+            from .crypto_envelope import _loopback_registry
+            CheckKeys.key_registry = _loopback_registry(dir_path, KeyConfig.SIGNATURE_SUITE)
+        _serve(config, args)
+
+
+def _serve(config: FleetConfig, args: argparse.Namespace) -> None:
+    with FakeNodeFleet(config) as fleet:
+        if args.probe:
+            report = {"probe": probe(fleet, args.max_in_flight), "fleet": fleet.stats()}
+            if args.json:
+                print(json.dumps(report, indent=2))
+            else:
+                p = report["probe"]
+                print(f"{p['requests']} commands in {p['http_requests']} HTTP requests, "
+                      f"{p['errors']} errors, {p['elapsed_s']:.2f}s ({p['commands_per_sec']:.0f} commands/s)")
+            return
+        print(f"[node-fleet] set CommsConfig.NODE_URL_MIDDLE = {fleet.url_middle!r}; "
+              f"machine IPs {fleet.ips[0]} .. {fleet.ips[-1]}")
+        try:
+            while True:
+                time.sleep(60)
+                print(f"[node-fleet] {fleet.stats()}")
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+签名套件微基准：对比各套件 sign / verify 吞吐。
+
+    python -m <包名>.benchmarks.signature_suites [--iterations N] [--payload-size BYTES] [--json]
+"""
+
+import argparse
+import json
+import time
+
+from ..utils.CheckKeys import SIGNATURE_SUITES, generate_signing_keys
+from . import make_payload
+
+
+def _ops_per_sec(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - started
+    return iterations / elapsed if elapsed > 0 else float("inf")
+
+
+def run(iterations: int = 500, payload_size: int = 256, suites: list[str] | None = None) -> list[dict]:
+    """返回每个套件一条结果：{"suite", "sign_ops", "verify_ops", "signature_bytes", ...}"""
+    data = make_payload(payload_size)
+    results = []
+    for name in suites or list(SIGNATURE_SUITES):
+        suite = SIGNATURE_SUITES[name]
+        private_key, public_key = generate_signing_keys(name)
+        sig = suite.sign(private_key, data)
+        assert suite.verify(public_key, sig, data)
+        results.append({
+            "suite": name,
+            "iterations": iterations,
+            "payload_bytes": len(data),
+            "signature_bytes": len(sig),
+            "sign_ops": _ops_per_sec(lambda: suite.sign(private_key, data), iterations),
+            "verify_ops": _ops_per_sec(lambda: suite.verify(public_key, sig, data), iterations),
+        })
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Node 报文签名套件 sign/verify 吞吐对比")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--payload-size", type=int, default=256)
+    parser.add_argument("--suite", action="append", choices=sorted(SIGNATURE_SUITES), help="可重复，默认全部")
+    parser.add_argument("--json", action="store_true", help="输出 JSON，便于不同版本之间对比")
+    args = parser.parse_args(argv)
+
+    results = run(args.iterations, args.payload_size, args.suite)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'suite':<16}{'sign ops/s':>14}{'verify ops/s':>16}{'sig bytes':>12}")
+    for r in results:
+        print(f"{r['suite']:<16}{r['sign_ops']:>14.0f}{r['verify_ops']:>16.0f}{r['signature_bytes']:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ from flask import jsonify, request
 from flask import current_app
 from . import api_bp
 from ..services import container_tasks as container_service
+from ..services import job_tasks as job_service
 from ..utils.Container import Container_info
 from ..constant import ROLE
 from ..repositories import containers_repo, authentications_repo, user_repo
@@ -27,7 +28,17 @@ REASON_STATUS_MAP = {
     'restart_failed': 500,
     'container_offline': 400,
     'node_endpoint_not_found': 502,
+    'queue_full': 503,
 }
+
+
+def _job_accepted(job, message: str):
+    return jsonify({"success": 1, "message": message, "job_id": job.job_id}), 202
+
+
+def _job_queue_error(e):
+    status = REASON_STATUS_MAP.get(getattr(e, 'reason', None), 500)
+    return jsonify({"success": 0, "message": str(e), "error_reason": getattr(e, 'reason', None)}), status
 @api_bp.post("/containers/create_container")
 def create_container_api():
     '''
@@ -44,12 +55,14 @@ def create_container_api():
             "NAME":str,
             "image":str
         },
-        "public_key"
+        "public_key",
+        ["async": [0|1]]     # 为 1 时写入任务队列后立即返回 202，通过 /jobs/job_status 查询结果
     }
     返回格式：
     {
         "success": [0|1],
         "message": "xxxx",
+        ["job_id": "xxxx"],
         ["error_reason": "xxxx"]
     }
     '''
@@ -91,6 +104,19 @@ def create_container_api():
 
     except Exception as e:
         return jsonify({"success": 0, "message": f"Invalid container payload: {str(e)}", "error_reason": "invalid_payload"}), 400
+
+    if data.get("async"):
+        try:
+            job = job_service.enqueue_job("create_container", {
+                "owner_name": owner_name,
+                "machine_id": machine_id,
+                "container": {"gpu_list": gpu_list, "cpu_number": cpu_number, "memory": memory,
+                              "name": name, "image": image, "swap_memory": swap_memory},
+                "public_key": public_key,
+            }, operator_user_id=operator_user_id)
+        except job_service.JobQueueError as e:
+            return _job_queue_error(e)
+        return _job_accepted(job, "Create container job queued")
     # 这里：error_reason的补映射表。原则上服务层应该尽量提供明确的error_reason以便前端处理，但这里也做一个兜底，以防万一
     reason_map = {
         "container_exists": 409,
@@ -133,12 +159,14 @@ def delete_container_api():
     发送格式：
     {
         "token",
-        "container_id"
+        "container_id",
+        ["async": [0|1]]     # 为 1 时写入任务队列后立即返回 202，通过 /jobs/job_status 查询结果
     }
     返回格式：
     {
         "success": [0|1],
         "message": "xxxx",
+        ["job_id": "xxxx"],
         ["error_reason": "xxxx"]
     }
     '''
@@ -148,6 +176,15 @@ def delete_container_api():
     data = request.get_json() or {}
     container_id = data.get("container_id", 0)
     request_user_id = authentications_repo.get_user_id_by_token(token)
+    if data.get("async"):
+        try:
+            job = job_service.enqueue_job("remove_container", {"container_id": int(container_id)},
+                                          operator_user_id=request_user_id)
+        except (TypeError, ValueError):
+            return jsonify({"success": 0, "message": "container_id must be an integer", "error_reason": "invalid_payload"}), 400
+        except job_service.JobQueueError as e:
+            return _job_queue_error(e)
+        return _job_accepted(job, "Delete container job queued")
     try:
         if not container_service.remove_container(container_id=container_id, operator_user_id=request_user_id):
             return jsonify({"success": 0, "message": "Failed to delete container", "error_reason": "delete_failed"}), 500
@@ -246,6 +283,64 @@ def restart_container_api():
         return jsonify(payload), status
     return jsonify({"success": 1, "message": "Container restart request sent"}), 200
 
+
+def _bulk_container_action_api(action: str):
+    '''
+    批量生命周期接口的公共实现。
+    请求格式：
+    { "token", "container_ids": [int, ...] }
+    返回格式：
+    {
+        "success": [0|1],   # 有任意容器派发成功即为 1
+        "job_id",           # 用于 /jobs/job_status 轮询收敛进度（job.progress）
+        "total", "dispatched", "failed",
+        "results": [{"container_id", "success", ["error_reason", "message"]}]
+    }
+    '''
+    token = request.headers.get("token", "")
+    if (not authentications_repo.is_token_valid(token)):
+        return jsonify({"success": 0, "message": "invalid or missing token", "error_reason": "invalid_token"}), 401
+    data = request.get_json(silent=True) or {}
+    container_ids = data.get("container_ids")
+    try:
+        if not isinstance(container_ids, list):
+            raise TypeError("container_ids must be a list")
+        container_ids = [int(cid) for cid in container_ids]
+    except Exception:
+        return jsonify({"success": 0, "message": "container_ids must be a list of integers", "error_reason": "invalid_payload"}), 400
+    if not container_ids:
+        return jsonify({"success": 0, "message": "container_ids required", "error_reason": "missing_fields"}), 400
+    max_items = int(current_app.config.get("CONTAINER_BULK_MAX_ITEMS", 500) or 500)
+    if len(container_ids) > max_items:
+        return jsonify({"success": 0, "message": f"at most {max_items} containers per request", "error_reason": "too_many_items"}), 413
+    request_user_id = authentications_repo.get_user_id_by_token(token)
+    try:
+        report = container_service.bulk_container_action(container_ids, action, operator_user_id=request_user_id)
+    except Exception as e:
+        return jsonify({"success": 0, "message": f"Internal error: {str(e)}", "error_reason": f"{action}_failed"}), 500
+    return jsonify({"success": 1 if report["dispatched"] else 0, **report}), 200
+
+
+@api_bp.post("/containers/bulk_start_containers")
+def bulk_start_containers_api():
+    return _bulk_container_action_api('start')
+
+
+@api_bp.post("/containers/bulk_stop_containers")
+def bulk_stop_containers_api():
+    return _bulk_container_action_api('stop')
+
+
+@api_bp.post("/containers/bulk_restart_containers")
+def bulk_restart_containers_api():
+    return _bulk_container_action_api('restart')
+
+
+@api_bp.post("/containers/bulk_delete_containers")
+def bulk_delete_containers_api():
+    return _bulk_container_action_api('remove')
+
+
 @api_bp.post("/containers/add_collaborator")
 def add_collaborator_api():
     '''
@@ -521,7 +616,8 @@ def list_all_containers_bref_information_api():
         "token",
         "machine_id",
         "page_number",
-        "page_size"
+        "page_size",
+        ["cursor"]  # 上一页返回的 next_cursor；提供时按 keyset 分页，忽略 page_number
     }
     返回格式：
     {
@@ -536,6 +632,8 @@ def list_all_containers_bref_information_api():
             "port",
             "container_status"
         }],
+        "total_page",  # cursor 模式下为 null
+        "next_cursor"  # 没有下一页时为 null
     }
     '''
     token = request.headers.get("token","")
@@ -547,6 +645,7 @@ def list_all_containers_bref_information_api():
     request_user_id = authentications_repo.get_user_id_by_token(token)
     page_number=data.get("page_number",0)
     page_size=data.get("page_size",10)
+    cursor=data.get("cursor") or None
     # 在此处统一为 None，并数字化 ID
     if machine_id == "" or machine_id is None:
         machine_id = None
@@ -567,10 +666,14 @@ def list_all_containers_bref_information_api():
             machine_id=machine_id,
             user_id=request_user_id,
             page_number=page_number,
-            page_size=page_size)
-        # expect a dict: { containers: [...], total_page: n }
+            page_size=page_size,
+            cursor=cursor)
+        # expect a dict: { containers: [...], total_page: n, next_cursor: str|None }
         containers_info = result.get('containers', [])
         total_page = result.get('total_page', 1)
+        next_cursor = result.get('next_cursor')
+    except ValueError as e:
+        return jsonify({"success":0,"message":"Failed to list containers: " + str(e), "error_reason": "invalid_cursor"}), 400
     except Exception as e:
         reason = getattr(e, 'reason', None) or getattr(e, 'error_reason', None) or 'list_failed'
         status = REASON_STATUS_MAP.get(reason, 500)
@@ -585,4 +688,4 @@ def list_all_containers_bref_information_api():
         except Exception:
             out.append(c)
 
-    return jsonify({"success":1,"containers_info":out, "total_page": total_page}),200
+    return jsonify({"success":1,"containers_info":out, "total_page": total_page, "next_cursor": next_cursor}),200
@@ -0,0 +1,41 @@
+from flask import jsonify, request
+from . import api_bp
+from ..services import job_tasks as job_service
+from ..repositories import authentications_repo
+
+
+@api_bp.post("/jobs/job_status")
+def job_status_api():
+    '''
+    查询持久化任务（异步创建/删除容器、机器维护过渡、批量生命周期操作）的状态与预计完成时间。
+    通信数据格式：
+    发送格式：
+    {
+        "token",
+        "job_id"
+    }
+    返回格式：
+    {
+        "success": [0|1],
+        ["error_reason": "xxxx"],
+        "job": {
+            "job_id", "kind", "status": "queued|running|succeeded|failed",
+            "attempts", "queue_position", "eta_seconds",
+            "created_at", "started_at", "finished_at",
+            "result", "error_reason", "message",
+            ["progress": {   # 仅批量生命周期任务（kind=bulk_container_action）
+                "action", "dispatch_seconds", "finished", "done", "failed", "pending", "rejected",
+                "containers": [{"container_id", "state", "container_status", ["error_reason"]}]
+            }]
+        }
+    }
+    '''
+    token = request.headers.get("token", "")
+    if (not authentications_repo.is_token_valid(token)):
+        return jsonify({"success": 0, "message": "invalid or missing token", "error_reason": "invalid_token"}), 401
+    data = request.get_json(silent=True) or {}
+    request_user_id = authentications_repo.get_user_id_by_token(token)
+    job = job_service.Get_job_status(str(data.get("job_id") or ""), operator_user_id=request_user_id)
+    if job is None:
+        return jsonify({"success": 0, "message": "job not found", "error_reason": "not_found"}), 404
+    return jsonify({"success": 1, "job": job}), 200
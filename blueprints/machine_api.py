@@ -170,6 +170,42 @@ def update_machine_api():
         return jsonify({"success": 0, "message": "Failed to update machine", "error_reason": "update_failed"}), 500
             
 
+@api_bp.post("/machines/maintenance_progress")
+def maintenance_progress_api():
+    '''
+    查询 ONLINE -> MAINTENANCE 过渡进度。
+    通信数据格式：
+	发送格式：
+	{
+		"token",
+        "machine_id",
+    }
+    返回格式：
+	{
+		"success": [0|1],
+		"message": "xxxx",
+        ["error_reason": "xxxx"],
+        "progress": {
+            "machine_id", "phase", "total", "stopped", "failed", "remaining",
+            "polls", "started_at", "elapsed", "timeout", "result", ["job_id"]
+        }
+	}
+    '''
+    token = _resolve_auth_token()
+    if (not authentications_repo.is_token_valid(token)):
+        return jsonify({"success": 0, "message": "invalid or missing token", "error_reason": "invalid_token"}), 401
+    if (not user_repo.check_permission(token, required_permission=PERMISSION.OPERATOR)):
+        return jsonify({"success": 0, "message": "insufficient permissions", "error_reason": "insufficient_permission"}), 403
+    data = request.get_json(silent=True) or {}
+    machine_id = int(data.get("machine_id") or 0)
+    if not machine_id:
+        return jsonify({"success": 0, "message": "machine_id required", "error_reason": "missing_fields"}), 400
+    progress = machine_service.Get_maintenance_progress(machine_id)
+    if progress is None:
+        return jsonify({"success": 0, "message": "no maintenance transition for this machine", "error_reason": "not_found"}), 404
+    return jsonify({"success": 1, "message": "ok", "progress": progress}), 200
+
+
 @api_bp.post("/machines/get_detail_information")
 def get_detail_information_api():
     '''
@@ -219,7 +255,8 @@ def list_all_machine_bref_information_api():
     {
         "token",
         "page_number",
-        "page_size"
+        "page_size",
+        ["cursor"]  # 提供该字段（首页可为 null）时按 keyset 分页，返回 next_cursor 而非 total_pages
     }
     返回格式：
     {
@@ -235,7 +272,16 @@ def list_all_machine_bref_information_api():
     page_number = int(data.get("page_number", 0))
     page_size = int(data.get("page_size", 10))
     user_id = authentications_repo.get_user_id_by_token(token)
-    machines_info, total_pages = machine_service.List_all_machine_bref_information(page_number=page_number, page_size=page_size, user_id=user_id)
+    next_cursor = None
+    if "cursor" in data:
+        try:
+            machines_info, next_cursor = machine_service.List_machine_bref_information_by_cursor(
+                page_size=page_size, cursor=data.get("cursor") or None, user_id=user_id)
+        except ValueError as e:
+            return jsonify({"success": 0, "message": str(e), "error_reason": "invalid_cursor"}), 400
+        total_pages = None
+    else:
+        machines_info, total_pages = machine_service.List_all_machine_bref_information(page_number=page_number, page_size=page_size, user_id=user_id)
     machines_list = []
     for machine in machines_info:
         machines_list.append({
@@ -243,9 +289,10 @@ def list_all_machine_bref_information_api():
             "machine_name": machine.machine_name,
             "machine_ip": machine.machine_ip,
             "machine_type": machine.machine_type,
-            "machine_status": machine.machine_status
+            "machine_status": machine.machine_status,
+            "last_seen": getattr(machine, 'last_seen', None)
         })
-    return jsonify({"machines": machines_list, "total_pages": total_pages}), 200
+    return jsonify({"machines": machines_list, "total_pages": total_pages, "next_cursor": next_cursor}), 200
 
 @api_bp.post("/machines/add_machine_permission")
 def add_machine_permission_api():
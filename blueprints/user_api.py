@@ -227,7 +227,8 @@ def list_all_user_bref_information_api():
 	{
 		"token",
 		"page_number",
-		"page_size"
+		"page_size",
+		["cursor"]  # 提供该字段（首页可为 null）时按 keyset 分页，响应中带 next_cursor
 	}
 	返回格式：
 	{[
@@ -251,8 +252,16 @@ def list_all_user_bref_information_api():
 	page_number = data.get("page_number") or request.args.get("page_number") or 1
 	page_size = data.get("page_size") or request.args.get("page_size") or 10
 
+	cursor_mode = "cursor" in data or "cursor" in request.args
+	next_cursor = None
 	try:
-		users = user_tasks.List_all_user_bref_information(page_number=int(page_number), page_size=int(page_size))
+		if cursor_mode:
+			cursor = data.get("cursor") or request.args.get("cursor") or None
+			users, next_cursor = user_tasks.List_user_bref_information_by_cursor(page_size=int(page_size), cursor=cursor)
+		else:
+			users = user_tasks.List_all_user_bref_information(page_number=int(page_number), page_size=int(page_size))
+	except ValueError as e:
+		return jsonify({"success": 0, "message": str(e), "error_reason": "invalid_cursor"}), 400
 	except Exception as e:
 		return jsonify({"success": 0, "message": "failed to list users", "error_reason": "list_failed"}), 500
 
@@ -264,7 +273,10 @@ def list_all_user_bref_information_api():
 		except Exception:
 			out.append(u)
 
-	return jsonify({"success": 1, "users": out}), 200
+	payload = {"success": 1, "users": out}
+	if cursor_mode:
+		payload["next_cursor"] = next_cursor
+	return jsonify(payload), 200
 
 @api_bp.post("/users/change_password")
 def change_password_user():
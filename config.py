@@ -17,10 +17,66 @@ class KeyConfig:
     PUBLIC_KEY_PATH = "public_A.pem"
     PRIVATE_KEY_PATH = "private_A.pem"
     PUBLIC_KEY_NODE = "public_node.pem"
+    # Node 报文签名套件：rsa-pss-sha256（默认，原有格式）或 ed25519。
+    # 使用 ed25519 时需配置单独的签名私钥与 Node 的签名公钥（加密仍使用上面的 RSA 密钥）
+    SIGNATURE_SUITE = os.getenv("SIGNATURE_SUITE", "rsa-pss-sha256")
+    SIGNING_KEY_PATH = os.getenv("SIGNING_KEY_PATH") or None
+    NODE_SIGNING_KEY_PATH = os.getenv("NODE_SIGNING_KEY_PATH") or None
 
 
 class CommsConfig:
     NODE_URL_MIDDLE = ":5789/api"
+    # Ctrl -> Node 连接池：每台机器一个 keep-alive 连接池
+    NODE_POOL_MAXSIZE = int(os.getenv("NODE_POOL_MAXSIZE", "8"))
+    # 仅对“连接建立失败”重试，请求已发出的 POST 不会被自动重放
+    NODE_RETRY_TOTAL = int(os.getenv("NODE_RETRY_TOTAL", "2"))
+    NODE_RETRY_BACKOFF = float(os.getenv("NODE_RETRY_BACKOFF", "0.25"))
+    # 容器状态心跳的轮询线程数（与正在过渡的容器数量无关）
+    HEARTBEAT_MAX_WORKERS = int(os.getenv("HEARTBEAT_MAX_WORKERS", "4"))
+    # 按机器并发下发请求时的最大并发数
+    NODE_FANOUT_WORKERS = int(os.getenv("NODE_FANOUT_WORKERS", "16"))
+    # asyncio Node 客户端：单个事件循环内的最大并发在途请求数
+    NODE_ASYNC_MAX_IN_FLIGHT = int(os.getenv("NODE_ASYNC_MAX_IN_FLIGHT", "1000"))
+    # 机器存活监控：探测周期（秒）与单次 /machine_status 探测超时
+    MACHINE_LIVENESS_INTERVAL = int(os.getenv("MACHINE_LIVENESS_INTERVAL", "30"))
+    MACHINE_PROBE_TIMEOUT = float(os.getenv("MACHINE_PROBE_TIMEOUT", "2.0"))
+    # 批量报文：同一台机器的多条命令合并为一次签名/加密/POST（Node 的 /batch 接口），
+    # Node 未部署该接口时自动退回逐条发送；单个 /batch 请求最多携带的命令数
+    NODE_BATCH_ENABLED = os.getenv("NODE_BATCH_ENABLED", "true").lower() == "true"
+    NODE_BATCH_MAX_COMMANDS = int(os.getenv("NODE_BATCH_MAX_COMMANDS", "100"))
+    # 含写操作（start/stop/remove 等）的批量使用更小的块；/batch 超时 = max(单条超时, 每条命令 PER_COMMAND 秒 × 块大小)
+    NODE_BATCH_MAX_MUTATING_COMMANDS = int(os.getenv("NODE_BATCH_MAX_MUTATING_COMMANDS", "20"))
+    NODE_BATCH_TIMEOUT_PER_COMMAND = float(os.getenv("NODE_BATCH_TIMEOUT_PER_COMMAND", "0.5"))
+    # 确认 Node 不支持批量接口后，RETRY 秒内直接逐条发送，之后重新探测
+    NODE_BATCH_RETRY_SECONDS = float(os.getenv("NODE_BATCH_RETRY_SECONDS", "300"))
+    # 会话密钥通道：握手后每条消息只做 AES-GCM，不再逐条 RSA 签名/加密（需要 Node 支持 /session_handshake，
+    # 不支持时自动退回 RSA 报文）。TTL 为会话有效期，到期前自动轮换；握手失败后 RETRY 秒内不再尝试
+    NODE_SESSION_ENABLED = os.getenv("NODE_SESSION_ENABLED", "false").lower() == "true"
+    NODE_SESSION_TTL = float(os.getenv("NODE_SESSION_TTL", "600"))
+    NODE_SESSION_RETRY_SECONDS = float(os.getenv("NODE_SESSION_RETRY_SECONDS", "300"))
+    # 容器状态共享缓存 TTL（秒）：详情/列表接口与心跳共用，过期后才会再次探测 Node
+    CONTAINER_STATUS_TTL = float(os.getenv("CONTAINER_STATUS_TTL", "5"))
+    # 存活监控每隔多少秒打印一次状态缓存命中率（0 表示不打印）
+    CONTAINER_STATUS_STATS_INTERVAL = float(os.getenv("CONTAINER_STATUS_STATS_INTERVAL", "300"))
+
+
+class JobConfig:
+    # 持久化任务队列：每个控制端进程的执行线程数（0 表示不启动执行线程）
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+    # 排队中 + 执行中的任务数上限，超过后入队接口直接拒绝（背压）
+    JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "1000"))
+    # 执行租约（秒）：执行进程每 1/3 租约续期一次，进程退出后租约过期的任务重新入队
+    JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+    JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    # 没有历史耗时数据时用于估算 ETA 的单个任务耗时（秒）
+    JOB_DEFAULT_DURATION = float(os.getenv("JOB_DEFAULT_DURATION", "15"))
+
+
+class AuthConfig:
+    # token -> (user_id, permission, expires_at) 进程内缓存；TTL 决定跨进程失效的最长延迟
+    TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "60"))
+    TOKEN_CACHE_MAXSIZE = int(os.getenv("TOKEN_CACHE_MAXSIZE", "4096"))
 
 
 class CORSHeaderConfig:
@@ -56,11 +112,26 @@ class AppConfig(SqlConfig, KeyConfig):
     SSL_KEY_PATH = os.getenv("SSL_KEY_PATH", "certs/localhost-key.pem")
     # 容器自动清理阈值（天）。这里只用于计算和展示，不在此处执行实际清理动作。
     CONTAINER_CLEANUP_AFTER_DAYS = int(os.getenv("CONTAINER_CLEANUP_AFTER_DAYS", "7"))
+    # 清理任务：全局并发线程数与单台机器上同时进行的删除数量上限
+    CONTAINER_CLEANUP_MAX_WORKERS = int(os.getenv("CONTAINER_CLEANUP_MAX_WORKERS", "16"))
+    CONTAINER_CLEANUP_PER_MACHINE = int(os.getenv("CONTAINER_CLEANUP_PER_MACHINE", "2"))
+    # 批量生命周期接口单次请求允许的最大容器数
+    CONTAINER_BULK_MAX_ITEMS = int(os.getenv("CONTAINER_BULK_MAX_ITEMS", "500"))
+    # 是否在 create_app 中启动后台任务（定时任务、存活监控、任务执行线程）；TESTING 模式下始终不启动
+    BACKGROUND_TASKS_ENABLED = os.getenv("BACKGROUND_TASKS_ENABLED", "true").lower() == "true"
+
+
+class TestingConfig(AppConfig):
+    # 测试使用内存数据库，不启动任何后台线程；需要执行线程的测试自行调用 start_job_workers
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
 
 
 def get_config(env: str | None = None):
     """
     返回用于 Flask app.config.from_object 的配置类。
-    目前仅提供单一配置，如需可根据 env 扩展。
+    env 为 "testing" 时返回 TestingConfig，其余情况返回 AppConfig。
     """
+    if (env or "").lower() == "testing":
+        return TestingConfig
     return AppConfig
@@ -27,4 +27,10 @@ class ROLE(Enum):
 
 class PERMISSION(Enum):
     USER="user"
-    OPERATOR="operator"
\ No newline at end of file
+    OPERATOR="operator"
+
+class JobStatus(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
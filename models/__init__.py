@@ -5,3 +5,4 @@ from .machine_permission import MachinePermission  # noqa: F401
 from .container_ssh_login import ContainerSSHLogin  # noqa: F401
 
 from .registration_code import RegistrationCode  # noqa: F401
+from .job import Job  # noqa: F401
@@ -22,6 +22,8 @@ class ContainerSSHLogin(db.Model):
     )
     # 节点返回的上次 SSH 登录时间原样存储；无记录时允许为空
     last_ssh_login_time = db.Column(db.String(255), nullable=True)
+    # 写入时解析出的登录时间（naive UTC），供清理任务做索引范围查询；无法解析时为空
+    last_ssh_at = db.Column(db.DateTime, nullable=True, index=True)
     updated_at = db.Column(
         db.DateTime,
         nullable=False,
@@ -47,4 +47,5 @@ class Container(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint("name", "machine_id", name="uq_container_name_machine"),
+        db.UniqueConstraint("machine_id", "port", name="uq_container_machine_port"),
     )
\ No newline at end of file
@@ -0,0 +1,46 @@
+import datetime as dt
+from ..extensions import db
+from ..constant import JobStatus
+
+
+class Job(db.Model):
+    """
+    持久化的后台任务（创建/删除容器、机器维护过渡等耗时的 Node 操作）。
+    状态流转：queued -> running -> succeeded/failed；running 任务持有租约，
+    控制端进程退出后租约过期，任务会被重新放回队列继续执行。
+    """
+    __tablename__ = "jobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    # 对外暴露的任务编号，避免直接暴露自增 id
+    job_id = db.Column(db.String(32), nullable=False, unique=True, index=True)
+    kind = db.Column(db.String(64), nullable=False, index=True)
+    status = db.Column(
+        db.Enum(JobStatus, values_callable=lambda obj: [e.value for e in obj]),
+        nullable=False,
+        default=JobStatus.QUEUED,
+    )
+    # 任务参数与结果均以 JSON 文本存储
+    payload = db.Column(db.Text, nullable=False)
+    result = db.Column(db.Text, nullable=True)
+    error_reason = db.Column(db.String(120), nullable=True)
+    message = db.Column(db.Text, nullable=True)
+    operator_user_id = db.Column(db.Integer, nullable=True, index=True)
+
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    # 执行者（host:pid）与租约到期时间，租约由执行进程定期续期
+    worker = db.Column(db.String(120), nullable=True)
+    lease_until = db.Column(db.DateTime, nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=dt.datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # 取队首任务：WHERE status = 'queued' ORDER BY id
+        db.Index("ix_jobs_status_id", "status", "id"),
+    )
+
+    def __repr__(self) -> str:  # pragma: no cover
+        return f"<Job {self.job_id} kind={self.kind} status={self.status}>"
@@ -3,10 +3,131 @@
 封装 authentications 表的数据库操作逻辑。
 """
 
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Optional
+from typing import NamedTuple, Optional
+from ..config import AuthConfig
 from ..extensions import db
 from ..models.authentications import Authentication
+from ..models.user import User
+
+
+class TokenInfo(NamedTuple):
+    user_id: int
+    permission: object
+    expires_at: datetime
+
+
+class TokenCache:
+    """token -> TokenInfo 的 TTL + LRU 缓存。
+
+    同一 token 在 TTL 窗口内只查询一次数据库；登出、改密、删除用户、
+    权限变更时由仓库层显式失效。
+    """
+
+    def __init__(self, ttl: float = 60.0, maxsize: int = 4096):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple[float, TokenInfo]]" = OrderedDict()
+        self._by_user: dict[int, set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[TokenInfo]:
+        with self._lock:
+            item = self._entries.get(token)
+            if item is None or item[0] <= time.monotonic():
+                if item is not None:
+                    self._drop(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return item[1]
+
+    def put(self, token: str, info: TokenInfo) -> None:
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._drop(token)
+            self._entries[token] = (time.monotonic() + self.ttl, info)
+            self._by_user.setdefault(info.user_id, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, token: str) -> None:
+        item = self._entries.pop(token, None)
+        if item is not None:
+            tokens = self._by_user.get(item[1].user_id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._by_user[item[1].user_id]
+
+    def invalidate_token(self, token: str) -> None:
+        with self._lock:
+            self._drop(token)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            for token in list(self._by_user.get(user_id, ())):
+                self._drop(token)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+token_cache = TokenCache(AuthConfig.TOKEN_CACHE_TTL, AuthConfig.TOKEN_CACHE_MAXSIZE)
+
+
+def resolve_token(token: str) -> Optional[TokenInfo]:
+    """解析 token 为 (user_id, permission, expires_at)，优先命中缓存
+
+    未命中时用一条 authentications JOIN users 查询取齐三项并写入缓存。
+    不判断是否过期，由调用方比较 expires_at。
+
+    Args:
+        token: 认证 token 字符串
+
+    Returns:
+        TokenInfo 或 None（token 不存在）
+    """
+    if not token:
+        return None
+    info = token_cache.get(token)
+    if info is not None:
+        return info
+    row = (
+        db.session.query(Authentication.user_id, User.permission, Authentication.expires_at)
+        .outerjoin(User, User.id == Authentication.user_id)
+        .filter(Authentication.token == token)
+        .first()
+    )
+    if row is None:
+        return None
+    info = TokenInfo(user_id=row[0], permission=row[1], expires_at=row[2])
+    token_cache.put(token, info)
+    return info
+
+
+def invalidate_user_tokens(user_id: int) -> None:
+    """改密、删除用户、权限变更后调用，使该用户所有已缓存的 token 失效"""
+    token_cache.invalidate_user(user_id)
 
 
 def get_by_token(token: str) -> Optional[Authentication]:
@@ -29,9 +150,9 @@ def get_user_id_by_token(token: str) -> Optional[int]:
     Returns:
         关联的用户 ID 或 None
     """
-    auth = get_by_token(token)
-    if auth:
-        return auth.user_id
+    info = resolve_token(token)
+    if info:
+        return info.user_id
     return None
 
 def create_auth(token: str, user_id: int, expires_at: datetime, *, commit: bool = True) -> Authentication:
@@ -55,6 +176,7 @@ def create_auth(token: str, user_id: int, expires_at: datetime, *, commit: bool
     db.session.add(auth)
     if commit:
         db.session.commit()
+    token_cache.invalidate_token(token)
     return auth
 
 
@@ -68,6 +190,7 @@ def delete_auth(token: str, *, commit: bool = True) -> bool:
     Returns:
         是否成功删除
     """
+    token_cache.invalidate_token(token)
     auth = get_by_token(token)
     if auth:
         db.session.delete(auth)
@@ -86,8 +209,8 @@ def is_token_valid(token: str) -> bool:
     Returns:
         是否有效
     """
-    auth = get_by_token(token)
-    if auth and auth.expires_at > datetime.utcnow():
+    info = resolve_token(token)
+    if info and info.expires_at > datetime.utcnow():
         return True
     return False
 
@@ -1,6 +1,12 @@
 import datetime as dt
+from typing import Iterable
+from sqlalchemy import tuple_
 from ..extensions import db
 from ..models.container_ssh_login import ContainerSSHLogin
+from ..utils.ssh_time import parse_last_ssh_time
+
+# 单条 INSERT 语句携带的最大行数，避免超出 max_allowed_packet / SQLite 变量上限
+BULK_UPSERT_CHUNK_SIZE = 500
 
 
 def get_by_machine_container(machine_id: int, container_id: int) -> ContainerSSHLogin | None:
@@ -20,6 +26,7 @@ def upsert_last_ssh_login_time(
         db.session.add(record)
 
     record.last_ssh_login_time = last_ssh_login_time
+    record.last_ssh_at = parse_last_ssh_time(last_ssh_login_time)
     record.updated_at = dt.datetime.utcnow()
 
     if commit:
@@ -28,3 +35,133 @@ def upsert_last_ssh_login_time(
         db.session.flush()
     return record
 
+
+def _upsert_statement(dialect: str, values: list[dict]):
+    table = ContainerSSHLogin.__table__
+    if dialect in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(table).values(values)
+        return stmt.on_duplicate_key_update(
+            last_ssh_login_time=stmt.inserted.last_ssh_login_time,
+            last_ssh_at=stmt.inserted.last_ssh_at,
+            updated_at=stmt.inserted.updated_at,
+        )
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        stmt = sqlite_insert(table).values(values)
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        stmt = pg_insert(table).values(values)
+    else:
+        return None
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.machine_id, table.c.container_id],
+        set_={
+            "last_ssh_login_time": stmt.excluded.last_ssh_login_time,
+            "last_ssh_at": stmt.excluded.last_ssh_at,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+
+
+def bulk_upsert_last_ssh_login_time(
+    rows: Iterable[tuple[int, int, str | None]],
+    *,
+    commit: bool = True,
+) -> int:
+    """
+    批量写入 (machine_id, container_id, last_ssh_login_time)。
+    MySQL 使用 INSERT ... ON DUPLICATE KEY UPDATE，SQLite/PostgreSQL 使用 ON CONFLICT DO UPDATE，
+    每 BULK_UPSERT_CHUNK_SIZE 行一条语句；其余方言退化为逐行 upsert。
+    同一 (machine_id, container_id) 出现多次时以最后一次为准。返回写入的行数。
+    """
+    now = dt.datetime.utcnow()
+    dedup: dict[tuple[int, int], dict] = {}
+    for machine_id, container_id, last_ssh_login_time in rows:
+        dedup[(int(machine_id), int(container_id))] = {
+            "machine_id": int(machine_id),
+            "container_id": int(container_id),
+            "last_ssh_login_time": last_ssh_login_time,
+            "last_ssh_at": parse_last_ssh_time(last_ssh_login_time),
+            "updated_at": now,
+        }
+    values = list(dedup.values())
+    if not values:
+        return 0
+
+    dialect = db.session.get_bind().dialect.name
+    for i in range(0, len(values), BULK_UPSERT_CHUNK_SIZE):
+        chunk = values[i:i + BULK_UPSERT_CHUNK_SIZE]
+        stmt = _upsert_statement(dialect, chunk)
+        if stmt is None:
+            for v in chunk:
+                upsert_last_ssh_login_time(v["machine_id"], v["container_id"], v["last_ssh_login_time"], commit=False)
+            continue
+        db.session.execute(stmt)
+
+    if commit:
+        db.session.commit()
+    return len(values)
+
+
+def list_expired(
+    cutoff: dt.datetime,
+    *,
+    after: tuple[dt.datetime, int, int] | None = None,
+    limit: int = 200,
+) -> list[ContainerSSHLogin]:
+    """
+    索引范围查询：last_ssh_at <= cutoff 的记录，按 (last_ssh_at, machine_id, container_id) 排序。
+    after 为上一页最后一条的同序三元组（keyset 分页），避免 offset 随页数线性变慢。
+    """
+    q = ContainerSSHLogin.query.filter(
+        ContainerSSHLogin.last_ssh_at.isnot(None),
+        ContainerSSHLogin.last_ssh_at <= cutoff,
+    )
+    if after is not None:
+        q = q.filter(
+            tuple_(ContainerSSHLogin.last_ssh_at, ContainerSSHLogin.machine_id, ContainerSSHLogin.container_id)
+            > tuple_(*after)
+        )
+    return (
+        q.order_by(
+            ContainerSSHLogin.last_ssh_at.asc(),
+            ContainerSSHLogin.machine_id.asc(),
+            ContainerSSHLogin.container_id.asc(),
+        )
+        .limit(limit)
+        .all()
+    )
+
+
+def backfill_last_ssh_at(batch_size: int = 500) -> int:
+    """
+    为新增 last_ssh_at 列之前写入的历史记录补齐解析结果。
+    只扫描 last_ssh_at 为空且原始字符串非空的行；返回成功补齐的行数。
+    """
+    filled = 0
+    after: tuple[int, int] | None = None
+    while True:
+        q = ContainerSSHLogin.query.filter(
+            ContainerSSHLogin.last_ssh_at.is_(None),
+            ContainerSSHLogin.last_ssh_login_time.isnot(None),
+        )
+        if after is not None:
+            q = q.filter(tuple_(ContainerSSHLogin.machine_id, ContainerSSHLogin.container_id) > tuple_(*after))
+        rows = (
+            q.order_by(ContainerSSHLogin.machine_id.asc(), ContainerSSHLogin.container_id.asc())
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        after = (rows[-1].machine_id, rows[-1].container_id)
+        for r in rows:
+            parsed = parse_last_ssh_time(r.last_ssh_login_time)
+            if parsed is not None:
+                r.last_ssh_at = parsed
+                filled += 1
+        db.session.commit()
+        if len(rows) < batch_size:
+            break
+    return filled
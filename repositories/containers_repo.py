@@ -1,11 +1,13 @@
 """Container 仓储层: 提供容器 CRUD 与用户绑定操作"""
-from typing import Sequence, Any
+from typing import Iterable, Sequence, Any
 from ..extensions import db
 from ..models.containers import Container
 from ..models.user import User
 from ..models.machine import Machine
+from ..models.machine_permission import MachinePermission
 from ..utils.Container import Container_info
-from ..constant import ROLE
+from ..constant import ROLE, ContainerStatus
+from sqlalchemy import update
 from sqlalchemy.exc import IntegrityError
 from . import machine_repo
 from .machine_repo import get_max_gpu_number, get_max_swap_gb, get_max_cpu_core_number, get_max_memory_gb
@@ -22,20 +24,33 @@ def get_machine_id_by_container_id(container_id: int) -> int | None:
 	container = get_by_id(container_id)
 	return container.machine_id if container else None
 
-def list_containers(limit: int = 50, offset: int = 0, machine_id: int | None = None, user_id: int | None = None) -> Sequence[Container]:
-	q = Container.query
+def _filter_containers(q, machine_id: int | None = None, user_id: int | None = None, permitted_user_id: int | None = None):
 	if machine_id is not None:
 		q = q.filter_by(machine_id=machine_id)
-
 	if user_id is not None:
 		q = q.join(Container.users).filter(User.id == user_id)
+	if permitted_user_id is not None:
+		# 只保留该用户有机器权限的容器，过滤在数据库中完成
+		q = q.join(MachinePermission, MachinePermission.machine_id == Container.machine_id).filter(
+			MachinePermission.user_id == permitted_user_id
+		)
+	return q
+
+
+def list_containers(limit: int = 50, offset: int = 0, machine_id: int | None = None, user_id: int | None = None,
+		*, after_id: int | None = None, permitted_user_id: int | None = None) -> Sequence[Container]:
+	"""
+	按 id 升序分页。传入 after_id 时使用 keyset 分页（id > after_id，忽略 offset），
+	深页与首页代价相同；permitted_user_id 通过 machine_permissions 联表过滤可见机器。
+	"""
+	q = _filter_containers(Container.query, machine_id, user_id, permitted_user_id)
+	if after_id is not None:
+		return q.filter(Container.id > after_id).order_by(Container.id).limit(limit).all()
 	return q.order_by(Container.id).offset(offset).limit(limit).all()
 
 # 增加主要目的是为了增加可读性
-def count_containers(machine_id: int | None = None) -> int:
-    q = Container.query
-    if machine_id is not None:
-        q = q.filter_by(machine_id=machine_id)
+def count_containers(machine_id: int | None = None, *, permitted_user_id: int | None = None) -> int:
+    q = _filter_containers(Container.query, machine_id, None, permitted_user_id)
     return q.count()
 
 
@@ -68,12 +83,64 @@ def update_container(container_id: int, *, commit: bool = True, **fields) -> Con
 	return container
 
 
+def transition_machine_containers(
+	machine_id: int,
+	to_status: ContainerStatus,
+	*,
+	from_statuses: Iterable[ContainerStatus] | None = None,
+	commit: bool = True,
+) -> list[int]:
+	"""
+	批量状态迁移：把机器上状态属于 from_statuses 的容器一次性改为 to_status，返回受影响的容器 id。
+	from_statuses 为 None 时表示除 to_status 以外的所有状态。
+	支持 UPDATE ... RETURNING 的方言（SQLite/PostgreSQL）只发一条语句；
+	MySQL/MariaDB 先 SELECT ... FOR UPDATE 锁定目标行再按主键 UPDATE。
+	"""
+	if from_statuses is None:
+		sources = [s for s in ContainerStatus if s != to_status]
+	else:
+		sources = [s for s in from_statuses if s != to_status]
+	if not sources:
+		return []
+	cond = (Container.machine_id == machine_id, Container.container_status.in_(sources))
+	return _apply_status(cond, to_status, commit=commit)
+
+
+def set_containers_status(container_ids: Iterable[int], status: ContainerStatus, *, commit: bool = True) -> list[int]:
+	"""按主键批量设置容器状态（跳过已是该状态的行），返回受影响的容器 id。"""
+	ids = sorted({int(i) for i in container_ids if i})
+	if not ids:
+		return []
+	cond = (Container.id.in_(ids), Container.container_status != status)
+	return _apply_status(cond, status, commit=commit)
+
+
+def _apply_status(cond: tuple, status: ContainerStatus, *, commit: bool) -> list[int]:
+	stmt = update(Container).where(*cond).values(container_status=status)
+	if db.session.get_bind().dialect.update_returning:
+		ids = [row[0] for row in db.session.execute(stmt.returning(Container.id))]
+	else:
+		ids = [cid for (cid,) in db.session.query(Container.id).filter(*cond).with_for_update().all()]
+		if ids:
+			db.session.execute(
+				update(Container).where(Container.id.in_(ids)).values(container_status=status),
+				execution_options={"synchronize_session": "fetch"},
+			)
+	if commit:
+		db.session.commit()
+	else:
+		db.session.flush()
+	return sorted(ids)
+
+
 def delete_container(container_id: int) -> bool:
 	container = get_by_id(container_id)
 	if not container:
 		return False
+	machine_id, port = container.machine_id, container.port
 	db.session.delete(container)
 	db.session.commit()
+	machine_repo.release_port(machine_id, port)
 	return True
 
 
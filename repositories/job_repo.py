@@ -0,0 +1,181 @@
+import datetime as dt
+import json
+import uuid
+from typing import Sequence
+from sqlalchemy import update
+from ..extensions import db
+from ..models.job import Job
+from ..constant import JobStatus
+
+
+def create_job(kind: str, payload: dict, *, operator_user_id: int | None = None, max_attempts: int = 3,
+               commit: bool = True) -> Job:
+    job = Job(
+        job_id=uuid.uuid4().hex,
+        kind=kind,
+        status=JobStatus.QUEUED,
+        payload=json.dumps(payload),
+        operator_user_id=operator_user_id,
+        max_attempts=max(1, int(max_attempts)),
+    )
+    db.session.add(job)
+    if commit:
+        db.session.commit()
+    else:
+        db.session.flush()
+    return job
+
+
+def create_finished_job(kind: str, payload: dict, result: dict, *, operator_user_id: int | None = None,
+                        started_at: dt.datetime | None = None) -> Job:
+    """
+    记录一个在请求线程中同步完成的任务（如批量派发），直接以 succeeded 写入，不会被执行线程领取；
+    之后与其它任务一样通过 job_id 查询。
+    """
+    now = dt.datetime.utcnow()
+    job = Job(
+        job_id=uuid.uuid4().hex,
+        kind=kind,
+        status=JobStatus.SUCCEEDED,
+        payload=json.dumps(payload),
+        result=json.dumps(result),
+        operator_user_id=operator_user_id,
+        attempts=1,
+        max_attempts=1,
+        created_at=started_at or now,
+        started_at=started_at or now,
+        finished_at=now,
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def get_by_job_id(job_id: str) -> Job | None:
+    return Job.query.filter_by(job_id=job_id).first()
+
+
+def count_active() -> int:
+    """排队中 + 执行中的任务数，用于入队时的背压判断。"""
+    return Job.query.filter(Job.status.in_([JobStatus.QUEUED, JobStatus.RUNNING])).count()
+
+
+def count_queued_before(job: Job) -> int:
+    return Job.query.filter(Job.status == JobStatus.QUEUED, Job.id < job.id).count()
+
+
+def count_running() -> int:
+    return Job.query.filter(Job.status == JobStatus.RUNNING).count()
+
+
+def claim_next(worker: str, lease_seconds: float, *, scan: int = 8) -> Job | None:
+    """
+    领取队首任务：条件 UPDATE（status 仍为 queued 才成功）保证多个线程/进程不会领到同一任务。
+    """
+    candidates = [
+        row.id for row in
+        db.session.execute(
+            db.select(Job.id).where(Job.status == JobStatus.QUEUED).order_by(Job.id).limit(scan)
+        ).all()
+    ]
+    now = dt.datetime.utcnow()
+    for pk in candidates:
+        res = db.session.execute(
+            update(Job)
+            .where(Job.id == pk, Job.status == JobStatus.QUEUED)
+            .values(
+                status=JobStatus.RUNNING,
+                worker=worker,
+                attempts=Job.attempts + 1,
+                started_at=now,
+                lease_until=now + dt.timedelta(seconds=lease_seconds),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if res.rowcount == 1:
+            return db.session.get(Job, pk, populate_existing=True)
+    return None
+
+
+def renew_leases(job_ids: Sequence[int], lease_seconds: float) -> int:
+    if not job_ids:
+        return 0
+    res = db.session.execute(
+        update(Job)
+        .where(Job.id.in_(list(job_ids)), Job.status == JobStatus.RUNNING)
+        .values(lease_until=dt.datetime.utcnow() + dt.timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return res.rowcount or 0
+
+
+def finish_job(pk: int, status: JobStatus, *, result: dict | None = None, error_reason: str | None = None,
+               message: str | None = None) -> None:
+    db.session.execute(
+        update(Job)
+        .where(Job.id == pk)
+        .values(
+            status=status,
+            result=json.dumps(result) if result is not None else None,
+            error_reason=error_reason,
+            message=message,
+            finished_at=dt.datetime.utcnow(),
+            lease_until=None,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def set_running_result(pk: int, result: dict) -> bool:
+    """执行中的任务写入中间结果（如进度），供其它进程通过任务状态读取；任务已结束时不覆盖。"""
+    res = db.session.execute(
+        update(Job)
+        .where(Job.id == pk, Job.status == JobStatus.RUNNING)
+        .values(result=json.dumps(result))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return res.rowcount == 1
+
+
+def list_recent(kind: str, limit: int = 50) -> Sequence[Job]:
+    """最近入队的同类任务（新的在前）。"""
+    return Job.query.filter(Job.kind == kind).order_by(Job.id.desc()).limit(limit).all()
+
+
+def recover_expired_leases() -> tuple[int, int]:
+    """
+    执行进程已退出（租约过期）的 running 任务：未用完重试次数的放回队列，否则标记失败。
+    返回 (重新入队数, 失败数)。
+    """
+    now = dt.datetime.utcnow()
+    expired = (Job.status == JobStatus.RUNNING) & (Job.lease_until < now)
+    requeued = db.session.execute(
+        update(Job)
+        .where(expired, Job.attempts < Job.max_attempts)
+        .values(status=JobStatus.QUEUED, worker=None, lease_until=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount or 0
+    failed = db.session.execute(
+        update(Job)
+        .where(expired)
+        .values(status=JobStatus.FAILED, error_reason="lease_expired", finished_at=now, lease_until=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount or 0
+    db.session.commit()
+    return requeued, failed
+
+
+def recent_durations(kind: str, limit: int = 50) -> list[float]:
+    """最近完成的同类任务耗时（秒），用于估算 ETA。"""
+    rows = db.session.execute(
+        db.select(Job.started_at, Job.finished_at)
+        .where(Job.kind == kind, Job.status == JobStatus.SUCCEEDED,
+               Job.started_at.is_not(None), Job.finished_at.is_not(None))
+        .order_by(Job.id.desc())
+        .limit(limit)
+    ).all()
+    return [(r.finished_at - r.started_at).total_seconds() for r in rows]
@@ -4,7 +4,8 @@ from typing import Sequence
 from ..models.machine import MachineTypes
 from ..models.machine import MachineStatus
 from ..models.containers import Container as model_Container
-from sqlalchemy import func
+from sqlalchemy import func, update
+from ..utils.port_allocator import PortAllocator
 
 def get_by_id(machine_id:int):
     return Machine.query.get(machine_id)
@@ -19,31 +20,60 @@ def get_machine_ip_by_id(machine_id:int)->str:
         raise ValueError(f"Machine with ID {machine_id} not found.")
     return machine.machine_ip
 
-def get_the_first_free_port(machine_id:int)->int:
+def _list_used_ports(machine_id:int)->list[int]:
     # 查询该机器上所有容器已使用的端口
-    used_ports = set(
+    return [
         port for (port,) in db.session.query(model_Container.port)
         .filter(model_Container.machine_id == machine_id, model_Container.port.isnot(None))
         .all()
-    )
-    
-    # 定义端口范围 (1024-49151)
-    PORT_START = 1024
-    PORT_END = 49151
-    
-    # 查找第一个可用端口
-    for port in range(PORT_START, PORT_END + 1):
-        if port not in used_ports:
-            return port
-    
-    # 如果所有端口都被占用，抛出异常
-    raise RuntimeError(f"No free ports available on machine {machine_id}")
+    ]
+
+
+def _port_in_use(machine_id:int, port:int)->bool:
+    # 其它进程可能已占用该端口，分配前以数据库为准
+    return db.session.query(model_Container.id).filter(
+        model_Container.machine_id == machine_id, model_Container.port == port
+    ).first() is not None
+
+
+# 进程内端口分配器：首次使用时从数据库重建，之后在内存中按区间分配，返回前逐个到数据库核对
+port_allocator = PortAllocator(_list_used_ports, is_taken=_port_in_use)
+
+
+def get_the_first_free_port(machine_id:int)->int:
+    """
+    原子地预留该机器上最小的空闲端口 (1024-49151)。
+    调用方在容器记录落库后应调用 confirm_port，创建失败时调用 abandon_port。
+    """
+    return port_allocator.reserve(machine_id)
+
+
+def confirm_port(machine_id:int, port:int)->None:
+    port_allocator.confirm(machine_id, port)
+
+
+def release_port(machine_id:int, port:int|None)->None:
+    port_allocator.release(machine_id, port)
+
+
+def abandon_port(machine_id:int, port:int|None)->None:
+    port_allocator.abandon(machine_id, port)
+
+
+def is_port_conflict(error:Exception)->bool:
+    # containers (machine_id, port) 唯一约束冲突：sqlite 报列名，MySQL/PostgreSQL 报约束名
+    msg = str(getattr(error, 'orig', None) or error)
+    return 'uq_container_machine_port' in msg or 'containers.port' in msg
 
 def get_by_name(machine_name:str):
     return Machine.query.filter_by(machine_name=machine_name).first()
 
-def list_machines(limit: int = 50, offset: int = 0) -> Sequence[Machine]:
-	return Machine.query.order_by(Machine.id).offset(offset).limit(limit).all()
+def list_machines(limit: int = 50, offset: int = 0, *, after_id: int | None = None) -> Sequence[Machine]:
+	"""按 id 升序分页；传入 after_id 时使用 keyset 分页（id > after_id，忽略 offset）。"""
+	q = Machine.query
+	if after_id is not None:
+		return q.filter(Machine.id > after_id).order_by(Machine.id).limit(limit).all()
+	return q.order_by(Machine.id).offset(offset).limit(limit).all()
 
 def count_machines() -> int: # 增加的额外方法 只辅助用于计算总数
     """Return total number of machines in DB."""
@@ -119,6 +149,24 @@ def update_machine(machine_id: int, *, commit: bool = True, **fields) -> bool:
     return True
 
 
+def transition_machine_status(machine_id:int, observed:MachineStatus, target:MachineStatus, *, commit:bool=True)->bool:
+    """
+    条件更新机器状态：UPDATE ... WHERE id=:id AND machine_status=:observed。
+    只有机器仍处于 observed 时才写入 target，避免用过期的机器对象覆盖其它请求刚写入的状态
+    （例如探测期间管理员把机器切到维护）。返回是否真正更新了该行。
+    """
+    result = db.session.execute(
+        update(Machine)
+        .where(Machine.id == machine_id, Machine.machine_status == observed)
+        .values(machine_status=target)
+    )
+    if commit:
+        db.session.commit()
+    else:
+        db.session.flush()
+    return result.rowcount == 1
+
+
 def get_max_cpu_core_number(machine_id:int) -> int:
     """用于取数据库里的max_cpu_core_number字段。"""
     max_val = db.session.query(Machine.max_cpu_core_number).filter(Machine.id == machine_id).scalar()
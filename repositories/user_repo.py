@@ -6,7 +6,7 @@ from typing import Sequence
 from ..extensions import db
 from ..models.user import User
 from ..constant import PERMISSION
-from .authentications_repo import get_user_id_by_token
+from .authentications_repo import get_user_id_by_token, resolve_token, invalidate_user_tokens
 
 
 def get_by_id(user_id: int) -> User | None:
@@ -23,8 +23,12 @@ def get_by_name(username: str) -> User | None:
 	return User.query.filter_by(username=username).first()
 
 
-def list_users(limit: int = 50, offset: int = 0) -> Sequence[User]:
-	return User.query.order_by(User.id).offset(offset).limit(limit).all()
+def list_users(limit: int = 50, offset: int = 0, *, after_id: int | None = None) -> Sequence[User]:
+	"""按 id 升序分页；传入 after_id 时使用 keyset 分页（id > after_id，忽略 offset）。"""
+	q = User.query
+	if after_id is not None:
+		return q.filter(User.id > after_id).order_by(User.id).limit(limit).all()
+	return q.order_by(User.id).offset(offset).limit(limit).all()
 
 
 def create_user(username: str, email: str, password_hash: str, graduation_year: str) -> User:
@@ -65,6 +69,9 @@ def update_user(user_id: int, *, commit: bool = True, **fields) -> User | None:
     if dirty:
        
        db.session.commit()
+       # 改密等敏感字段变化后，已缓存的 token 解析结果需要失效
+       if "password_hash" in fields:
+           invalidate_user_tokens(user_id)
     return user
 
 
@@ -75,15 +82,16 @@ def delete_user(user_id: int) -> bool:
 		return False
 	db.session.delete(user)
 	db.session.commit()
+	invalidate_user_tokens(user_id)
 	return True
 
 def check_permission(token: str, required_permission: PERMISSION) -> bool:
-    user_id = get_user_id_by_token(token)
+    # token 解析结果（含用户权限）走缓存，同一请求内不再重复查询 users 表
+    info = resolve_token(token)
 
-    if not user_id:
+    if not info or not info.user_id:
         return False
-    user = get_by_id(user_id)
-    if not user:
+    if info.permission is None:
         return False
 
     # 这里是迎合数据库返回内容；保证兼容性。
@@ -91,7 +99,7 @@ def check_permission(token: str, required_permission: PERMISSION) -> bool:
     def _norm(p):
         return p.value if hasattr(p, "value") else p
 
-    user_perm = _norm(user.permission)
+    user_perm = _norm(info.permission)
     req_perm = _norm(required_permission)
 
     cast_permission = {
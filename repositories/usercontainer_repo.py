@@ -3,9 +3,11 @@
 """
 from typing import Sequence, Any, Optional
 from pydantic import BaseModel
+from sqlalchemy import case, func
 from ..extensions import db
 from ..models.user import User
 from ..models.containers import Container
+from ..models.machine import Machine
 from ..models.usercontainer import UserContainer
 from ..constant import ROLE, ContainerStatus
 from . import containers_repo
@@ -92,6 +94,48 @@ def get_container_bindings(container_id:int)->Sequence[dict]:
     return bindings
 
 
+def get_container_detail(container_id: int) -> dict | None:
+    """
+    容器详情一次联表查询取齐：容器本身、所在机器的 IP/状态，以及全部绑定及其系统用户名。
+    返回 {"container", "machine_ip", "machine_status", "bindings": [{user_id, username, role, owner_name}]}；
+    容器不存在时返回 None。
+    """
+    rows = db.session.execute(
+        db.select(
+            Container,
+            Machine.machine_ip,
+            Machine.machine_status,
+            uc.c.user_id,
+            uc.c.username,
+            uc.c.role,
+            User.username.label("owner_name"),
+        )
+        .select_from(Container)
+        .outerjoin(Machine, Machine.id == Container.machine_id)
+        .outerjoin(uc, uc.c.container_id == Container.id)
+        .outerjoin(User, User.id == uc.c.user_id)
+        .where(Container.id == container_id)
+        .order_by(uc.c.user_id)
+    ).all()
+    if not rows:
+        return None
+    first = rows[0]
+    return {
+        "container": first[0],
+        "machine_ip": first.machine_ip,
+        "machine_status": first.machine_status,
+        "bindings": [
+            {
+                "user_id": row.user_id,
+                "username": row.username,
+                "role": row.role,
+                "owner_name": row.owner_name,
+            }
+            for row in rows if row.user_id is not None
+        ],
+    }
+
+
 def add_binding(
     user_id: int,
     container_id: int,
@@ -213,55 +257,46 @@ def update_binding(
 
 # 加入这个方法主要是提供更好的界面统计数据
 def compute_user_container_counts(user_id: int) -> dict:
-    bindings = get_user_bindings(user_id) or []
-    container_ids = [b.get('container_id') for b in bindings]
-    total = len(container_ids)
-    functional = 0
-    managed = 0
+    return compute_users_container_counts([user_id])[user_id]
 
-    for b in bindings:
-        try:
-            role_val = b.get('role')
-            cid = b.get('container_id')
-            if cid is None:
-                continue
-
-            # fetch container to check status
-            container = containers_repo.get_by_id(int(cid))
-            is_online = False
-            if container and getattr(container, 'container_status', None) is not None:
-                try:
-                    is_online = (
-                        container.container_status == ContainerStatus.ONLINE
-                        or getattr(container.container_status, 'value', None) == ContainerStatus.ONLINE.value
-                    )
-                except Exception:
-                    is_online = (str(container.container_status).lower() == ContainerStatus.ONLINE.value)
-
-            if is_online:
-                functional += 1
-
-            # 这里是有时候会检测不到 故做了这样的设计
-            # 这里因为枚举是str，所以做了一次统一转换
-            try:
-                if isinstance(role_val, ROLE):
-                    role_name = role_val.value
-                else:
-                    role_name = str(role_val)
-            except Exception:
-                role_name = str(role_val)
-
-            if role_name == ROLE.ADMIN.value or role_name == ROLE.ROOT.value:
-                managed += 1
-        except Exception:
-            continue
 
-    return {
-        'container_ids': container_ids,
-        'total': total,
-        'functional': functional,
-        'managed': managed,
+def compute_users_container_counts(user_ids: Sequence[int]) -> dict[int, dict]:
+    """
+    一次性计算一页用户的容器统计，固定两条查询（与用户数、容器数无关）：
+    1) 按 user_id 分组聚合 total / functional（容器在线）/ managed（ADMIN 或 ROOT 角色）
+    2) 取出这些用户绑定的容器 id 列表
+    返回 {user_id: {'container_ids', 'total', 'functional', 'managed'}}，没有绑定的用户计数为 0。
+    """
+    ids = list(dict.fromkeys(int(u) for u in user_ids if u is not None))
+    out = {
+        uid: {'container_ids': [], 'total': 0, 'functional': 0, 'managed': 0}
+        for uid in ids
     }
+    if not ids:
+        return out
+
+    counts = db.session.execute(
+        db.select(
+            uc.c.user_id,
+            func.count(uc.c.container_id),
+            func.sum(case((Container.container_status == ContainerStatus.ONLINE, 1), else_=0)),
+            func.sum(case((uc.c.role.in_([ROLE.ADMIN, ROLE.ROOT]), 1), else_=0)),
+        )
+        .select_from(uc.outerjoin(Container, Container.id == uc.c.container_id))
+        .where(uc.c.user_id.in_(ids))
+        .group_by(uc.c.user_id)
+    ).all()
+    for uid, total, functional, managed in counts:
+        out[uid].update(total=int(total or 0), functional=int(functional or 0), managed=int(managed or 0))
+
+    rows = db.session.execute(
+        db.select(uc.c.user_id, uc.c.container_id)
+        .where(uc.c.user_id.in_(ids))
+        .order_by(uc.c.user_id, uc.c.container_id)
+    ).all()
+    for uid, cid in rows:
+        out[uid]['container_ids'].append(cid)
+    return out
 
 
 def remove_user_from_all_containers(user_id: int) -> dict:
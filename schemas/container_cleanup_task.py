@@ -1,38 +1,164 @@
 import threading
 import time
-from flask import Flask
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import Flask, current_app
 
-from ..models.container_ssh_login import ContainerSSHLogin
+from ..config import AppConfig
+from ..constant import MachineStatus
+from ..repositories import container_ssh_login_repo, machine_repo
 from ..services import container_tasks
+from ..services.machine_tasks import is_machine_online_remote
 
 
-def cleanup_expired_containers_once(cleanup_after_days: int) -> None:
+def _machine_available(machine_id: int) -> bool:
+    """每轮每台机器只检查一次：数据库状态非维护/离线，且节点远程可达。"""
+    try:
+        m = machine_repo.get_by_id(machine_id)
+    except Exception:
+        m = None
+    if not m:
+        return False
+    status = getattr(getattr(m, 'machine_status', None), 'value', None)
+    if status in (MachineStatus.OFFLINE.value, MachineStatus.MAINTENANCE.value):
+        return False
+    return is_machine_online_remote(machine_id)
+
+
+def _remove_lane(app, machine_id: int, queue: deque, lock: threading.Lock, out: list, active: dict):
+    """
+    同一台机器的一条删除通道：从该机器的队列中依次取容器删除，队列取空后退出。
+    每台机器最多开 per_machine 条通道（active 记录当前通道数），以此限制单机并发。
+    """
+    while True:
+        with lock:
+            if not queue:
+                active[machine_id] -= 1
+                return
+            cid = queue.popleft()
+        started = time.time()
+        ok, err = False, None
+        try:
+            if app is not None:
+                with app.app_context():
+                    ok = bool(container_tasks.remove_container(container_id=int(cid), check_online=False))
+            else:
+                ok = bool(container_tasks.remove_container(container_id=int(cid), check_online=False))
+        except Exception as e:
+            err = e
+        latency = time.time() - started
+        if ok:
+            print(f"[container-cleanup] removed container_id={cid} in {latency:.2f}s")
+        elif err is not None:
+            print(f"[container-cleanup] failed for machine_id={machine_id} container_id={cid}: {err}")
+        else:
+            print(f"[container-cleanup] remove returned False for container_id={cid}")
+        with lock:
+            out.append((cid, ok, latency))
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(q * (len(s) - 1))))]
+
+
+def cleanup_expired_containers_once(
+    cleanup_after_days: int,
+    page_size: int = 500,
+    max_workers: int | None = None,
+    per_machine: int | None = None,
+) -> dict:
     """
     单次扫描：查找已过期容器并释放。
     注意：这里只调用现有 remove_container，不在此处实现新的清理机制。
+    - 到期判断在数据库侧完成：对已索引的 last_ssh_at 做范围查询并按 keyset 分页
+    - 每台机器本轮只检查一次在线状态，不可用的机器整体跳过
+    - 不同机器之间并发删除，单台机器同时最多 per_machine 个删除请求
+    - 整轮共用一个线程池，分页只负责把到期容器追加到各机器的队列，不在页与页之间等待
+    max_workers / per_machine 为空时使用 CONTAINER_CLEANUP_MAX_WORKERS / CONTAINER_CLEANUP_PER_MACHINE。
+    返回本轮统计：到期/删除/失败数量、吞吐量、单容器耗时分布等。
     """
     if cleanup_after_days <= 0:
         cleanup_after_days = 1
+    try:
+        app = current_app._get_current_object()
+    except RuntimeError:
+        app = None
+    config = app.config if app is not None else {}
+    if max_workers is None:
+        max_workers = config.get("CONTAINER_CLEANUP_MAX_WORKERS") or AppConfig.CONTAINER_CLEANUP_MAX_WORKERS
+    if per_machine is None:
+        per_machine = config.get("CONTAINER_CLEANUP_PER_MACHINE") or AppConfig.CONTAINER_CLEANUP_PER_MACHINE
+    workers = max(1, int(max_workers))
+    lanes_per_machine = max(1, int(per_machine))
 
-    records = ContainerSSHLogin.query.all()
-    for rec in records:
-        try:
-            info = container_tasks.build_cleanup_info(rec.last_ssh_login_time, cleanup_after_days)
-            if info.get("cleanup_status") != "due":
-                continue
-
-            cid = int(rec.container_id)
-            print(f"[container-cleanup] container_id={cid} due for cleanup, removing...")
-            ok = container_tasks.remove_container(container_id=cid)
-            if ok:
-                print(f"[container-cleanup] removed container_id={cid}")
-            else:
-                print(f"[container-cleanup] remove returned False for container_id={cid}")
-        except Exception as e:
-            print(
-                f"[container-cleanup] failed for machine_id={getattr(rec, 'machine_id', '?')} "
-                f"container_id={getattr(rec, 'container_id', '?')}: {e}"
-            )
+    started = time.time()
+    cutoff = datetime.utcnow() - timedelta(days=cleanup_after_days)
+    report = {"due": 0, "removed": 0, "failed": 0, "skipped_machines": []}
+    machine_ok: dict[int, bool] = {}
+    latencies: list[float] = []
+    # 整轮共享：每台机器一个待删除队列与当前通道数
+    queues: dict[int, deque] = {}
+    active: dict[int, int] = {}
+    results: list[tuple[int, bool, float]] = []
+    lock = threading.Lock()
+    after = None
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="container-cleanup") as executor:
+        while True:
+            page = container_ssh_login_repo.list_expired(cutoff, after=after, limit=page_size)
+            if not page:
+                break
+            # 先取出主键，remove_container 提交后 ORM 对象会过期/被删除
+            targets = [(rec.last_ssh_at, rec.machine_id, rec.container_id) for rec in page]
+            after = targets[-1]
+            report["due"] += len(targets)
+
+            for _, mid, cid in targets:
+                if mid not in machine_ok:
+                    try:
+                        machine_ok[mid] = _machine_available(mid)
+                    except Exception:
+                        machine_ok[mid] = False
+                    if not machine_ok[mid]:
+                        report["skipped_machines"].append(mid)
+                        print(f"[container-cleanup] machine_id={mid} unavailable, skipping its due containers")
+                if not machine_ok[mid]:
+                    continue
+                with lock:
+                    queues.setdefault(mid, deque()).append(cid)
+                    # 通道数未达上限时新开一条；已有通道会继续取走后续追加的容器
+                    if active.get(mid, 0) < lanes_per_machine:
+                        active[mid] = active.get(mid, 0) + 1
+                        executor.submit(_remove_lane, app, mid, queues[mid], lock, results, active)
+
+            if len(targets) < page_size:
+                break
+
+    for _, ok, latency in results:
+        latencies.append(latency)
+        if ok:
+            report["removed"] += 1
+        else:
+            report["failed"] += 1
+
+    duration = time.time() - started
+    report["duration"] = duration
+    report["throughput"] = (report["removed"] / duration) if duration > 0 else 0.0
+    report["latency"] = {
+        "p50": _percentile(latencies, 0.5),
+        "p95": _percentile(latencies, 0.95),
+        "max": max(latencies) if latencies else 0.0,
+    }
+    if report["due"]:
+        print(
+            f"[container-cleanup] sweep done in {duration:.2f}s: due={report['due']} removed={report['removed']} "
+            f"failed={report['failed']} throughput={report['throughput']:.2f}/s "
+            f"p95={report['latency']['p95']:.2f}s skipped_machines={report['skipped_machines']}"
+        )
+    return report
 
 
 def start_container_cleanup_scheduler(
@@ -52,25 +178,35 @@ def start_container_cleanup_scheduler(
             return t
 
     stop_event = threading.Event()
+    state = {"stop_event": stop_event, "last_report": None}
 
-    def _worker():
+    def _run_once():
         with app.app_context():
             days = int(app.config.get("CONTAINER_CLEANUP_AFTER_DAYS", 7) or 7)
-            cleanup_expired_containers_once(days)
+            state["last_report"] = cleanup_expired_containers_once(days)
+
+    def _worker():
+        with app.app_context():
+            # 旧版本写入的记录没有 last_ssh_at，启动时补齐一次
+            try:
+                n = container_ssh_login_repo.backfill_last_ssh_at()
+                if n:
+                    print(f"[container-cleanup] backfilled last_ssh_at for {n} records")
+            except Exception as e:
+                print(f"[container-cleanup] backfill last_ssh_at failed: {e}")
+        _run_once()
 
         while not stop_event.is_set():
             time.sleep(interval_seconds)
             if stop_event.is_set():
                 break
             try:
-                with app.app_context():
-                    days = int(app.config.get("CONTAINER_CLEANUP_AFTER_DAYS", 7) or 7)
-                    cleanup_expired_containers_once(days)
+                _run_once()
             except Exception as e:
                 print(f"[container-cleanup] periodic run failed: {e}")
 
     t = threading.Thread(target=_worker, daemon=True, name="container-cleanup")
     t.start()
-    app.extensions[key] = {"thread": t, "stop_event": stop_event}
+    state["thread"] = t
+    app.extensions[key] = state
     return t
-
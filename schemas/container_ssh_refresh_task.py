@@ -1,39 +1,115 @@
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask
 
-from ..repositories import containers_repo
+from ..config import CommsConfig
+from ..constant import MachineStatus
+from ..extensions import db
+from ..repositories import containers_repo, machine_repo, container_ssh_login_repo
 from ..services import container_tasks
 
 
-def refresh_all_containers_last_ssh_login_time_once(page_size: int = 200) -> None:
+def _fetch_machine(machine_ip: str, containers: list[tuple[int, str]]) -> dict:
+    """
+    在线程池中执行：同一台机器上的容器合并为一次批量查询，只做 Node 通信，不访问数据库。
+    """
+    started = time.time()
+    rows, failed = [], 0
+    try:
+        results = container_tasks.fetch_containers_last_ssh_time(machine_ip, [name for _, name in containers])
+    except Exception as e:
+        results = {name: e for _, name in containers}
+    for cid, name in containers:
+        value = results.get(name, RuntimeError("missing in batch response"))
+        if isinstance(value, Exception):
+            failed += 1
+            print(f"[ssh-refresh] failed for container id={cid} name={name}: {value}")
+            continue
+        rows.append((cid, value))
+    return {"rows": rows, "failed": failed, "latency": time.time() - started}
+
+
+def refresh_all_containers_last_ssh_login_time_once(page_size: int = 200, max_workers: int | None = None) -> dict:
     """
     单次刷新：遍历所有容器，向各节点拉取并落库“上次 SSH 登录时间”。
+    - 按机器分组，机器之间在有界线程池中并发，同一机器内合并为一次批量请求
+    - 已知离线/维护中的机器直接跳过
+    - 每一页结果在当前线程中通过一条批量 upsert 写入并提交
+    返回本轮统计：耗时、各机器延迟、跳过的机器等。
     """
-    offset = 0
+    started = time.time()
+    workers = max(1, int(max_workers or CommsConfig.NODE_FANOUT_WORKERS))
+    report = {
+        "containers": 0,
+        "updated": 0,
+        "failed": 0,
+        "skipped_machines": [],
+        "machine_latency": {},
+    }
+    machines: dict[int, object] = {}
+
+    after_id = None
     while True:
+        # keyset 分页：深页与首页代价相同
         containers = containers_repo.list_containers(
             limit=page_size,
-            offset=offset,
             machine_id=None,
             user_id=None,
+            after_id=after_id,
         )
         if not containers:
             break
+        report["containers"] += len(containers)
 
+        groups: dict[int, list[tuple[int, str]]] = {}
         for c in containers:
-            try:
-                # 该函数内部会把结果（含 None）写入 container_ssh_login_records
-                container_tasks.get_container_last_ssh_login_time(c.id)
-            except Exception as e:
-                print(
-                    f"[ssh-refresh] failed for container id={getattr(c, 'id', '?')} "
-                    f"name={getattr(c, 'name', '?')}: {e}"
-                )
+            groups.setdefault(c.machine_id, []).append((c.id, c.name))
+
+        jobs: dict[int, str] = {}
+        for mid in groups:
+            if mid not in machines:
+                try:
+                    machines[mid] = machine_repo.get_by_id(mid)
+                except Exception:
+                    machines[mid] = None
+            m = machines[mid]
+            status = getattr(getattr(m, 'machine_status', None), 'value', None) if m else None
+            if not m or not m.machine_ip or status in (MachineStatus.OFFLINE.value, MachineStatus.MAINTENANCE.value):
+                if mid not in report["skipped_machines"]:
+                    report["skipped_machines"].append(mid)
+                continue
+            jobs[mid] = m.machine_ip
+
+        results: dict[int, dict] = {}
+        if jobs:
+            with ThreadPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+                futures = {mid: executor.submit(_fetch_machine, ip, groups[mid]) for mid, ip in jobs.items()}
+            for mid, fut in futures.items():
+                results[mid] = fut.result()
+
+        rows: list[tuple[int, int, str | None]] = []
+        for mid, r in results.items():
+            report["failed"] += r["failed"]
+            report["machine_latency"][mid] = report["machine_latency"].get(mid, 0.0) + r["latency"]
+            rows.extend((mid, cid, last_time) for cid, last_time in r["rows"])
+        try:
+            # 整页结果一条 upsert 语句写入
+            report["updated"] += container_ssh_login_repo.bulk_upsert_last_ssh_login_time(rows, commit=True)
+        except Exception as e:
+            db.session.rollback()
+            print(f"[ssh-refresh] failed to persist batch after id={after_id}: {e}")
 
         if len(containers) < page_size:
             break
-        offset += page_size
+        after_id = containers[-1].id
+
+    report["duration"] = time.time() - started
+    print(
+        f"[ssh-refresh] sweep done in {report['duration']:.2f}s: containers={report['containers']} "
+        f"updated={report['updated']} failed={report['failed']} skipped_machines={report['skipped_machines']}"
+    )
+    return report
 
 
 def start_container_ssh_refresh_scheduler(
@@ -44,6 +120,7 @@ def start_container_ssh_refresh_scheduler(
     启动后台定时任务：
     - 首次启动立即执行一次
     - 之后每 interval_seconds（默认 300s = 5min）执行一次
+    - 单轮耗时超过 interval_seconds 记为一次 overrun
     """
     key = "container_ssh_refresh_scheduler"
     existing = app.extensions.get(key)
@@ -53,25 +130,32 @@ def start_container_ssh_refresh_scheduler(
             return t
 
     stop_event = threading.Event()
+    state = {"stop_event": stop_event, "last_report": None, "overruns": 0}
+
+    def _run_once():
+        with app.app_context():
+            report = refresh_all_containers_last_ssh_login_time_once()
+        state["last_report"] = report
+        if report.get("duration", 0) > interval_seconds:
+            state["overruns"] += 1
+            print(f"[ssh-refresh] overrun: sweep took {report['duration']:.2f}s > interval {interval_seconds}s")
 
     def _worker():
         # 启动后先跑一次，避免冷启动后长时间没有数据
-        with app.app_context():
-            refresh_all_containers_last_ssh_login_time_once()
+        _run_once()
 
         while not stop_event.is_set():
             time.sleep(interval_seconds)
             if stop_event.is_set():
                 break
             try:
-                with app.app_context():
-                    refresh_all_containers_last_ssh_login_time_once()
+                _run_once()
             except Exception as e:
                 print(f"[ssh-refresh] periodic run failed: {e}")
 
     t = threading.Thread(target=_worker, daemon=True, name="container-ssh-refresh")
     t.start()
 
-    app.extensions[key] = {"thread": t, "stop_event": stop_event}
+    state["thread"] = t
+    app.extensions[key] = state
     return t
-
@@ -0,0 +1,107 @@
+import os
+import socket
+import threading
+from flask import Flask
+
+from ..config import JobConfig
+from ..repositories import job_repo
+from ..services import job_tasks
+
+# 本进程内启动过的执行器状态，便于统一停止（测试、优雅退出）
+_states: list[dict] = []
+_states_lock = threading.Lock()
+
+
+def start_job_workers(
+    app: Flask,
+    workers: int | None = None,
+    lease_seconds: float | None = None,
+    poll_interval: float | None = None,
+) -> list[threading.Thread]:
+    """
+    启动持久化任务队列的执行器：
+    - workers 个执行线程：从 jobs 表领取 queued 任务（条件 UPDATE，多进程安全）并执行
+    - 1 个监督线程：每 1/3 租约为本进程正在执行的任务续期，并把租约已过期的任务重新入队
+      （控制端重启后，上一进程未完成的任务在租约到期后由任意进程继续执行）
+    """
+    key = "job_workers"
+    existing = app.extensions.get(key)
+    if existing and isinstance(existing, dict) and not existing["stop_event"].is_set():
+        if any(t.is_alive() for t in existing.get("threads", [])):
+            return existing["threads"]
+
+    workers = max(1, int(workers or JobConfig.JOB_WORKERS))
+    lease = float(lease_seconds or JobConfig.JOB_LEASE_SECONDS)
+    poll = float(poll_interval or JobConfig.JOB_POLL_INTERVAL)
+    stop_event = threading.Event()
+    running: dict[int, str] = {}
+    running_lock = threading.Lock()
+    state = {"stop_event": stop_event, "workers": workers, "running": running, "last_report": None}
+    worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def _worker(index: int):
+        name = f"{worker_prefix}:{index}"
+        while not stop_event.is_set():
+            job = None
+            try:
+                with app.app_context():
+                    job = job_repo.claim_next(name, lease)
+                    if job is not None:
+                        with running_lock:
+                            running[job.id] = job.job_id
+                        try:
+                            job_tasks.run_job(job)
+                        finally:
+                            with running_lock:
+                                running.pop(job.id, None)
+            except Exception as e:
+                print(f"[jobs] worker {name} error: {e}")
+            if job is None:
+                job_tasks.wait_for_jobs(poll)
+
+    def _supervisor():
+        while not stop_event.is_set():
+            try:
+                with app.app_context():
+                    with running_lock:
+                        ids = list(running)
+                    job_repo.renew_leases(ids, lease)
+                    requeued, failed = job_repo.recover_expired_leases()
+                    state["last_report"] = {"running": len(ids), "requeued": requeued, "failed": failed}
+                    if requeued:
+                        print(f"[jobs] requeued {requeued} job(s) with expired lease")
+                        job_tasks.notify_workers()
+                    if failed:
+                        print(f"[jobs] {failed} job(s) exhausted attempts after lease expiry")
+            except Exception as e:
+                print(f"[jobs] supervisor error: {e}")
+            stop_event.wait(max(0.05, lease / 3))
+
+    threads = [threading.Thread(target=_worker, args=(i,), daemon=True, name=f"job-worker-{i}") for i in range(workers)]
+    threads.append(threading.Thread(target=_supervisor, daemon=True, name="job-supervisor"))
+    for t in threads:
+        t.start()
+
+    state["threads"] = threads
+    app.extensions[key] = state
+    with _states_lock:
+        _states.append(state)
+    return threads
+
+
+def stop_job_workers(app: Flask | None = None, timeout: float = 5.0) -> None:
+    """停止指定 app（为 None 时为本进程全部）的执行器；正在执行的任务会先执行完。"""
+    with _states_lock:
+        if app is not None:
+            state = app.extensions.get("job_workers")
+            targets = [state] if isinstance(state, dict) else []
+        else:
+            targets = list(_states)
+        for state in targets:
+            state["stop_event"].set()
+            if state in _states:
+                _states.remove(state)
+    job_tasks.notify_workers()
+    for state in targets:
+        for t in state.get("threads", []):
+            t.join(timeout)
@@ -0,0 +1,135 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask
+
+from ..config import CommsConfig
+from ..repositories import machine_repo
+from ..services import machine_tasks
+from ..utils.liveness import liveness_table
+from ..utils.status_cache import container_status_cache
+
+
+def _probe(machine_ip: str | None, timeout: float) -> tuple[bool, float]:
+    """在线程池中执行：只做 Node 通信，不访问数据库。"""
+    started = time.time()
+    if not machine_ip:
+        return False, 0.0
+    try:
+        online = machine_tasks.probe_machine_ip(machine_ip, timeout=timeout)
+    except Exception:
+        online = False
+    return online, time.time() - started
+
+
+def probe_all_machines_once(max_workers: int | None = None, timeout: float | None = None, page_size: int = 200) -> dict:
+    """
+    单次存活探测：并发探测所有机器的 `/machine_status`，结果写入内存存活表；
+    只有机器状态真正发生变化时才写库（见 machine_tasks.apply_machine_liveness）。
+    返回本轮统计：在线/离线数量、状态变化列表、耗时。
+    """
+    started = time.time()
+    workers = max(1, int(max_workers or CommsConfig.NODE_FANOUT_WORKERS))
+    probe_timeout = float(timeout or CommsConfig.MACHINE_PROBE_TIMEOUT)
+
+    machines = []
+    after_id = None
+    while True:
+        page = machine_repo.list_machines(limit=page_size, after_id=after_id)
+        machines.extend(page)
+        if len(page) < page_size:
+            break
+        after_id = page[-1].id
+
+    report = {"machines": len(machines), "online": 0, "offline": 0, "transitions": []}
+    if not machines:
+        report["duration"] = time.time() - started
+        return report
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(machines))) as executor:
+        futures = {m.id: executor.submit(_probe, m.machine_ip, probe_timeout) for m in machines}
+    results = {mid: fut.result() for mid, fut in futures.items()}
+
+    for m in machines:
+        online, latency = results[m.id]
+        liveness_table.record(m.id, online, latency)
+        report["online" if online else "offline"] += 1
+        try:
+            new_status = machine_tasks.apply_machine_liveness(m, online)
+        except Exception as e:
+            print(f"[machine-liveness] failed to apply status for machine_id={m.id}: {e}")
+            continue
+        if new_status is not None:
+            report["transitions"].append((m.id, new_status.value))
+            print(f"[machine-liveness] machine_id={m.id} -> {new_status.value}")
+
+    report["duration"] = time.time() - started
+    return report
+
+
+def log_status_cache_stats(previous: dict | None = None) -> dict:
+    """
+    打印容器状态缓存统计；传入上一次的 stats 时同时给出这段时间内的命中率。
+    返回本次的 stats，供下一次调用对比。
+    """
+    stats = container_status_cache.stats()
+    window = ""
+    if previous is not None:
+        hits = stats["hits"] - previous["hits"]
+        lookups = hits + stats["misses"] - previous["misses"]
+        window = f" window_hit_rate={hits / lookups if lookups else 0.0:.1%} ({hits}/{lookups})"
+    print(f"[status-cache] entries={stats['entries']} hit_rate={stats['hit_rate']:.1%}{window} "
+          f"probes={stats['probes']} shared={stats['shared_probes']} heartbeat_updates={stats['heartbeat_updates']}")
+    return stats
+
+
+def start_machine_liveness_monitor(
+    app: Flask,
+    interval_seconds: int = 30,
+) -> threading.Thread:
+    """
+    启动机器存活监控：
+    - 首次启动立即探测一次
+    - 之后每 interval_seconds（默认 30s）并发探测所有机器
+    - 每 CONTAINER_STATUS_STATS_INTERVAL 秒顺带打印一次容器状态缓存命中率
+    """
+    key = "machine_liveness_monitor"
+    existing = app.extensions.get(key)
+    if existing and isinstance(existing, dict) and existing.get("thread"):
+        t = existing["thread"]
+        if t.is_alive():
+            return t
+
+    stop_event = threading.Event()
+    state = {"stop_event": stop_event, "last_report": None, "table": liveness_table,
+             "cache_stats": None, "cache_stats_at": time.time()}
+
+    def _run_once():
+        with app.app_context():
+            state["last_report"] = probe_all_machines_once()
+        stats_interval = CommsConfig.CONTAINER_STATUS_STATS_INTERVAL
+        if stats_interval and time.time() - state["cache_stats_at"] >= stats_interval:
+            state["cache_stats"] = log_status_cache_stats(state["cache_stats"])
+            state["cache_stats_at"] = time.time()
+
+    def _worker():
+        try:
+            _run_once()
+        except Exception as e:
+            print(f"[machine-liveness] initial run failed: {e}")
+
+        while not stop_event.is_set():
+            time.sleep(interval_seconds)
+            if stop_event.is_set():
+                break
+            try:
+                _run_once()
+            except Exception as e:
+                print(f"[machine-liveness] periodic run failed: {e}")
+
+    t = threading.Thread(target=_worker, daemon=True, name="machine-liveness")
+    t.start()
+
+    state["thread"] = t
+    app.extensions[key] = state
+    return t
@@ -1,25 +1,24 @@
 import json
-import requests
-import time
-import base64
 from datetime import datetime, timedelta
 import traceback
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey, RSAPublicKey
 from pydantic import BaseModel
 
 from ..config import CommsConfig
+from ..extensions import db
 from ..constant import *
 from sqlalchemy.exc import IntegrityError
 from ..repositories import containers_repo, machine_repo, machine_permission_repo, user_repo
 from ..repositories import containers_repo as container_repo
-from ..repositories import container_ssh_login_repo
+from ..repositories import container_ssh_login_repo, job_repo
 from .machine_tasks import is_machine_online_remote
 from ..repositories.machine_repo import *
 from ..repositories.user_repo import *
 from ..utils.CheckKeys import *
 from ..utils.Container import Container_info
+from ..utils.node_transport import (
+    is_batch_unsupported, mark_batch_unsupported, node_transport, node_url, send_to_node, send_batch_to_node,
+)
+from ..utils.async_node_transport import AsyncNodeTransport, NodeRequest, run_node_requests
 from ..repositories.containers_repo import *
 from ..repositories.usercontainer_repo import *
 from ..utils.heartbeat import (
@@ -30,56 +29,18 @@ from ..utils.heartbeat import (
 from ..models.containers import Container
 import math
 import re
+from concurrent.futures import ThreadPoolExecutor
 from ..utils import sanitizer as _sanitizer
+from ..utils.ssh_time import MONTH_ABBR_TO_NUM, parse_last_ssh_time
+from ..utils.status_cache import container_status_cache
+from ..utils.cursor import encode_cursor, decode_cursor
 
 ####################################################
 # 辅助工具
 
-_MONTH_ABBR_TO_NUM = {
-    "Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
-    "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12,
-}
-
-
-def _parse_last_ssh_time(raw: str | None) -> datetime | None:
-    """
-    尝试把 Node 返回的 last ssh 时间解析为 datetime。
-    支持：
-    - ISO/常见 datetime 字符串
-    - syslog 风格：`Mar 20 12:34:56 ...`
-    - `last` 输出中的日期片段：`Fri Mar 20 12:34 ...`
-    """
-    if not raw:
-        return None
-    s = str(raw).strip()
-    if not s:
-        return None
-
-    # 1) 直接尝试 fromisoformat / 通用格式
-    try:
-        v = s.replace("Z", "+00:00")
-        return datetime.fromisoformat(v)
-    except Exception:
-        pass
-
-    # 2) 提取 "Mon DD HH:MM[:SS]" 片段（无年份时使用当前年）
-    m = re.search(r"\b([A-Z][a-z]{2})\s+(\d{1,2})\s+(\d{2}:\d{2}(?::\d{2})?)\b", s)
-    if not m:
-        return None
-    mon = _MONTH_ABBR_TO_NUM.get(m.group(1))
-    if not mon:
-        return None
-    day = int(m.group(2))
-    hhmmss = m.group(3)
-    parts = hhmmss.split(":")
-    hour = int(parts[0])
-    minute = int(parts[1])
-    second = int(parts[2]) if len(parts) > 2 else 0
-    now = datetime.utcnow()
-    try:
-        return datetime(now.year, mon, day, hour, minute, second)
-    except Exception:
-        return None
+# 解析逻辑位于 utils.ssh_time，仓储层写入 last_ssh_at 时也复用同一实现
+_MONTH_ABBR_TO_NUM = MONTH_ABBR_TO_NUM
+_parse_last_ssh_time = parse_last_ssh_time
 
 
 def build_cleanup_info(last_ssh_login_time: str | None, cleanup_after_days: int) -> dict:
@@ -163,26 +124,9 @@ def _ensure_machine_online_for_operation(machine_id: int, operation: str = ''):
 def send(ciphertext:bytes,signature:bytes,mechine_ip:str, timeout:float=5.0)->dict:
     """
     发送 POST 并返回解析后的响应（优先 JSON），出现错误时返回包含 error 字段的 dict。
+    连接复用与重试由 node_transport 统一处理。
     """
-    try:
-        resp = requests.post(mechine_ip, json={
-            "message": base64.b64encode(ciphertext).decode('utf-8'),
-            "signature": base64.b64encode(signature).decode('utf-8')
-        }, timeout=timeout)
-
-        # 尝试解析为 JSON（即使是 4xx/5xx，也优先解析 body 中的 JSON，以保留 Node 返回的 error_reason）
-        try:
-            j = resp.json()
-            if isinstance(j, dict):
-                j.setdefault('status_code', resp.status_code)
-            return j
-        except ValueError:
-            return {"status_code": resp.status_code, "text": resp.text}
-
-    except requests.RequestException as e:
-        # 网络/超时/连接等错误
-        print(f"Request error: {e}")
-        return {"error": str(e)}
+    return node_transport.send(mechine_ip, ciphertext, signature, timeout=timeout)
 
 #这个纯粹是为了方便统一异常处置流程
 def _raise_on_node_error(res: dict, action: str):
@@ -213,88 +157,101 @@ class NodeServiceError(Exception):
         self.reason = reason
 
 def get_full_url(machine_ip:str, endpoint:str)->str:
-    return f"http://{machine_ip}{CommsConfig.NODE_URL_MIDDLE}{endpoint}"
+    return node_url(machine_ip, endpoint)
 
 
 def get_container_status(machine_ip: str, container_name: str, timeout: float = 5.0) -> dict:
     """
     这个方法主要是为了在服务端调用 Node 的 /container_status API 来验证容器状态的。但是这个方法不被heartbeat使用。
+    状态查询是幂等的，网络错误时允许重试一次。
     """
-    url = get_full_url(machine_ip, "/container_status")
-    payload = json.dumps({"config": {"container_name": container_name}})
-    sig = signature(payload)
-    enc = encryption(payload)
-
-    last_exc = None
-    for attempt in range(2):
-        try:
-            resp = requests.post(url, json={
-                "message": base64.b64encode(enc).decode('utf-8'),
-                "signature": base64.b64encode(sig).decode('utf-8')
-            }, timeout=timeout)
-            # Do not raise_for_status() here; inspect status code
-            try:
-                if resp.status_code == 200:
-                    try:
-                        return resp.json()
-                    except ValueError:
-                        return {"status_code": resp.status_code, "text": resp.text}
-                elif resp.status_code == 404:
-                    return {"status_code": 404, "error": "not found", "text": resp.text}
-                else:
-                    return {"status_code": resp.status_code, "text": resp.text}
-            except Exception as e:
-                return {"error": str(e)}
-        except requests.RequestException as e:
-            last_exc = e
-            print(f"get_container_status request error (attempt {attempt+1}): {e}")
-            # short backoff before retrying
-            if attempt == 0:
-                time.sleep(0.5)
-            continue
-
-    # both attempts failed due to network/request errors
-    return {"error": str(last_exc) if last_exc is not None else "unknown error"}
+    payload = {"config": {"container_name": container_name}}
+    res = send_to_node(machine_ip, "/container_status", payload, timeout=timeout, attempts=2)
+    if isinstance(res, dict) and res.get('status_code') == 404:
+        res.setdefault('error', 'not found')
+    return res
 
 
-def get_container_last_ssh_login_time(container_id: int, timeout: float = 5.0) -> str | None:
+def get_containers_status(machine_ip: str, container_names: list[str], timeout: float = 5.0) -> dict[str, dict]:
     """
-    通过中心端向集群客户端请求容器上次 SSH 登录时间。
-    入参: container_id
-    返回: 时间字符串或 None
+    通过 Node 的 /containers_status 批量接口，一次签名请求查询同一台机器上多个容器的状态。
+    返回 {container_name: 结果}，单个结果的格式与 get_container_status 相同（容器不存在时带 status_code=404）。
+    Node 未部署批量接口时回退为逐个调用 get_container_status（NODE_BATCH_RETRY_SECONDS 后重新尝试批量接口）。
     """
-    try:
-        container_id = int(container_id)
-    except Exception:
-        print(f"Invalid container id for SSH login time query: {container_id}")
-        return None
-
-    try:
-        container = containers_repo.get_by_id(container_id)
-    except Exception:
-        print(f"Error querying container info for id={container_id}: {traceback.format_exc()}")
-        return None
-
-    if not container:
-        return None
-    try:
-        machine_id = container.machine_id
-        machine_ip = get_machine_ip_by_id(machine_id)
-        url = get_full_url(machine_ip, "/container_last_ssh_time")
-    except Exception:
-        print(f"Error retrieving machine info for container id={container_id}: {traceback.format_exc()}")
-        return None
-
-    container_name = getattr(container, 'name', None)
+    names = list(dict.fromkeys(n for n in container_names if n))
+    if not names:
+        return {}
+    if not is_batch_unsupported(machine_ip, "/containers_status"):
+        payload = {"config": {"container_names": names}}
+        res = send_to_node(machine_ip, "/containers_status", payload, timeout=timeout, attempts=2)
+        if isinstance(res, dict) and res.get('status_code') == 404 and not res.get('error_reason'):
+            print(f"get_containers_status: node {machine_ip} has no batch endpoint, falling back")
+            mark_batch_unsupported(machine_ip, "/containers_status")
+        elif not isinstance(res, dict) or 'error' in res:
+            err = res.get('error') if isinstance(res, dict) else f"unexpected response: {res}"
+            return {name: {"error": err} for name in names}
+        else:
+            out: dict[str, dict] = {}
+            for item in res.get('containers') or []:
+                if not isinstance(item, dict) or not item.get('container_name'):
+                    continue
+                item = dict(item)
+                if item.get('error_reason') == 'not_found' or item.get('status_code') == 404:
+                    item['status_code'] = 404
+                    item.setdefault('error', 'not found')
+                out[item['container_name']] = item
+            for name in names:
+                out.setdefault(name, {"error": "missing in batch response"})
+            return out
+    return {name: get_container_status(machine_ip, name, timeout=timeout) for name in names}
+
+
+def fetch_container_last_ssh_time(machine_ip: str, container_name: str, timeout: float = 5.0) -> str | None:
+    """
+    只负责向 Node 的 /container_last_ssh_time 发请求并解释结果，不访问数据库，
+    因此可以在后台线程中并发调用。
+    返回时间字符串；Node 明确表示没有登录记录时返回 None；其余情况抛出 NodeServiceError。
+    """
+    url = get_full_url(machine_ip, "/container_last_ssh_time")
     payload = json.dumps({"config": {"container_name": container_name}})
     try:
         sig = signature(payload)
         enc = encryption(payload)
         res = send(enc, sig, url, timeout=timeout)
     except Exception as e:
-        print(f"Error sending request to {url}: {e}")
-        return None
+        raise NodeServiceError(f"Error sending request to {url}: {e}", reason="send_failed")
     print(f"DEBUG: get_container_last_ssh_login_time: sent request to {url} with payload {payload}")
+    return _interpret_last_ssh_time(machine_ip, res)
+
+
+def fetch_containers_last_ssh_time(machine_ip: str, container_names: list[str],
+                                   timeout: float = 5.0) -> dict[str, str | None | Exception]:
+    """
+    批量版 fetch_container_last_ssh_time：同一台机器上的多个容器合并为一次 /batch 请求。
+    返回 {container_name: 时间字符串 / None / 异常}，单个容器失败不影响其它容器。
+    """
+    names = list(dict.fromkeys(n for n in container_names if n))
+    if len(names) == 1:
+        try:
+            return {names[0]: fetch_container_last_ssh_time(machine_ip, names[0], timeout=timeout)}
+        except Exception as e:
+            return {names[0]: e}
+    results = send_batch_to_node(
+        machine_ip,
+        [("/container_last_ssh_time", {"config": {"container_name": name}}) for name in names],
+        timeout=timeout,
+    )
+    out: dict[str, str | None | Exception] = {}
+    for name, res in zip(names, results):
+        try:
+            out[name] = _interpret_last_ssh_time(machine_ip, res)
+        except Exception as e:
+            out[name] = e
+    return out
+
+
+def _interpret_last_ssh_time(machine_ip: str, res: dict) -> str | None:
+    """解释一次 /container_last_ssh_time 响应（单条或批量中的一项）。"""
     print(f"get_container_last_ssh_login_time: NODE response: {res}")
 
     if not isinstance(res, dict):
@@ -317,17 +274,52 @@ def get_container_last_ssh_login_time(container_id: int, timeout: float = 5.0) -
 
     # 节点明确声明“未找到SSH登录记录”才返回空值
     if err_reason == "not_found":
-        last_time = None
-    elif res.get("success") in (1, True):
+        return None
+    if res.get("success") in (1, True):
         raw = res.get("last_ssh_connect_time")
-        last_time = str(raw) if raw is not None else None
-    else:
-        # 其余情况都作为错误抛出，避免被静默吞掉
-        _raise_on_node_error(res, "get_last_ssh_login_time")
-        raise NodeServiceError(
-            f"NODE get_last_ssh_login_time failed: {res}",
-            reason=err_reason or "NODE_error",
-        )
+        return str(raw) if raw is not None else None
+    # 其余情况都作为错误抛出，避免被静默吞掉
+    _raise_on_node_error(res, "get_last_ssh_login_time")
+    raise NodeServiceError(
+        f"NODE get_last_ssh_login_time failed: {res}",
+        reason=err_reason or "NODE_error",
+    )
+
+
+def get_container_last_ssh_login_time(container_id: int, timeout: float = 5.0) -> str | None:
+    """
+    通过中心端向集群客户端请求容器上次 SSH 登录时间。
+    入参: container_id
+    返回: 时间字符串或 None
+    """
+    try:
+        container_id = int(container_id)
+    except Exception:
+        print(f"Invalid container id for SSH login time query: {container_id}")
+        return None
+
+    try:
+        container = containers_repo.get_by_id(container_id)
+    except Exception:
+        print(f"Error querying container info for id={container_id}: {traceback.format_exc()}")
+        return None
+
+    if not container:
+        return None
+    try:
+        machine_id = container.machine_id
+        machine_ip = get_machine_ip_by_id(machine_id)
+    except Exception:
+        print(f"Error retrieving machine info for container id={container_id}: {traceback.format_exc()}")
+        return None
+
+    try:
+        last_time = fetch_container_last_ssh_time(machine_ip, getattr(container, 'name', None), timeout=timeout)
+    except NodeServiceError as e:
+        if e.reason == "send_failed":
+            print(str(e))
+            return None
+        raise
 
     # 记录请求结果（包括空值）
     try:
@@ -375,8 +367,36 @@ class container_detail_information(BaseModel):
 ####################################################
 
 
+# 端口唯一约束冲突（其它进程抢先落库同一端口）时最多重新预留的次数
+_PORT_CONFLICT_RETRIES = 3
+
+
 # 将user_id作为admin，创建新容器
 def Create_container(owner_name:str,machine_id:int,container:Container_info,public_key=None, debug=False, operator_user_id:int|None=None)->bool:
+    # 预留端口；容器记录落库（confirm）前任何失败都要归还，避免端口泄漏
+    for attempt in range(_PORT_CONFLICT_RETRIES + 1):
+        free_port = get_the_first_free_port(machine_id=machine_id)
+        try:
+            return _create_container_on_port(owner_name, machine_id, container, free_port,
+                                             public_key=public_key, debug=debug, operator_user_id=operator_user_id)
+        except IntegrityError as e:
+            abandon_port(machine_id, free_port)
+            if not is_port_conflict(e) or attempt == _PORT_CONFLICT_RETRIES:
+                raise
+            # Node 已按冲突端口创建了容器：先删掉，再换端口重试
+            db.session.rollback()
+            print(f"[Create_container] port {free_port} on machine {machine_id} taken by another worker, retrying")
+            try:
+                send_to_node(get_machine_ip_by_id(machine_id), "/remove_container",
+                             {"config": {"container_name": container.NAME}})
+            except Exception as remove_err:
+                print(f"Warning: failed to remove container {container.NAME} after port conflict: {remove_err}")
+        except BaseException:
+            abandon_port(machine_id, free_port)
+            raise
+
+
+def _create_container_on_port(owner_name:str,machine_id:int,container:Container_info,free_port:int,public_key=None, debug=False, operator_user_id:int|None=None)->bool:
     if operator_user_id is not None and not _can_access_machine(operator_user_id, machine_id):
         raise NodeServiceError(f'Machine {machine_id} not accessible for user {operator_user_id}', reason='machine_permission_denied')
     # ensure machine is online before attempting creation
@@ -386,7 +406,6 @@ def Create_container(owner_name:str,machine_id:int,container:Container_info,publ
 
 
 
-    free_port = get_the_first_free_port(machine_id=machine_id)
     container.set_port(free_port)
     
 
@@ -501,6 +520,7 @@ def Create_container(owner_name:str,machine_id:int,container:Container_info,publ
                      port=free_port,
                      status=ContainerStatus.CREATING
                      )
+    confirm_port(machine_id, free_port)
 
     # 建立用户绑定（包含必须的 role/username/public_key）
     container_id=get_id_by_name_machine(container_name=container.NAME, machine_id=machine_id)
@@ -513,7 +533,7 @@ def Create_container(owner_name:str,machine_id:int,container:Container_info,publ
     
     # start heartbeat in background (non-blocking)
     try:
-        container_starting_status_heartbeat(machine_ip, container.NAME, container_id=container_id,
+        container_starting_status_heartbeat(machine_ip, container.NAME, container_id=container_id, machine_id=machine_id,
                                          timeout=180, interval=3)
     except Exception:
         print(f"Warning: Heartbeat for container {container_id} failed to start or encountered an error. Container may be stuck in CREATING status.")
@@ -524,14 +544,15 @@ def Create_container(owner_name:str,machine_id:int,container:Container_info,publ
     return False
 
 #删除容器并删除其所有者记录
-def remove_container(container_id:int, debug=False, operator_user_id:int|None=None)->bool:
+def remove_container(container_id:int, debug=False, operator_user_id:int|None=None, check_online:bool=True)->bool:
     machine_id = get_machine_id_by_container_id(container_id)
     if operator_user_id is not None and not _can_access_machine(operator_user_id, machine_id):
         raise NodeServiceError(f'Machine {machine_id} not accessible for user {operator_user_id}', reason='machine_permission_denied')
     if not machine_id:
         raise ValueError("Container not found or not associated with any machine")
-    # 使得只在机器在线时执行
-    _ensure_machine_online_for_operation(machine_id, 'remove')
+    # 使得只在机器在线时执行；批量调用方（如清理任务）已按机器预检时可传 check_online=False
+    if check_online:
+        _ensure_machine_online_for_operation(machine_id, 'remove')
     machine_ip=get_machine_ip_by_id(machine_id)
     full_url = get_full_url(machine_ip, "/remove_container")
 
@@ -818,176 +839,304 @@ def update_role(container_id:int,user_id:int,updated_role:ROLE,debug=False, oper
 
 def start_container(container_id:int, debug=False, operator_user_id:int|None=None)->bool:
     """发送start到对应容器所在node,启动后心跳机制监控状态，直到状态变为ONLINE或失败"""
-    machine_id = get_machine_id_by_container_id(container_id)
-    if operator_user_id is not None and not _can_access_machine(operator_user_id, machine_id):
-        raise NodeServiceError(f'Machine {machine_id} not accessible for user {operator_user_id}', reason='machine_permission_denied')
-    if not machine_id:
-        raise ValueError("Container not found or not associated with any machine")
-    _ensure_machine_online_for_operation(machine_id, 'start')
-    machine_ip = get_machine_ip_by_id(machine_id)
-    full_url = get_full_url(machine_ip, "/start_container")
-
-    container_name = get_by_id(container_id).name
-    data = {"config": {"container_name": container_name}}
-    container_info = json.dumps(data)
-    signatured_message = signature(container_info)
-    encryptioned_message = encryption(container_info)
-
-    res = send(encryptioned_message, signatured_message, full_url)
-    print(f"start_container: NODE response: {res}")
-
-    # Check node-level errors
-    _raise_on_node_error(res, 'start')
-    # Expect success truthy
-    if res.get('success') in (1, True):
-        # start controller-side heartbeat to watch for ONLINE
-        try:
-            container_starting_status_heartbeat(machine_ip, container_name, container_id=container_id)
-        except Exception as e:
-            print(f"Failed to start start-heartbeat: {e}")
-        return True
-    # Treat other responses as failure
-    raise NodeServiceError(f"NODE start returned failure: {res}", reason=res.get('error_reason') or 'start_failed')
+    return _run_container_action(container_id, 'start', operator_user_id)
 
 
 def stop_container(container_id:int, debug=False, operator_user_id:int|None=None)->bool:
     """发送stop到对应容器所在node,停止后心跳机制监控状态，直到状态变为OFFLINE或失败"""
-    machine_id = get_machine_id_by_container_id(container_id)
-    if operator_user_id is not None and not _can_access_machine(operator_user_id, machine_id):
-        raise NodeServiceError(f'Machine {machine_id} not accessible for user {operator_user_id}', reason='machine_permission_denied')
-    if not machine_id:
-        raise ValueError("Container not found or not associated with any machine")
-    _ensure_machine_online_for_operation(machine_id, 'stop')
-    machine_ip = get_machine_ip_by_id(machine_id)
-    full_url = get_full_url(machine_ip, "/stop_container")
+    return _run_container_action(container_id, 'stop', operator_user_id)
 
-    container_name = get_by_id(container_id).name
-    data = {"config": {"container_name": container_name}}
-    container_info = json.dumps(data)
-    signatured_message = signature(container_info)
-    encryptioned_message = encryption(container_info)
 
-    res = send(encryptioned_message, signatured_message, full_url)
-    print(f"stop_container: NODE response: {res}")
+def restart_container(container_id:int, debug=False, operator_user_id:int|None=None)->bool:
+    """发送restart到对应容器所在node,重启后心跳机制监控状态，直到状态变为ONLINE或失败"""
+    return _run_container_action(container_id, 'restart', operator_user_id)
 
-    _raise_on_node_error(res, 'stop')
-    if res.get('success') in (1, True):
-        # start controller-side heartbeat to watch for OFFLINE
-        try:
-            container_stopping_status_heartbeat(machine_ip, container_name, container_id=container_id)
-        except Exception as e:
-            print(f"Failed to start stop-heartbeat: {e}")
-        return True
-    raise NodeServiceError(f"NODE stop returned failure: {res}", reason=res.get('error_reason') or 'stop_failed')
 
+# start/stop/restart 的 Node 接口与对应的心跳（等待的终态见 utils.heartbeat）
+_CONTAINER_ACTIONS = {
+    'start': ("/start_container", container_starting_status_heartbeat),
+    'stop': ("/stop_container", container_stopping_status_heartbeat),
+    'restart': ("/restart_container", container_restart_status_heartbeat),
+    'remove': ("/remove_container", None),
+}
 
-def restart_container(container_id:int, debug=False, operator_user_id:int|None=None)->bool:
-    """发送restart到对应容器所在node,重启后心跳机制监控状态，直到状态变为ONLINE或失败"""
+
+class ContainerAction(BaseModel):
+    container_id: int
+    action: str
+    machine_id: int
+    machine_ip: str
+    container_name: str
+
+
+def _prepare_container_action(container_id:int, action:str, operator_user_id:int|None=None)->ContainerAction:
+    """Node 调用前的数据库侧检查：权限、机器在线状态、容器名。"""
     machine_id = get_machine_id_by_container_id(container_id)
     if operator_user_id is not None and not _can_access_machine(operator_user_id, machine_id):
         raise NodeServiceError(f'Machine {machine_id} not accessible for user {operator_user_id}', reason='machine_permission_denied')
     if not machine_id:
         raise ValueError("Container not found or not associated with any machine")
-    _ensure_machine_online_for_operation(machine_id, 'restart')
-    machine_ip = get_machine_ip_by_id(machine_id)
-    full_url = get_full_url(machine_ip, "/restart_container")
+    _ensure_machine_online_for_operation(machine_id, action)
+    return ContainerAction(
+        container_id=container_id,
+        action=action,
+        machine_id=machine_id,
+        machine_ip=get_machine_ip_by_id(machine_id),
+        container_name=get_by_id(container_id).name,
+    )
+
+
+def _finish_container_action(act:ContainerAction, res:dict)->bool:
+    """处理 Node 响应：错误语义与 _raise_on_node_error 一致；成功后失效状态缓存并登记心跳。"""
+    print(f"{act.action}_container: NODE response: {res}")
+    _raise_on_node_error(res, act.action)
+    if act.action == 'remove':
+        # 与 remove_container 一致：success 0=SUCCESS,1=NOTFOUND 均可删除本地记录，2=FAILED
+        NODE_code = res.get('success')
+        if NODE_code is None:
+            raise NodeServiceError(f"NODE remove returned unexpected response: {res}", reason='unexpected_response')
+        if NODE_code == 2:
+            raise NodeServiceError(f"NODE remove reported failure: {res}", reason=res.get('error_reason') or 'remove_failed')
+        container_status_cache.invalidate(act.machine_id, act.container_name)
+        remove_binding(0, act.container_id, all=True)
+        delete_container(act.container_id)
+        return True
+    if res.get('success') not in (1, True):
+        raise NodeServiceError(f"NODE {act.action} returned failure: {res}", reason=res.get('error_reason') or f'{act.action}_failed')
+    # 状态即将变化，旧的缓存状态不再可信
+    container_status_cache.invalidate(act.machine_id, act.container_name)
+    if act.action == 'restart':
+        #先t finished
+        try:
+            update_container(act.container_id, container_status=ContainerStatus.OFFLINE)
+        except Exception as e:
+            print(f"Warning: failed to mark container {act.container_id} as OFFLINE before restart-heartbeat: {e}")
+    # start controller-side heartbeat to watch for the terminal status
+    try:
+        _CONTAINER_ACTIONS[act.action][1](act.machine_ip, act.container_name, container_id=act.container_id, machine_id=act.machine_id)
+    except Exception as e:
+        print(f"Failed to start {act.action}-heartbeat: {e}")
+    return True
 
-    container_name = get_by_id(container_id).name
-    data = {"config": {"container_name": container_name}}
-    container_info = json.dumps(data)
-    signatured_message = signature(container_info)
-    encryptioned_message = encryption(container_info)
 
-    res = send(encryptioned_message, signatured_message, full_url)
-    print(f"restart_container: NODE response: {res}")
+def _container_action_payload(act:ContainerAction)->dict:
+    return {"config": {"container_name": act.container_name}}
 
-    _raise_on_node_error(res, 'restart')
-    if res.get('success') in (1, True):
-        #先t finished
+
+def _run_container_action(container_id:int, action:str, operator_user_id:int|None=None)->bool:
+    act = _prepare_container_action(container_id, action, operator_user_id)
+    res = send_to_node(act.machine_ip, _CONTAINER_ACTIONS[action][0], _container_action_payload(act))
+    return _finish_container_action(act, res)
+
+
+async def container_action_async(transport:AsyncNodeTransport, act:ContainerAction, timeout:float=5.0)->dict:
+    """异步发送一个已准备好的 start/stop/restart 指令，返回 Node 原始响应（不访问数据库）。"""
+    return await transport.send_to_node(act.machine_ip, _CONTAINER_ACTIONS[act.action][0],
+                                        _container_action_payload(act), timeout=timeout)
+
+
+def _prepare_container_actions(container_ids:list[int], action:str, operator_user_id:int|None=None
+                              )->tuple[list[ContainerAction], dict[int, Exception]]:
+    """
+    批量版 _prepare_container_action：一次查询取出全部容器与机器，按机器分组，
+    权限与机器在线检查每台机器只做一次，失败结果记到该机器上的全部容器。
+    """
+    ids = list(dict.fromkeys(int(cid) for cid in container_ids))
+    containers = Container.query.filter(Container.id.in_(ids)).all() if ids else []
+    by_id = {c.id: c for c in containers}
+    errors: dict[int, Exception] = {
+        cid: ValueError("Container not found or not associated with any machine")
+        for cid in ids if cid not in by_id or not by_id[cid].machine_id
+    }
+    groups: dict[int, list[Container]] = {}
+    for cid in ids:
+        if cid not in errors:
+            groups.setdefault(by_id[cid].machine_id, []).append(by_id[cid])
+    machines = {m.id: m for m in Machine.query.filter(Machine.id.in_(list(groups))).all()} if groups else {}
+
+    prepared: list[ContainerAction] = []
+    for machine_id, members in groups.items():
         try:
-            update_container(container_id, container_status=ContainerStatus.OFFLINE)
+            if operator_user_id is not None and not _can_access_machine(operator_user_id, machine_id):
+                raise NodeServiceError(f'Machine {machine_id} not accessible for user {operator_user_id}', reason='machine_permission_denied')
+            _ensure_machine_online_for_operation(machine_id, action)
+            machine_ip = machines[machine_id].machine_ip
         except Exception as e:
-            print(f"Warning: failed to mark container {container_id} as OFFLINE before restart-heartbeat: {e}")
-        # start controller-side heartbeat to watch for ONLINE after restart
+            for c in members:
+                errors[c.id] = e
+            continue
+        prepared.extend(
+            ContainerAction(container_id=c.id, action=action, machine_id=machine_id,
+                            machine_ip=machine_ip, container_name=c.name)
+            for c in members
+        )
+    return prepared, errors
+
+
+def run_container_actions(container_ids:list[int], action:str, operator_user_id:int|None=None,
+                          max_in_flight:int|None=None)->dict[int, bool|Exception]:
+    """
+    批量 start/stop/restart/remove：数据库侧检查在当前线程完成（每台机器一次），
+    全部 Node 请求在一个事件循环中并发发出，再回到当前线程逐个处理响应。
+    返回 {container_id: True 或对应的异常}，单个失败不影响其它容器。
+    """
+    if action not in _CONTAINER_ACTIONS:
+        raise ValueError(f"unsupported container action: {action}")
+    prepared, errors = _prepare_container_actions(container_ids, action, operator_user_id)
+    results: dict[int, bool|Exception] = dict(errors)
+    responses = run_node_requests(
+        [NodeRequest(act.machine_ip, _CONTAINER_ACTIONS[action][0], _container_action_payload(act)) for act in prepared],
+        max_in_flight=max_in_flight,
+    )
+    for act, res in zip(prepared, responses):
         try:
-            container_restart_status_heartbeat(machine_ip, container_name, container_id=container_id)
+            results[act.container_id] = _finish_container_action(act, res)
         except Exception as e:
-            print(f"Failed to start restart-heartbeat: {e}")
-        return True
-    raise NodeServiceError(f"NODE restart returned failure: {res}", reason=res.get('error_reason') or 'restart_failed')
+            results[act.container_id] = e
+    return results
+
+
+####################################################
+# 批量生命周期任务：派发结果写入 jobs 表（kind=bulk_container_action），
+# 客户端通过 /jobs/job_status 轮询，任意 worker 都能根据数据库中的容器状态给出收敛进度
+
+# 各操作期望收敛到的容器状态；remove 以数据库记录消失为完成
+_BULK_TARGET_STATUS = {
+    'start': ContainerStatus.ONLINE,
+    'stop': ContainerStatus.OFFLINE,
+    'restart': ContainerStatus.ONLINE,
+    'remove': None,
+}
+
+
+def _error_entry(container_id:int, e:Exception)->dict:
+    reason = getattr(e, 'reason', None) or ('not_found' if isinstance(e, ValueError) else 'node_error')
+    return {"container_id": container_id, "success": 0, "error_reason": reason, "message": str(e)}
+
+
+def bulk_container_action(container_ids:list[int], action:str, operator_user_id:int|None=None)->dict:
+    """
+    批量生命周期入口：派发后立即返回每个容器的派发结果和 job_id；
+    派发成功的容器随后由心跳收敛，进度通过 job_tasks.Get_job_status(job_id) 查询。
+    """
+    started = datetime.utcnow()
+    results = run_container_actions(container_ids, action, operator_user_id=operator_user_id)
+    entries = [
+        {"container_id": cid, "success": 1} if res is True else _error_entry(cid, res)
+        for cid, res in sorted(results.items())
+    ]
+    job = job_repo.create_finished_job(
+        "bulk_container_action",
+        {"action": action, "container_ids": sorted(results)},
+        {"action": action, "dispatch_seconds": (datetime.utcnow() - started).total_seconds(), "results": entries},
+        operator_user_id=operator_user_id,
+        started_at=started,
+    )
+    dispatched = sum(1 for e in entries if e["success"])
+    return {
+        "job_id": job.job_id,
+        "action": action,
+        "total": len(entries),
+        "dispatched": dispatched,
+        "failed": len(entries) - dispatched,
+        "results": entries,
+    }
+
+
+def bulk_action_progress(result:dict)->dict:
+    """
+    批量任务的收敛进度：result 为任务记录中的派发结果，已派发的容器按数据库当前状态（心跳写回）判断是否已收敛。
+    """
+    dispatched_ids = [e["container_id"] for e in result["results"] if e["success"]]
+    current = {
+        c.id: c.container_status
+        for c in (Container.query.filter(Container.id.in_(dispatched_ids)).all() if dispatched_ids else [])
+    }
+    target = _BULK_TARGET_STATUS[result["action"]]
+    counts = {"done": 0, "failed": 0, "pending": 0}
+    containers = []
+    for e in result["results"]:
+        cid = e["container_id"]
+        if not e["success"]:
+            state = "rejected"
+        elif cid not in current:
+            state = "done" if target is None else "failed"
+        elif current[cid] == ContainerStatus.FAILED:
+            state = "failed"
+        elif target is not None and current[cid] == target:
+            state = "done"
+        else:
+            state = "pending"
+        if state in counts:
+            counts[state] += 1
+        containers.append({
+            "container_id": cid,
+            "state": state,
+            "container_status": current[cid].value if cid in current else None,
+            **({"error_reason": e["error_reason"]} if not e["success"] else {}),
+        })
+    return {
+        "action": result["action"],
+        "dispatch_seconds": result["dispatch_seconds"],
+        "finished": counts["pending"] == 0,
+        **counts,
+        "rejected": sum(1 for e in result["results"] if not e["success"]),
+        "containers": containers,
+    }
+
 
 #返回容器的细节信息
 def get_container_detail_information(container_id:int)->container_detail_information:
-    container=get_by_id(container_id)
-    if not container:
+    # 容器、机器、全部绑定（含系统用户名）一次联表查询取齐
+    detail = get_container_detail(container_id)
+    if not detail:
         raise ValueError("Container not found")
+    container = detail["container"]
+    machine_ip = detail["machine_ip"]
     # 这个状态查询主要是为了验证容器是否真的存在于 Node 上，如果 Node 返回 404 则说明容器实际上已经不存在了，这时本地也应该删除记录并返回 not found 错误
-    # 这个方法不处理从未放入数据库的容器（因为它们不应该有 container_id），也不处理网络/其他错误（因为它们不应该阻止返回数据库中的信息）。
-    # 这里先检查机器状态，如果机器离线或维护中，则跳过 Node 检查直接返回数据库内容；如果机器在线，则进行 Node 检查以验证容器状态并尝试更新数据库中的状态信息。
-    # 无论如何，如果 Node 检查失败（网络错误、超时等），都应该忽略错误并继续返回数据库内容，而不是阻止整个请求失败。
-    try:
-        m = machine_repo.get_by_id(container.machine_id)
-    except Exception:
-        m = None
-    do_node_check = True
-    if m is not None:
-        try:
-            status_val = m.machine_status.value.lower() if hasattr(m.machine_status, 'value') else str(m.machine_status).lower()
-        except Exception:
-            status_val = str(getattr(m, 'machine_status', '')).lower()
-        if status_val in ('offline', 'maintenance'):
-            do_node_check = False
+    # 机器离线或维护中时跳过 Node 检查直接返回数据库内容。
+    # Node 探测不再阻塞请求：只读取短 TTL 的状态缓存；缓存缺失/过期时在后台刷新，本次直接返回数据库内容。
+    m_status = detail["machine_status"]
+    status_val = (m_status.value if hasattr(m_status, 'value') else str(m_status or '')).lower()
+    do_node_check = bool(machine_ip) and status_val not in ('offline', 'maintenance')
 
     st = None
     if do_node_check:
+        st = container_status_cache.get(container.machine_id, container.name)
+        if st is None:
+            container_status_cache.refresh_async(
+                container.machine_id, container.name, lambda: get_container_status(machine_ip, container.name),
+            )
+
+    # 找不到容器（Node 返回 404）时，删除本地记录并返回 not found 错误
+    if isinstance(st, dict) and st.get('status_code') == 404:
+        container_status_cache.invalidate(container.machine_id, container.name)
         try:
-            machine_ip = get_machine_ip_by_id(container.machine_id)
-            st = get_container_status(machine_ip, container.name)
-            # 找不到容器（Node 返回 404）时，删除本地记录并返回 not found 错误；其他错误（网络错误、超时、解析错误等）则忽略并继续返回数据库内容
-            if isinstance(st, dict) and st.get('status_code') == 404:
-                try:
-                    remove_binding(0, container_id, all=True)
-                except Exception as e:
-                    print(f"Warning: failed to remove bindings for {container_id}: {e}")
-                try:
-                    delete_container(container_id)
-                except Exception as e:
-                    print(f"Warning: failed to delete container {container_id} from DB: {e}")
-                raise ValueError("Container not found")
+            remove_binding(0, container_id, all=True)
         except Exception as e:
-            # 如果是 ValueError（通常是因为 Node 返回 404 导致的），则需要抛出以终止并返回 not found；如果是其他类型的异常（网络错误、超时、解析错误等），则应该捕获并忽略，以继续返回数据库中的信息。
-            if isinstance(e, ValueError):
-                raise
-            print(f"get_container_detail_information: ignored NODE check error: {e}")
+            print(f"Warning: failed to remove bindings for {container_id}: {e}")
+        try:
+            delete_container(container_id)
+        except Exception as e:
+            print(f"Warning: failed to delete container {container_id} from DB: {e}")
+        raise ValueError("Container not found")
 
-    # If Node returned a status payload, and it's not a 404, try to persist container_status to DB
-    try:
-        if st and isinstance(st, dict) and st.get('status_code') != 404:
-            status_str = st.get('container_status')
-            if status_str:
-                try:
-                    new_status = ContainerStatus(status_str)
-                except Exception:
-                    # try case-insensitive match of enum values
-                    try:
-                        new_status = next(s for s in ContainerStatus if s.value.lower() == str(status_str).lower())
-                    except StopIteration:
-                        new_status = None
-                if new_status:
-                    try:
-                        update_container(container.id, container_status=new_status)
-                    except Exception as e:
-                        print(f"Warning: failed to update container status for {container.id}: {e}")
-    except Exception as e:
-        print(f"Warning: error while attempting to persist Node status for {container.id if 'container' in locals() and container else '?'}: {e}")
+    # 缓存中有 Node 返回的状态且与数据库不一致时，写回数据库
+    if isinstance(st, dict) and not st.get('error'):
+        new_status = _parse_container_status(st.get('container_status'))
+        if new_status and new_status != container.container_status:
+            try:
+                update_container(container.id, container_status=new_status)
+            except Exception as e:
+                print(f"Warning: failed to update container status for {container.id}: {e}")
 
-    owener_bindings= get_container_bindings(container_id)
+    owener_bindings = detail["bindings"]
     res={ 
         "container_id": container.id,
         "container_name": container.name,
         "container_image": container.image,
         "machine_id": container.machine_id,
-        "machine_ip": get_machine_ip_by_id(container.machine_id),
+        "machine_ip": machine_ip,
         "container_status": container.container_status.value,
         "memory_gb": container.memory_gb,
         "swap_gb": container.swap_gb,
@@ -995,7 +1144,7 @@ def get_container_detail_information(container_id:int)->container_detail_informa
         "cpu_number": container.cpu_number,
         "port": container.port,
         # 备忘：owners才是系统对应的用户名列表
-        "owners": [get_name_by_id(binding['user_id']) for binding in owener_bindings],
+        "owners": [binding['owner_name'] for binding in owener_bindings],
         # 这里的变动是为了
         # 1. 语句写法 - 防止报错（针对API提取时的格式问题）
         # 2. username -> user_id 使得在页面层对应性更强，并避免可能存在的 user_name与username不同
@@ -1008,78 +1157,109 @@ def get_container_detail_information(container_id:int)->container_detail_informa
 
 
 
+def _parse_container_status(status_str) -> ContainerStatus | None:
+    if not status_str:
+        return None
+    try:
+        return ContainerStatus(status_str)
+    except Exception:
+        # try case-insensitive match of enum values
+        try:
+            return next(s for s in ContainerStatus if s.value.lower() == str(status_str).lower())
+        except StopIteration:
+            return None
+
+
 #返回一页容器的概要信息
-def list_all_container_bref_information(machine_id:int, user_id:int, page_number:int, page_size:int)->dict:
-    # 非管理员用户必须先通过机器权限表过滤可见机器
-    if user_id and not _is_operator_user(user_id):
-        allowed = set(machine_permission_repo.list_machine_ids_by_user(user_id))
-        if machine_id is not None:
-            if machine_id not in allowed:
-                containers = []
-            else:
-                containers = list_containers(limit=page_size, offset=page_number*page_size, machine_id=machine_id, user_id=None)
-        else:
-            containers = [c for c in list_containers(limit=99999, offset=0, machine_id=None, user_id=None) if c.machine_id in allowed]
-            containers = containers[page_number*page_size:page_number*page_size+page_size]
-    else:
-        containers = list_containers(limit=page_size, offset=page_number*page_size, machine_id=machine_id, user_id=user_id)
-    res = []
-    for container in containers:
-        machine_ip = ""
-        # For information calls: if machine is offline or maintenance, skip node checks for containers on that machine
-        do_node_check = True
+def list_all_container_bref_information(machine_id:int, user_id:int, page_number:int, page_size:int, cursor:str|None=None)->dict:
+    """
+    分页列出容器。传入 cursor（上一页返回的 next_cursor）时使用 keyset 分页，深页与首页代价相同；
+    否则沿用 page_number 的 offset 分页。两种方式都会返回 next_cursor（没有下一页时为 None）。
+    """
+    after_id = decode_cursor("containers", cursor)
+    # 非管理员用户通过 machine_permissions 联表过滤可见机器，不再把全表读入内存后过滤
+    permitted_user_id = user_id if user_id and not _is_operator_user(user_id) else None
+    owner_id = None if permitted_user_id is not None else user_id
+    # 多取一行用于判断是否还有下一页
+    rows = list_containers(
+        limit=page_size + 1,
+        offset=page_number*page_size,
+        machine_id=machine_id,
+        user_id=owner_id,
+        after_id=after_id,
+        permitted_user_id=permitted_user_id,
+    )
+    containers = rows[:page_size]
+    next_cursor = encode_cursor("containers", containers[-1].id) if len(rows) > page_size else None
+
+    # 1) 每台机器只查一次：取 IP，并判断是否需要 Node 检查
+    # For information calls: if machine is offline or maintenance, skip node checks for containers on that machine
+    machine_info: dict[int, tuple[str, bool]] = {}
+    for mid in {c.machine_id for c in containers}:
         try:
-            m = machine_repo.get_by_id(container.machine_id)
+            m = machine_repo.get_by_id(mid)
         except Exception:
             m = None
-        if m is not None:
+        if m is None:
+            machine_info[mid] = ("", True)
+            continue
+        try:
+            status_val = m.machine_status.value.lower() if hasattr(m.machine_status, 'value') else str(m.machine_status).lower()
+        except Exception:
+            status_val = str(getattr(m, 'machine_status', '')).lower()
+        machine_info[mid] = (getattr(m, 'machine_ip', None), status_val not in ('offline', 'maintenance'))
+
+    # 2) 按机器分组，先读共享状态缓存；缺失的容器每台机器一次批量状态请求（single-flight），机器之间并发
+    groups: dict[int, list[str]] = {}
+    for container in containers:
+        machine_ip, do_node_check = machine_info.get(container.machine_id, ("", True))
+        if do_node_check and machine_ip:
+            groups.setdefault(container.machine_id, []).append(container.name)
+    statuses: dict[tuple[int, str], dict] = {}
+    if groups:
+        def _machine_statuses(mid: int, names: list[str]) -> dict[str, dict]:
+            ip = machine_info[mid][0]
+            return container_status_cache.get_many(mid, names, lambda missing: get_containers_status(ip, missing))
+
+        workers = max(1, min(len(groups), CommsConfig.NODE_FANOUT_WORKERS))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {mid: executor.submit(_machine_statuses, mid, names) for mid, names in groups.items()}
+        for mid, fut in futures.items():
             try:
-                status_val = m.machine_status.value.lower() if hasattr(m.machine_status, 'value') else str(m.machine_status).lower()
-            except Exception:
-                status_val = str(getattr(m, 'machine_status', '')).lower()
-            if status_val in ('offline', 'maintenance'):
-                do_node_check = False
+                for name, st in fut.result().items():
+                    statuses[(mid, name)] = st
+            except Exception as e:
+                print(f"list_all_container_bref_information: ignored NODE batch error for machine {mid}: {e}")
+
+    # 3) 回到当前线程统一落库（数据库会话不跨线程使用）
+    res = []
+    for container in containers:
+        machine_ip, _ = machine_info.get(container.machine_id, ("", True))
+        st = statuses.get((container.machine_id, container.name))
+        # If Node reports 404, delete local record (existing behavior)
+        if isinstance(st, dict) and st.get('status_code') == 404:
+            container_status_cache.invalidate(container.machine_id, container.name)
             try:
-                machine_ip = get_machine_ip_by_id(container.machine_id)
-            except Exception:
-                machine_ip = None
-
-        st = None
-        if do_node_check:
-            if machine_ip:
-                st = get_container_status(machine_ip, container.name)
-                # If Node reports 404, delete local record (existing behavior)
-                if isinstance(st, dict) and st.get('status_code') == 404:
-                    try:
-                        remove_binding(0, container.id, all=True)
-                    except Exception as e:
-                        print(f"Warning: failed to remove bindings for {container.id}: {e}")
-                    try:
-                        delete_container(container.id)
-                    except Exception as e:
-                        print(f"Warning: failed to delete container {container.id} from DB: {e}")
-                    # skip adding this container to result
-                    continue
-                else:
-                    # If Node returned a status payload (not 404), persist container_status to DB when possible
+                remove_binding(0, container.id, all=True)
+            except Exception as e:
+                print(f"Warning: failed to remove bindings for {container.id}: {e}")
+            try:
+                delete_container(container.id)
+            except Exception as e:
+                print(f"Warning: failed to delete container {container.id} from DB: {e}")
+            # skip adding this container to result
+            continue
+        if isinstance(st, dict) and 'error' not in st:
+            # If Node returned a status payload (not 404), persist container_status to DB when possible
+            try:
+                new_status = _parse_container_status(st.get('container_status'))
+                if new_status:
                     try:
-                        if st and isinstance(st, dict) and st.get('status_code') is None or (isinstance(st, dict) and st.get('status_code') != 404):
-                            status_str = st.get('container_status')
-                            if status_str:
-                                try:
-                                    new_status = ContainerStatus(status_str)
-                                except Exception:
-                                    try:
-                                        new_status = next(s for s in ContainerStatus if s.value.lower() == str(status_str).lower())
-                                    except StopIteration:
-                                        new_status = None
-                                if new_status:
-                                    try:
-                                        update_container(container.id, container_status=new_status)
-                                    except Exception as e:
-                                        print(f"Warning: failed to update container status for {container.id}: {e}")
+                        update_container(container.id, container_status=new_status)
                     except Exception as e:
-                        print(f"list_all_container_bref_information: ignored error while persisting status for {container.name}: {e}")
+                        print(f"Warning: failed to update container status for {container.id}: {e}")
+            except Exception as e:
+                print(f"list_all_container_bref_information: ignored error while persisting status for {container.name}: {e}")
 
         info = container_bref_information(
             container_id=container.id,
@@ -1091,13 +1271,15 @@ def list_all_container_bref_information(machine_id:int, user_id:int, page_number
         )
         res.append(info)
 
-    # 这里计算总页数
-    try: # 理论不会报错 但是被建议保留
-        total_count = count_containers(machine_id=machine_id)
-        total_page = max(1, math.ceil(total_count / page_size))
-    except Exception:
-        total_page = 1
+    # 这里计算总页数（keyset 模式下客户端只需 next_cursor，不再额外 COUNT）
+    total_page = None
+    if after_id is None:
+        try: # 理论不会报错 但是被建议保留
+            total_count = count_containers(machine_id=machine_id, permitted_user_id=permitted_user_id)
+            total_page = max(1, math.ceil(total_count / page_size))
+        except Exception:
+            total_page = 1
 
-    return {"containers": res, "total_page": total_page}
+    return {"containers": res, "total_page": total_page, "next_cursor": next_cursor}
 
 ####################################################
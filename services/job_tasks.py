@@ -0,0 +1,277 @@
+import datetime as dt
+import json
+import threading
+import time
+import traceback
+from typing import Callable
+
+from flask import current_app, has_app_context
+from sqlalchemy.exc import IntegrityError
+
+from ..config import JobConfig
+from ..constant import ContainerStatus, JobStatus
+from ..extensions import db
+from ..models.containers import Container
+from ..models.job import Job
+from ..repositories import job_repo
+from ..repositories import containers_repo, machine_repo
+from ..utils.Container import Container_info
+from ..utils.heartbeat import container_starting_status_heartbeat, run_machine_maintenance_transition
+
+
+class JobQueueError(Exception):
+    '''
+    任务入队失败（队列已满、未知任务类型）。与 NodeServiceError 一样携带 reason 供接口层映射状态码。
+    '''
+
+    def __init__(self, message: str, reason: str | None = None):
+        super().__init__(message)
+        self.reason = reason
+
+
+# 入队后唤醒空闲的执行线程，避免新任务等满一个轮询周期
+_wake = threading.Event()
+
+
+#######################################
+# 任务处理函数：payload 为入队时的 JSON 参数，返回值作为任务结果写回表中。
+# 控制端重启后任务可能被再次执行，处理函数需要识别“上一次已经做完”的情况。
+
+def _container_service():
+    # container_tasks 体量较大且依赖 machine_tasks，这里延迟导入，避免 machine_tasks -> job_tasks 的循环依赖
+    from . import container_tasks
+    return container_tasks
+
+
+# 创建任务等待容器离开 CREATING 的最长时间（秒），与启动心跳的超时一致
+_CREATE_SETTLE_TIMEOUT = 180
+
+
+def _wait_container_settled(container_id: int, timeout: float) -> ContainerStatus | None:
+    """
+    轮询数据库（由心跳写回）直到容器离开 CREATING，返回当时的状态；记录已被删除时返回 None。
+    期间任务保持 running，租约由执行器续期；进程退出后任务重新入队，由下一次执行接着等待。
+    """
+    deadline = time.time() + timeout
+    while True:
+        db.session.commit()  # 结束当前事务，读取心跳线程提交的最新状态
+        container = db.session.get(Container, container_id)
+        if container is None:
+            return None
+        if container.container_status != ContainerStatus.CREATING or time.time() >= deadline:
+            return container.container_status
+        time.sleep(JobConfig.JOB_POLL_INTERVAL)
+
+
+def _handle_create_container(payload: dict, job: Job) -> dict:
+    container = Container_info(**payload["container"])
+    machine_id = int(payload["machine_id"])
+    resumed = False
+    container_id = None
+    if job.attempts > 1:
+        container_id = containers_repo.get_id_by_name_machine(container_name=container.NAME, machine_id=machine_id)
+        if container_id:
+            resumed = True
+            # 上一次执行的进程已退出，它登记的启动心跳也随之丢失：仍在 CREATING 时重新登记
+            existing = containers_repo.get_by_id(container_id)
+            if existing is not None and existing.container_status == ContainerStatus.CREATING:
+                container_starting_status_heartbeat(machine_repo.get_machine_ip_by_id(machine_id), container.NAME,
+                                                    container_id=container_id, machine_id=machine_id,
+                                                    timeout=_CREATE_SETTLE_TIMEOUT, interval=3)
+    if not container_id:
+        ok = _container_service().Create_container(
+            owner_name=payload["owner_name"],
+            machine_id=machine_id,
+            container=container,
+            public_key=payload.get("public_key"),
+            operator_user_id=job.operator_user_id,
+        )
+        if not ok:
+            raise JobQueueError("Failed to create container", reason="create_failed")
+        container_id = containers_repo.get_id_by_name_machine(container_name=container.NAME, machine_id=machine_id)
+
+    # 容器到达终态（ONLINE/FAILED）后任务才结束
+    status = _wait_container_settled(container_id, _CREATE_SETTLE_TIMEOUT)
+    if status is None:
+        raise JobQueueError(f"Container {container_id} was removed while being created", reason="create_failed")
+    if status == ContainerStatus.FAILED:
+        raise JobQueueError(f"Container {container_id} failed to start", reason="create_failed")
+    if status == ContainerStatus.CREATING:
+        raise JobQueueError(f"Container {container_id} still creating after {_CREATE_SETTLE_TIMEOUT}s", reason="create_timeout")
+    result = {"container_id": container_id, "container_status": status.value}
+    if resumed:
+        result["resumed"] = True
+    return result
+
+
+def _handle_remove_container(payload: dict, job: Job) -> dict:
+    container_id = int(payload["container_id"])
+    if job.attempts > 1 and containers_repo.get_by_id(container_id) is None:
+        return {"container_id": container_id, "resumed": True}
+    if not _container_service().remove_container(container_id=container_id, operator_user_id=job.operator_user_id):
+        raise JobQueueError("Failed to delete container", reason="delete_failed")
+    return {"container_id": container_id}
+
+
+# 维护过渡的进度写入任务结果的最小间隔（秒）；阶段变化时总是立即写入
+_PROGRESS_WRITE_INTERVAL = 1.0
+
+
+def _handle_machine_maintenance(payload: dict, job: Job) -> dict:
+    # 进度写入 jobs.result，任意 worker 都能通过 Get_maintenance_progress / Get_job_status 读取
+    last = {"phase": None, "at": 0.0, "snapshot": None}
+
+    def _publish(snapshot: dict):
+        last["snapshot"] = snapshot
+        now = time.time()
+        if snapshot["phase"] == last["phase"] and now - last["at"] < _PROGRESS_WRITE_INTERVAL:
+            return
+        last.update(phase=snapshot["phase"], at=now)
+        job_repo.set_running_result(job.id, {"progress": snapshot})
+
+    status = run_machine_maintenance_transition(int(payload["machine_id"]), on_progress=_publish)
+    return {"machine_status": status.value, "progress": last["snapshot"]}
+
+
+_JOB_HANDLERS: dict[str, Callable[[dict, Job], dict]] = {
+    "create_container": _handle_create_container,
+    "remove_container": _handle_remove_container,
+    "machine_maintenance": _handle_machine_maintenance,
+}
+#######################################
+
+
+def enqueue_job(kind: str, payload: dict, operator_user_id: int | None = None) -> Job:
+    """
+    写入一条 queued 任务并唤醒执行线程，立即返回。
+    排队中 + 执行中的任务数达到 JOB_QUEUE_MAX 时抛出 JobQueueError(reason='queue_full')。
+    """
+    if kind not in _JOB_HANDLERS:
+        raise JobQueueError(f"unknown job kind: {kind}", reason="invalid_payload")
+    if job_repo.count_active() >= JobConfig.JOB_QUEUE_MAX:
+        raise JobQueueError(f"job queue is full (max {JobConfig.JOB_QUEUE_MAX})", reason="queue_full")
+    job = job_repo.create_job(kind, payload, operator_user_id=operator_user_id,
+                              max_attempts=JobConfig.JOB_MAX_ATTEMPTS)
+    print(f"[jobs] enqueued {job.kind} job_id={job.job_id}")
+    notify_workers()
+    return job
+
+
+def run_job(job: Job) -> JobStatus:
+    """执行一条已被领取（running）的任务，并把最终状态写回表中。"""
+    started = time.time()
+    try:
+        payload = json.loads(job.payload or "{}")
+        result = _JOB_HANDLERS[job.kind](payload, job)
+    except IntegrityError as e:
+        job_repo.finish_job(job.id, JobStatus.FAILED, error_reason="duplicate_entry",
+                            message=str(e.orig) if hasattr(e, 'orig') else str(e))
+        return JobStatus.FAILED
+    except Exception as e:
+        reason = getattr(e, 'reason', None) or getattr(e, 'error_reason', None) or f"{job.kind}_failed"
+        print(f"[jobs] {job.kind} job_id={job.job_id} failed: {e}")
+        if not getattr(e, 'reason', None):
+            traceback.print_exc()
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        job_repo.finish_job(job.id, JobStatus.FAILED, error_reason=str(reason)[:120], message=str(e))
+        return JobStatus.FAILED
+    job_repo.finish_job(job.id, JobStatus.SUCCEEDED, result=result)
+    print(f"[jobs] {job.kind} job_id={job.job_id} succeeded in {time.time() - started:.1f}s")
+    return JobStatus.SUCCEEDED
+
+
+def notify_workers() -> None:
+    _wake.set()
+
+
+def wait_for_jobs(timeout: float) -> None:
+    """执行线程空闲时调用：等待新任务入队或超时。"""
+    if _wake.wait(timeout):
+        _wake.clear()
+
+
+def job_workers_running() -> bool:
+    """当前进程是否有任务执行线程；没有时调用方应退回到同步/线程方式执行。"""
+    if not has_app_context():
+        return False
+    state = current_app.extensions.get("job_workers")
+    if not isinstance(state, dict) or state["stop_event"].is_set():
+        return False
+    return any(t.is_alive() for t in state.get("threads", []))
+
+
+def _worker_count() -> int:
+    if job_workers_running():
+        return int(current_app.extensions["job_workers"]["workers"])
+    return max(1, JobConfig.JOB_WORKERS)
+
+
+def _estimate_eta(job: Job) -> tuple[int | None, float]:
+    """返回 (排队位置, 预计剩余秒数)：位置 × 同类任务平均耗时 / 执行线程数。"""
+    durations = job_repo.recent_durations(job.kind)
+    avg = sum(durations) / len(durations) if durations else JobConfig.JOB_DEFAULT_DURATION
+    if job.status == JobStatus.QUEUED:
+        position = job_repo.count_queued_before(job)
+        # 排在前面的任务按执行线程数分批完成，再加上本任务自身
+        return position, (position // _worker_count() + 1) * avg
+    if job.status == JobStatus.RUNNING and job.started_at:
+        elapsed = (dt.datetime.utcnow() - job.started_at).total_seconds()
+        return None, max(0.0, avg - elapsed)
+    return None, 0.0
+
+
+def _iso(value: dt.datetime | None) -> str | None:
+    return value.isoformat() if value else None
+
+
+def Get_maintenance_job_progress(machine_id: int) -> dict | None:
+    """
+    该机器最近一次维护任务记录在 jobs 表中的进度；任务尚未开始时 phase 为 queued。
+    没有维护任务时返回 None。
+    """
+    for job in job_repo.list_recent("machine_maintenance"):
+        try:
+            if int(json.loads(job.payload or "{}").get("machine_id") or 0) != int(machine_id):
+                continue
+            progress = (json.loads(job.result) if job.result else {}).get("progress")
+        except (ValueError, TypeError, AttributeError):
+            continue
+        progress = dict(progress or {"machine_id": int(machine_id), "phase": "queued"})
+        progress["job_id"] = job.job_id
+        return progress
+    return None
+
+
+def Get_job_status(job_id: str, operator_user_id: int | None = None) -> dict | None:
+    """
+    任务状态与 ETA。非 operator 用户只能查看自己提交的任务；任务不存在或无权查看时返回 None。
+    """
+    job = job_repo.get_by_job_id(job_id) if job_id else None
+    if job is None:
+        return None
+    if operator_user_id is not None and job.operator_user_id != operator_user_id \
+            and not _container_service()._is_operator_user(operator_user_id):
+        return None
+    position, eta = _estimate_eta(job)
+    result = json.loads(job.result) if job.result else None
+    status = {
+        "job_id": job.job_id,
+        "kind": job.kind,
+        "status": job.status.value,
+        "attempts": job.attempts,
+        "queue_position": position,
+        "eta_seconds": round(eta, 1),
+        "created_at": _iso(job.created_at),
+        "started_at": _iso(job.started_at),
+        "finished_at": _iso(job.finished_at),
+        "result": result,
+        "error_reason": job.error_reason,
+        "message": job.message,
+    }
+    if job.kind == "bulk_container_action" and result:
+        # 批量派发本身同步完成；容器是否已收敛按数据库当前状态计算
+        status["progress"] = _container_service().bulk_action_progress(result)
+    return status
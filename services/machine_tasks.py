@@ -1,10 +1,14 @@
 from ..repositories.machine_repo import *
+from datetime import datetime
 from pydantic import BaseModel
 from typing import Optional
-from ..utils.heartbeat import send, start_machine_maintenance_transition_heartbeat
-from ..repositories.containers_repo import update_container, list_containers as repo_list_containers
+from ..utils.heartbeat import send, start_machine_maintenance_transition_heartbeat, get_maintenance_progress
+from ..repositories.containers_repo import transition_machine_containers
 from ..repositories import machine_permission_repo, user_repo
 from ..constant import ContainerStatus, MachineStatus
+from ..utils.liveness import liveness_table
+from ..utils.cursor import encode_cursor, decode_cursor
+from ..models.machine_permission import MachinePermission
 #######################################
 #API Definition
 class machine_bref_information(BaseModel):
@@ -13,6 +17,7 @@ class machine_bref_information(BaseModel):
     machine_ip:str
     machine_type:str
     machine_status:str
+    last_seen: Optional[str] = None # 存活监控最近一次探测到在线的时间（ISO 格式，UTC）
 
 class machine_detail_information(BaseModel):
     machine_name:str
@@ -82,12 +87,57 @@ def is_machine_online_remote(machine_id: int, timeout: float = 2.0) -> bool:
     if not machine_ip:
         return False
 
+    return probe_machine_ip(machine_ip, timeout=timeout)
+
+
+def probe_machine_ip(machine_ip: str, timeout: float = 2.0) -> bool:
+    """
+    只做通信、不访问数据库的 `/machine_status` 探测，可在线程池中并发调用。
+    """
     j = send(machine_ip, "/machine_status", {"config": {}}, timeout=timeout)
     if isinstance(j, dict) and j.get('success') in (1, True):
         ms = (j.get('machine_status') or '').lower()
         return ms == 'online'
     return False
 
+
+def _mark_containers_offline(machine_id: int) -> None:
+    try:
+        transition_machine_containers(machine_id, ContainerStatus.OFFLINE)
+    except Exception as e:
+        print(f"Error marking containers offline on machine {machine_id}: {e}")
+
+
+def apply_machine_liveness(machine, online: bool) -> MachineStatus | None:
+    """
+    根据一次存活探测结果推进机器状态，只在状态真正变化时写库：
+    - 维护中的机器：在线则保持 MAINTENANCE；不可达则转为 OFFLINE
+    - 其它状态：在线转为 ONLINE；不可达转为 OFFLINE
+    转为 OFFLINE 时同时把该机器上的容器标记为 OFFLINE。
+    machine 是探测前读出的对象，写库使用以其状态为条件的 UPDATE；
+    若期间状态已被其它请求修改则不覆盖，返回 None。
+    返回新的状态；未发生变化时返回 None。
+    """
+    try:
+        observed = MachineStatus(machine.machine_status.value.lower() if hasattr(machine.machine_status, 'value') else str(machine.machine_status).lower())
+    except Exception:
+        print(f"[machine-liveness] unknown status for machine_id={machine.id}: {getattr(machine, 'machine_status', None)}")
+        return None
+
+    if online:
+        target = MachineStatus.MAINTENANCE if observed == MachineStatus.MAINTENANCE else MachineStatus.ONLINE
+    else:
+        target = MachineStatus.OFFLINE
+    if observed == target:
+        return None
+
+    if not transition_machine_status(machine.id, observed, target):
+        print(f"[machine-liveness] machine_id={machine.id} changed concurrently, skip {observed.value} -> {target.value}")
+        return None
+    if target == MachineStatus.OFFLINE:
+        _mark_containers_offline(machine.id)
+    return target
+
 #######################################
 #######################################
 # 添加一个新的机器到集群
@@ -150,6 +200,7 @@ def Add_machine(machine_name:str,
 def Remove_machine(machine_id:list[int])->bool:
     for id in machine_id:
         delete_machine(id)
+        liveness_table.forget(id)
     return True
 #######################################
 
@@ -178,18 +229,44 @@ def Update_machine(machine_id: int, **fields) -> bool:
     requested_status = fields.get('machine_status', None)
     current_status = machine.machine_status.value if hasattr(machine.machine_status, 'value') else str(machine.machine_status)
 
-    # ONLINE -> MAINTENANCE: Ctrl异步处理，保持当前状态并启动过渡心跳；
+    # ONLINE -> MAINTENANCE: Ctrl异步处理，保持当前状态并启动过渡；
+    # 有任务执行器时写入持久化任务队列（控制端重启后可继续），否则退回到后台线程。
     # 其他状态变更则直接更新
     if str(current_status).lower() == MachineStatus.ONLINE.value and str(requested_status).lower() == MachineStatus.MAINTENANCE.value:
         passthrough_fields = dict(fields)
         passthrough_fields.pop('machine_status', None)
         if passthrough_fields:
             update_machine(machine_id, **passthrough_fields)
-        start_machine_maintenance_transition_heartbeat(machine_id)
+        from . import job_tasks
+        if job_tasks.job_workers_running():
+            try:
+                job_tasks.enqueue_job("machine_maintenance", {"machine_id": machine_id})
+            except job_tasks.JobQueueError as e:
+                err = ValueError(str(e))
+                setattr(err, 'error_reason', e.reason)
+                raise err
+        else:
+            start_machine_maintenance_transition_heartbeat(machine_id)
         return True
 
     update_machine(machine_id, **fields)
     return True    
+
+
+def Get_maintenance_progress(machine_id: int) -> dict | None:
+    """
+    ONLINE -> MAINTENANCE 过渡进度（已停止 n / 共 N 个容器）；该机器没有过渡记录时返回 None。
+    经任务队列执行的过渡从 jobs 表读取（任意 worker 都能返回）；
+    没有执行线程时退回的后台线程只在本进程内存中记录，两者取较新的一次。
+    """
+    from . import job_tasks
+    local = get_maintenance_progress(machine_id)
+    queued = job_tasks.Get_maintenance_job_progress(machine_id)
+    if local is None or queued is None:
+        return local or queued
+    if queued.get("started_at") is None:  # 尚未开始的任务总是最新的
+        return queued
+    return local if local["started_at"] > queued["started_at"] else queued
 #######################################
 
 
@@ -269,8 +346,7 @@ def List_all_machine_bref_information(
     
         # 3. 权限过滤：普通用户仅能看到被授权机器
     if user_id and not _is_operator_user(user_id):
-        allowed = set(machine_permission_repo.list_machine_ids_by_user(user_id))
-        machines_query = machines_query.filter(Machine.id.in_(allowed)) if allowed else machines_query.filter(False)
+        machines_query = _filter_permitted_machines(machines_query, user_id)
 
     # 3. 执行分页查询
     # 先计算符合过滤条件的总数量（而非全量机器）
@@ -279,73 +355,54 @@ def List_all_machine_bref_information(
     machines = machines_query.limit(page_size).offset(page_number * page_size).all()
     
     # 4. 组装返回结果
-    res = []
-    for machine in machines:
-        # 最朴素的节点可达性检查：单次请求 /machine_status
-        try:
-            try:
-                online = is_machine_online_remote(machine.id, timeout=2.0)
-            except Exception:
-                online = False
-
-            try:
-                current_status_val = machine.machine_status.value.lower() if hasattr(machine.machine_status, 'value') else str(machine.machine_status).lower()
-            except Exception:
-                current_status_val = str(getattr(machine, 'machine_status', '')).lower()
-
-            def _mark_containers_offline(mach):
-                try:
-                    containers_on_machine = getattr(mach, 'containers', None) or repo_list_containers(limit=100, offset=0, machine_id=mach.id)
-                    for c in containers_on_machine:
-                        cid = getattr(c, 'id', None) or (c.get('container_id') if isinstance(c, dict) else None)
-                        if cid:
-                            try:
-                                update_container(cid, container_status=ContainerStatus.OFFLINE)
-                            except Exception:
-                                pass
-                except Exception:
-                    pass
-
-            if current_status_val == 'maintenance':
-                if online:
-                    try:
-                        update_machine(machine.id, machine_status=MachineStatus.MAINTENANCE)
-                    except Exception:
-                        pass
-                else:
-                    try:
-                        update_machine(machine.id, machine_status=MachineStatus.OFFLINE)
-                    except Exception:
-                        pass
-                    _mark_containers_offline(machine)
-            else:
-                if online:
-                    try:
-                        update_machine(machine.id, machine_status=MachineStatus.ONLINE)
-                    except Exception:
-                        pass
-                else:
-                    try:
-                        update_machine(machine.id, machine_status=MachineStatus.OFFLINE)
-                    except Exception:
-                        pass
-                    _mark_containers_offline(machine)
-        except Exception:
-            # ignore and continue
-            pass
-        latest = get_by_id(machine.id) or machine
-        info = machine_bref_information(
-            id=latest.id,
-            machine_name=latest.machine_name,
-            machine_ip=latest.machine_ip,
-            machine_type=latest.machine_type.value,
-            machine_status=latest.machine_status.value
-        )
-        res.append(info)
+    res = [_to_machine_bref(machine) for machine in machines]
     
     # 计算总页数（基于过滤后的数量）
     total_pages = (total_count + page_size - 1) // page_size if page_size > 0 else 0
     
     return res, total_pages
+
+
+def List_machine_bref_information_by_cursor(
+    page_size: int,
+    cursor: str | None = None,
+    user_id: int | None = None,
+) -> tuple[list[machine_bref_information], str | None]:
+    """
+    keyset 分页获取机器概要信息（按 id 升序）：cursor 为上一页返回的 next_cursor，为空表示第一页。
+    返回 (机器概要信息列表, next_cursor)，没有下一页时 next_cursor 为 None。
+    """
+    after_id = decode_cursor("machines", cursor)
+    machines_query = Machine.query
+    if user_id and not _is_operator_user(user_id):
+        machines_query = _filter_permitted_machines(machines_query, user_id)
+    if after_id is not None:
+        machines_query = machines_query.filter(Machine.id > after_id)
+    rows = machines_query.order_by(Machine.id.asc()).limit(page_size + 1).all()
+    machines = rows[:page_size]
+    next_cursor = encode_cursor("machines", machines[-1].id) if len(rows) > page_size else None
+    return [_to_machine_bref(machine) for machine in machines], next_cursor
+
+
+def _filter_permitted_machines(machines_query, user_id: int):
+    # 普通用户仅能看到被授权机器：通过 machine_permissions 联表在数据库中过滤
+    return machines_query.join(MachinePermission, MachinePermission.machine_id == Machine.id).filter(
+        MachinePermission.user_id == user_id
+    )
+
+
+def _to_machine_bref(machine: Machine) -> machine_bref_information:
+    # 节点可达性由后台存活监控（schemas.machine_liveness_task）异步探测并在状态变化时写库，
+    # 这里只读数据库状态和内存中的存活表，不再逐台同步探测。
+    entry = liveness_table.get(machine.id)
+    last_seen = entry.get("last_seen") if entry else None
+    return machine_bref_information(
+        id=machine.id,
+        machine_name=machine.machine_name,
+        machine_ip=machine.machine_ip,
+        machine_type=machine.machine_type.value,
+        machine_status=machine.machine_status.value,
+        last_seen=datetime.utcfromtimestamp(last_seen).isoformat() if last_seen else None,
+    )
 #######################################
 
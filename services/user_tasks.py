@@ -7,6 +7,7 @@ from ..repositories import authentications_repo
 from ..repositories import registration_code_repo
 from ..repositories import usercontainer_repo, containers_repo
 from ..utils.mail import send as send_mail
+from ..utils.cursor import encode_cursor, decode_cursor
 from ..constant import ROLE, ContainerStatus
 from pydantic import BaseModel
 from datetime import datetime, timedelta
@@ -238,10 +239,27 @@ def List_all_user_bref_information(page_number:int, page_size:int)->list[user_br
 
     offset = (pn - 1) * ps
     users = list_users(limit=ps, offset=offset)
+    return _to_user_bref_list(users)
+
+
+def List_user_bref_information_by_cursor(page_size:int, cursor:str|None=None)->tuple[list[user_bref_information], str|None]:
+    """
+    keyset 分页列出用户（按 id 升序）：cursor 为上一页返回的 next_cursor，为空表示第一页。
+    返回 (用户概要信息列表, next_cursor)，没有下一页时 next_cursor 为 None。
+    """
+    after_id = decode_cursor("users", cursor)
+    rows = list_users(limit=page_size + 1, after_id=after_id)
+    users = rows[:page_size]
+    next_cursor = encode_cursor("users", users[-1].id) if len(rows) > page_size else None
+    return _to_user_bref_list(users), next_cursor
+
+
+def _to_user_bref_list(users)->list[user_bref_information]:
+    # 整页用户的容器统计一次性分组查询，避免逐用户、逐容器查询
+    page_counts = usercontainer_repo.compute_users_container_counts([u.id for u in users])
     result: list[user_bref_information] = []
     for u in users:
-        # Use centralized helper to compute container counts for this user
-        counts = usercontainer_repo.compute_user_container_counts(u.id)
+        counts = page_counts.get(u.id, {})
         container_ids = counts.get('container_ids', [])
         total = counts.get('total', 0)
         functional = counts.get('functional', 0)
@@ -11,7 +11,7 @@ from ..models.authentications import Authentication
 
 @pytest.fixture(scope="session")
 def app():
-    app = create_app()
+    app = create_app("testing")
     app.config.update(TESTING=True)
     with app.app_context():
         # 确保所有模型已导入后再建表
@@ -16,7 +16,7 @@ TOKEN_FOR_TESTING = None
 
 @pytest.fixture(scope="session")
 def app():
-    app = create_app()
+    app = create_app("testing")
     app.config.update(TESTING=True)
     
     with app.app_context():
@@ -0,0 +1,255 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ..config import CommsConfig
+from ..utils import node_transport
+from ..utils.async_node_transport import AsyncNodeTransport, NodeRequest
+
+
+class _NodeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(0.05)
+        if self.path.endswith("/missing"):
+            out, code = {"error_reason": "not_found"}, 404
+        else:
+            out, code = {"success": 1, "message": body["message"], "signature": body["signature"]}, 200
+        data = json.dumps(out).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class _NodeServer(ThreadingHTTPServer):
+    request_queue_size = 128
+
+
+@pytest.fixture()
+def node_server():
+    server = _NodeServer(("127.0.0.1", 0), _NodeHandler)
+    server.daemon_threads = True
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+##################################
+# 异步客户端：报文格式、响应解析与同步传输一致；并发请求复用连接
+def test_async_transport_envelope_and_concurrency(node_server):
+    async def run():
+        transport = AsyncNodeTransport(max_in_flight=64, pool_maxsize=64, retry_total=0)
+        try:
+            started = time.time()
+            results = await asyncio.gather(*(
+                transport.send(f"{node_server}/api/ping", b"cipher-%d" % i, b"sig") for i in range(64)
+            ))
+            elapsed = time.time() - started
+            missing = await transport.send(f"{node_server}/api/missing", b"x", b"y")
+            # 第二轮复用第一轮留下的 keep-alive 连接
+            opened = transport.connections_opened
+            await asyncio.gather(*(transport.send(f"{node_server}/api/ping", b"again", b"sig") for _ in range(8)))
+            return results, elapsed, missing, opened, transport.connections_opened
+        finally:
+            await transport.close()
+
+    results, elapsed, missing, opened, opened_after = asyncio.run(run())
+    assert [r["message"] for r in results[:2]] == ["Y2lwaGVyLTA=", "Y2lwaGVyLTE="]
+    assert all(r["success"] == 1 and r["status_code"] == 200 and r["signature"] == "c2ln" for r in results)
+    assert elapsed < 64 * 0.05 / 4, "请求应当并发而不是串行"
+    assert missing == {"error_reason": "not_found", "status_code": 404}
+    assert opened_after == opened
+
+
+def test_async_transport_connection_error_returns_error_dict():
+    async def run():
+        transport = AsyncNodeTransport(retry_total=1, backoff_factor=0)
+        try:
+            return await transport.send("http://127.0.0.1:9/api/ping", b"x", b"y", timeout=1.0)
+        finally:
+            await transport.close()
+
+    res = asyncio.run(run())
+    assert set(res) == {"error"}
+
+
+##################################
+# 复用连接：响应开始前被关闭才重发；响应读到一半断开说明 Node 已处理，不能重发
+def _raw_node(handled, close_idle, truncate_after):
+    """close_idle 时第 1 个请求响应后关闭空闲连接；第 truncate_after 个之后的请求只回一半响应就断开。"""
+    async def _serve(reader, writer):
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+            await reader.readexactly(length)
+            handled.append(1)
+            data = b'{"success": 1}'
+            if len(handled) > truncate_after:
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\n" + data)
+                await writer.drain()
+                writer.close()
+                return
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n" % len(data) + data)
+            await writer.drain()
+            if close_idle:
+                # 模拟 Node 关闭空闲 keep-alive 连接
+                writer.close()
+                return
+    return _serve
+
+
+@pytest.mark.parametrize("close_idle", [True, False])
+def test_async_transport_resends_only_before_first_response_byte(close_idle):
+    handled = []
+
+    async def run():
+        server = await asyncio.start_server(_raw_node(handled, close_idle, 99 if close_idle else 1), "127.0.0.1", 0)
+        url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/api/ping"
+        transport = AsyncNodeTransport(retry_total=0)
+        try:
+            first = await transport.send(url, b"x", b"y")
+            await asyncio.sleep(0.05)  # 等待服务端关闭空闲连接
+            second = await transport.send(url, b"x", b"y")
+            return first, second, transport.connections_opened
+        finally:
+            await transport.close()
+            server.close()
+            await server.wait_closed()
+
+    first, second, opened = asyncio.run(run())
+    assert first["success"] == 1
+    assert len(handled) == 2, "每个请求只被 Node 处理一次"
+    if close_idle:
+        # 空闲连接已被关闭：换新连接重发
+        assert second["success"] == 1 and opened == 2
+    else:
+        # 复用连接上请求已被处理、响应被截断：返回错误，不在新连接上重发
+        assert set(second) == {"error"} and opened == 1
+
+
+##################################
+# 批量报文：同一台机器的多条命令合并为 /batch，超过上限时分块；旧版 Node 回退为逐条发送
+def _fake_batch_node(calls, has_batch=True):
+    def _send(machine_ip, endpoint, payload, timeout=5.0, attempts=1):
+        calls.append((machine_ip, endpoint))
+        if endpoint == node_transport.BATCH_ENDPOINT:
+            if not has_batch:
+                return {"message": "not found", "status_code": 404}
+            return {"success": 1, "results": [{"success": 1, "name": c["payload"]["config"]["container_name"]}
+                                              for c in payload["config"]["commands"]]}
+        return {"success": 1, "name": payload["config"]["container_name"]}
+    return _send
+
+
+def _status_commands(n):
+    return [("/container_status", {"config": {"container_name": f"c{i}"}}) for i in range(n)]
+
+
+@pytest.fixture()
+def batch_state(monkeypatch):
+    node_transport.clear_batch_unsupported()
+    monkeypatch.setattr(CommsConfig, "NODE_BATCH_ENABLED", True)
+    monkeypatch.setattr(CommsConfig, "NODE_BATCH_MAX_COMMANDS", 4)
+
+
+def test_send_batch_to_node_chunks_commands(batch_state, monkeypatch):
+    calls = []
+    monkeypatch.setattr(node_transport, "send_to_node", _fake_batch_node(calls))
+
+    results = node_transport.send_batch_to_node("10.0.0.1", _status_commands(10))
+    assert [r["name"] for r in results] == [f"c{i}" for i in range(10)]
+    assert calls == [("10.0.0.1", "/batch")] * 3
+    assert node_transport.send_batch_to_node("10.0.0.1", []) == []
+
+
+def test_send_batch_to_node_falls_back_for_old_node(batch_state, monkeypatch):
+    calls = []
+    monkeypatch.setattr(node_transport, "send_to_node", _fake_batch_node(calls, has_batch=False))
+
+    results = node_transport.send_batch_to_node("10.0.0.2", _status_commands(3))
+    assert [r["name"] for r in results] == ["c0", "c1", "c2"]
+    # 记住不支持 /batch 的机器，之后直接逐条发送
+    calls.clear()
+    node_transport.send_batch_to_node("10.0.0.2", _status_commands(2))
+    assert [ep for _, ep in calls] == ["/container_status"] * 2
+
+
+def test_send_batch_to_node_marks_unsupported_with_retry_ttl(batch_state, monkeypatch):
+    calls = []
+    monkeypatch.setattr(node_transport, "send_to_node", _fake_batch_node(calls, has_batch=False))
+    node_transport.send_batch_to_node("10.0.0.3", _status_commands(2))
+    assert node_transport.is_batch_unsupported("10.0.0.3")
+    assert not node_transport.is_batch_unsupported("10.0.0.3", "/containers_status")
+
+    # 超过 NODE_BATCH_RETRY_SECONDS 后重新探测 /batch
+    real_time = time.time
+    monkeypatch.setattr(time, "time", lambda: real_time() + CommsConfig.NODE_BATCH_RETRY_SECONDS + 1)
+    assert not node_transport.is_batch_unsupported("10.0.0.3")
+    calls.clear()
+    node_transport.send_batch_to_node("10.0.0.3", _status_commands(2))
+    assert calls[0] == ("10.0.0.3", "/batch")
+
+
+def test_send_batch_to_node_scales_timeout_and_chunks_mutations(batch_state, monkeypatch):
+    monkeypatch.setattr(CommsConfig, "NODE_BATCH_MAX_COMMANDS", 8)
+    monkeypatch.setattr(CommsConfig, "NODE_BATCH_MAX_MUTATING_COMMANDS", 3)
+    monkeypatch.setattr(CommsConfig, "NODE_BATCH_TIMEOUT_PER_COMMAND", 0.5)
+    sizes, timeouts = [], []
+    fake = _fake_batch_node([])
+
+    def _send(machine_ip, endpoint, payload, timeout=5.0, attempts=1):
+        sizes.append(len(payload["config"]["commands"]))
+        timeouts.append(timeout)
+        return fake(machine_ip, endpoint, payload, timeout, attempts)
+
+    monkeypatch.setattr(node_transport, "send_to_node", _send)
+    node_transport.send_batch_to_node("10.0.0.4", _status_commands(16), timeout=1.0)
+    assert sizes == [8, 8] and timeouts == [4.0, 4.0]
+
+    sizes.clear(), timeouts.clear()
+    stops = [("/stop_container", {"config": {"container_name": f"c{i}"}}) for i in range(7)]
+    node_transport.send_batch_to_node("10.0.0.4", stops, timeout=5.0)
+    assert sizes == [3, 3, 1] and timeouts == [5.0, 5.0, 5.0]
+
+
+def test_split_batch_response_maps_whole_batch_error():
+    assert node_transport.split_batch_response({"error": "timeout"}, 2) == [{"error": "timeout"}] * 2
+    assert node_transport.split_batch_response({"message": "x", "status_code": 404}, 2) is None
+    bad = node_transport.split_batch_response({"success": 1, "results": [{}]}, 2)
+    assert len(bad) == 2 and all("error" in r for r in bad)
+
+
+def test_async_send_many_groups_by_machine(batch_state, monkeypatch):
+    calls = []
+    fake = _fake_batch_node(calls)
+
+    async def fake_send_to_node(self, machine_ip, endpoint, payload, timeout=5.0, attempts=1):
+        return fake(machine_ip, endpoint, payload, timeout, attempts)
+
+    monkeypatch.setattr(AsyncNodeTransport, "send_to_node", fake_send_to_node)
+    requests = [NodeRequest(f"10.0.1.{i % 3}", "/container_status", {"config": {"container_name": f"c{i}"}})
+                for i in range(9)]
+
+    async def run():
+        transport = AsyncNodeTransport()
+        try:
+            return await transport.send_many(requests)
+        finally:
+            await transport.close()
+
+    results = asyncio.run(run())
+    assert [r["name"] for r in results] == [f"c{i}" for i in range(9)]
+    assert sorted(calls) == [(f"10.0.1.{i}", "/batch") for i in range(3)]
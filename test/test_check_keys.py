@@ -0,0 +1,167 @@
+import os
+import json
+
+import pytest
+
+from ..config import KeyConfig
+from ..utils import CheckKeys
+from ..utils.CheckKeys import KeyRegistry, generate_keys, generate_signing_keys
+from ..utils.node_transport import build_envelope
+from ..benchmarks import crypto_envelope, signature_suites
+from cryptography.hazmat.primitives import serialization
+
+
+##################################
+# 测试用密钥：写入临时目录，避免依赖仓库根目录下的 pem 文件
+def _write_pair(dir_path, prefix="A"):
+    private_key, public_key = generate_keys()
+    private_path = os.path.join(dir_path, f"private_{prefix}.pem")
+    public_path = os.path.join(dir_path, f"public_{prefix}.pem")
+    with open(private_path, "wb") as f:
+        f.write(private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        ))
+    with open(public_path, "wb") as f:
+        f.write(public_key.public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        ))
+    return private_path, public_path
+
+
+@pytest.fixture()
+def registry(tmp_path, monkeypatch):
+    private_path, public_path = _write_pair(str(tmp_path))
+    reg = KeyRegistry(private_path, public_path, public_path)
+    monkeypatch.setattr(CheckKeys, "key_registry", reg)
+    return reg
+
+
+##################################
+# 缓存命中测试
+def test_key_registry_caches_keys(registry):
+    registry.preload()
+    assert registry.stats()["misses"] == 3
+
+    message = json.dumps({"config": {"container_name": "c1"}})
+    enc = CheckKeys.encryption(message)
+    sig = CheckKeys.signature(message)
+    result = CheckKeys.get_verified_msg({
+        "message": enc,
+        "signature": sig,
+    })
+    assert result == {"config": {"container_name": "c1"}}
+
+    stats = registry.stats()
+    assert stats["misses"] == 3, "预加载后不应再次从磁盘解析密钥"
+    assert stats["hits"] >= 4
+    assert stats["reloads"] == 0
+
+
+##################################
+# mtime 变化后热重载测试
+def test_key_registry_reloads_on_mtime_change(registry, tmp_path):
+    old_key = registry.private_key()
+    private_path, _ = _write_pair(str(tmp_path))
+    st = os.stat(private_path)
+    os.utime(private_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    new_key = registry.private_key()
+    assert new_key is not old_key
+    assert registry.stats()["reloads"] == 1
+
+    # 同一 mtime 再次访问应命中缓存
+    assert registry.private_key() is new_key
+
+
+def test_key_registry_missing_file_raises(tmp_path):
+    reg = KeyRegistry(str(tmp_path / "nope.pem"), str(tmp_path / "nope.pub"), str(tmp_path / "nope.pub"))
+    with pytest.raises(OSError):
+        reg.preload()
+
+
+##################################
+# 签名套件：Ed25519 签名 + RSA 加密；未声明套件的旧报文仍按 RSA-PSS 校验
+def _write_ed25519(dir_path):
+    private_key, public_key = generate_signing_keys(CheckKeys.ED25519)
+    private_path = os.path.join(dir_path, "signing_ed25519.pem")
+    public_path = os.path.join(dir_path, "signing_ed25519.pub")
+    with open(private_path, "wb") as f:
+        f.write(private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        ))
+    with open(public_path, "wb") as f:
+        f.write(public_key.public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        ))
+    return private_path, public_path
+
+
+def test_ed25519_suite_round_trip(registry, tmp_path, monkeypatch):
+    signing_path, node_signing_path = _write_ed25519(str(tmp_path))
+    registry.configure(signing_key_path=signing_path, node_signing_key_path=node_signing_path)
+    monkeypatch.setattr(KeyConfig, "SIGNATURE_SUITE", CheckKeys.ED25519)
+
+    message = json.dumps({"config": {"container_name": "c1"}})
+    enc = CheckKeys.encryption(message)
+    sig = CheckKeys.signature(message)
+    assert len(sig) == 64
+    assert CheckKeys.get_verified_msg({"message": enc, "signature": sig, "sig_suite": "ed25519"}) == \
+        {"config": {"container_name": "c1"}}
+    # 套件与签名不符、未知套件都应校验失败
+    assert CheckKeys.get_verified_msg({"message": enc, "signature": sig}) == {}
+    assert CheckKeys.get_verified_msg({"message": enc, "signature": sig, "sig_suite": "nope"}) == {}
+
+    # 旧格式（RSA-PSS、不带 sig_suite）仍可校验
+    legacy_sig = CheckKeys.signature(message, suite=CheckKeys.RSA_PSS_SHA256)
+    assert CheckKeys.get_verified_msg({"message": enc, "signature": legacy_sig}) == {"config": {"container_name": "c1"}}
+
+
+def test_ed25519_suite_requires_signing_key(registry, monkeypatch):
+    monkeypatch.setattr(KeyConfig, "SIGNATURE_SUITE", CheckKeys.ED25519)
+    with pytest.raises(ValueError):
+        CheckKeys.signature("x")
+
+
+def test_signature_suite_is_abstract():
+    with pytest.raises(TypeError):
+        CheckKeys.SignatureSuite()
+
+    class _SignOnly(CheckKeys.SignatureSuite):
+        name = "sign-only"
+
+        def sign(self, private_key, data):
+            return b""
+
+    with pytest.raises(TypeError):
+        _SignOnly()
+
+
+def test_envelope_advertises_non_default_suite(monkeypatch):
+    assert "sig_suite" not in build_envelope(b"c", b"s")
+    monkeypatch.setattr(KeyConfig, "SIGNATURE_SUITE", CheckKeys.ED25519)
+    assert build_envelope(b"c", b"s")["sig_suite"] == "ed25519"
+
+
+def test_signature_suite_benchmark_runs():
+    results = signature_suites.run(iterations=3, payload_size=128)
+    assert {r["suite"] for r in results} == {"rsa-pss-sha256", "ed25519"}
+    assert all(r["sign_ops"] > 0 and r["verify_ops"] > 0 for r in results)
+
+
+def test_crypto_envelope_benchmark_runs():
+    report = crypto_envelope.run(iterations=3, payload_sizes=[128], threads=[1, 2], warmup=1)
+    results = report["results"]
+    assert {r["stage"] for r in results} == set(crypto_envelope.STAGES)
+    assert len(results) == len(crypto_envelope.STAGES) * 2 * 2
+    assert all(r["ops_per_sec"] > 0 and r["p99_ms"] >= r["p50_ms"] > 0 for r in results)
+    # 基准结束后恢复原来的密钥缓存
+    assert CheckKeys.key_registry is not None and "cryptography" in report["meta"]
+
+    diff = crypto_envelope.compare(report, report)
+    assert len(diff) == len(results) and all(d["ops_change"] == 0 for d in diff)
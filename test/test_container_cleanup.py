@@ -0,0 +1,192 @@
+import datetime as dt
+import threading
+import time
+import pytest
+
+from .. import create_app
+from ..extensions import db
+from ..models.machine import Machine
+from ..models.containers import Container
+from ..models.container_ssh_login import ContainerSSHLogin
+from ..constant import *
+from ..services import container_tasks
+from ..repositories import container_ssh_login_repo
+from ..schemas import container_cleanup_task as cleanup_task
+
+
+##################################
+# 单元测试创建运行环境
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    app.config.update({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _add_machine(name, ip, status=MachineStatus.ONLINE):
+    m = Machine(
+        machine_name=name,
+        machine_ip=ip,
+        machine_type=MachineTypes.CPU,
+        machine_status=status,
+        cpu_core_number=4,
+        memory_size_gb=16,
+        disk_size_gb=100,
+    )
+    db.session.add(m)
+    db.session.commit()
+    return m
+
+
+def _add_containers(machine, n):
+    cs = []
+    for i in range(n):
+        c = Container(name=f"{machine.machine_name}_c{i}", image="ubuntu:latest", machine_id=machine.id,
+                      container_status=ContainerStatus.ONLINE, port=20000 + i,
+                      memory_gb=1, swap_gb=0, gpu_number=0, cpu_number=1)
+        db.session.add(c)
+        cs.append(c)
+    db.session.commit()
+    return cs
+
+
+def _days_ago(n):
+    return (dt.datetime.utcnow() - dt.timedelta(days=n)).replace(microsecond=0).isoformat()
+
+
+##################################
+# 写入时解析 last_ssh_at，历史数据可补齐
+def test_last_ssh_at_parsed_on_write_and_backfilled(app):
+    m = _add_machine("m_parse", "10.2.0.1")
+    cs = _add_containers(m, 3)
+
+    rec = container_ssh_login_repo.upsert_last_ssh_login_time(m.id, cs[0].id, "2026-01-02T03:04:05Z")
+    assert rec.last_ssh_at == dt.datetime(2026, 1, 2, 3, 4, 5)
+    container_ssh_login_repo.bulk_upsert_last_ssh_login_time([(m.id, cs[1].id, "never logged in")])
+    db.session.expire_all()
+    assert container_ssh_login_repo.get_by_machine_container(m.id, cs[1].id).last_ssh_at is None
+
+    # 模拟新增列之前写入的记录
+    db.session.add(ContainerSSHLogin(machine_id=m.id, container_id=cs[2].id, last_ssh_login_time="2026-03-04 05:06:07"))
+    db.session.commit()
+    assert container_ssh_login_repo.backfill_last_ssh_at(batch_size=1) == 1
+    assert container_ssh_login_repo.get_by_machine_container(m.id, cs[2].id).last_ssh_at == dt.datetime(2026, 3, 4, 5, 6, 7)
+
+
+##################################
+# 到期查询走 last_ssh_at 范围 + keyset 分页，只处理到期容器
+def test_cleanup_removes_only_due_containers(app, monkeypatch):
+    m = _add_machine("m_cleanup", "10.2.0.2")
+    cs = _add_containers(m, 6)
+    container_ssh_login_repo.bulk_upsert_last_ssh_login_time([
+        (m.id, cs[0].id, _days_ago(30)),
+        (m.id, cs[1].id, _days_ago(10)),
+        (m.id, cs[2].id, _days_ago(8)),
+        (m.id, cs[3].id, _days_ago(1)),
+        (m.id, cs[4].id, None),
+        (m.id, cs[5].id, _days_ago(9)),
+    ])
+
+    removed = []
+    monkeypatch.setattr(cleanup_task, "is_machine_online_remote", lambda mid: True)
+
+    def fake_remove(container_id, check_online=True):
+        assert check_online is False
+        removed.append(container_id)
+        # 删除失败的记录仍留在表中，keyset 分页不能因此反复处理同一行
+        return container_id != cs[5].id
+
+    monkeypatch.setattr(container_tasks, "remove_container", fake_remove)
+
+    report = cleanup_task.cleanup_expired_containers_once(7, page_size=2)
+
+    assert sorted(removed) == sorted([cs[0].id, cs[1].id, cs[5].id, cs[2].id])
+    assert (report["due"], report["removed"], report["failed"]) == (4, 3, 1)
+
+
+##################################
+# 跨机器并发删除、单机并发上限、每台机器只检查一次在线状态
+def test_cleanup_concurrent_with_per_machine_cap(app, monkeypatch):
+    machines = [_add_machine(f"m_fleet{i}", f"10.2.1.{i}") for i in range(3)]
+    down = _add_machine("m_down", "10.2.1.99")
+    rows, owner = [], {}
+    for m in machines + [down]:
+        for c in _add_containers(m, 6):
+            rows.append((m.id, c.id, _days_ago(30)))
+            owner[c.id] = m.id
+    container_ssh_login_repo.bulk_upsert_last_ssh_login_time(rows)
+
+    online_checks = []
+    monkeypatch.setattr(cleanup_task, "is_machine_online_remote",
+                        lambda mid: online_checks.append(mid) or mid != down.id)
+
+    lock = threading.Lock()
+    inflight, peak_per_machine, peak_total = {}, {}, [0]
+
+    def fake_remove(container_id, check_online=True):
+        mid = owner[container_id]
+        with lock:
+            inflight[mid] = inflight.get(mid, 0) + 1
+            peak_per_machine[mid] = max(peak_per_machine.get(mid, 0), inflight[mid])
+            peak_total[0] = max(peak_total[0], sum(inflight.values()))
+        time.sleep(0.02)
+        with lock:
+            inflight[mid] -= 1
+        return True
+
+    monkeypatch.setattr(container_tasks, "remove_container", fake_remove)
+
+    report = cleanup_task.cleanup_expired_containers_once(7, page_size=10, max_workers=8, per_machine=2)
+
+    assert report["due"] == 24
+    assert report["removed"] == 18
+    assert report["skipped_machines"] == [down.id]
+    assert sorted(online_checks) == sorted(m.id for m in machines + [down])
+    assert max(peak_per_machine.values()) <= 2
+    assert peak_total[0] > 2, "不同机器之间应并发删除"
+    assert report["throughput"] > 0
+    assert report["latency"]["max"] >= report["latency"]["p50"] > 0
+
+
+##################################
+# 整轮共用一个线程池：每页只含一台机器时，后一页的机器不必等前一页删完
+def test_cleanup_pipelines_pages_across_machines(app, monkeypatch):
+    machines = [_add_machine(f"m_page{i}", f"10.2.2.{i}") for i in range(3)]
+    rows, owner = [], {}
+    for age, m in zip((50, 40, 30), machines):
+        for c in _add_containers(m, 3):
+            rows.append((m.id, c.id, _days_ago(age)))
+            owner[c.id] = m.id
+    container_ssh_login_repo.bulk_upsert_last_ssh_login_time(rows)
+    monkeypatch.setattr(cleanup_task, "is_machine_online_remote", lambda mid: True)
+    app.config["CONTAINER_CLEANUP_PER_MACHINE"] = 1
+
+    lock = threading.Lock()
+    inflight, peak_per_machine, peak_total = {}, {}, [0]
+
+    def fake_remove(container_id, check_online=True):
+        mid = owner[container_id]
+        with lock:
+            inflight[mid] = inflight.get(mid, 0) + 1
+            peak_per_machine[mid] = max(peak_per_machine.get(mid, 0), inflight[mid])
+            peak_total[0] = max(peak_total[0], sum(inflight.values()))
+        time.sleep(0.05)
+        with lock:
+            inflight[mid] -= 1
+        return True
+
+    monkeypatch.setattr(container_tasks, "remove_container", fake_remove)
+
+    # per_machine 未传入时使用 app.config 中的 CONTAINER_CLEANUP_PER_MACHINE
+    report = cleanup_task.cleanup_expired_containers_once(7, page_size=3)
+
+    assert (report["due"], report["removed"]) == (9, 9)
+    assert max(peak_per_machine.values()) == 1
+    assert peak_total[0] == 3, "各页的机器应同时删除，而不是逐页等待"
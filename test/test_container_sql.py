@@ -1,3 +1,4 @@
+import threading
 import pytest
 from ..services.container_tasks import (
     Create_container, remove_container, add_collaborator, 
@@ -18,7 +19,7 @@ from ..constant import *
 @pytest.fixture(scope="function")
 def app():
     """为每个测试创建独立的应用上下文"""
-    app = create_app()
+    app = create_app("testing")
     app.config.update({
         'TESTING': True,
         'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
@@ -421,8 +422,13 @@ def test_list_all_container_bref_information_filters_by_machine_permission(monke
     c1 = MockContainer(1, "c1", 10, 8001, "online")
     c2 = MockContainer(2, "c2", 20, 8002, "online")
     
-    def mock_list_containers(limit=None, offset=None, machine_id=None, user_id=None):
-        return [c1, c2]
+    # 权限过滤由 list_containers 通过 machine_permissions 联表完成，这里按授权机器模拟该联表
+    def mock_list_containers(limit=None, offset=None, machine_id=None, user_id=None, after_id=None, permitted_user_id=None):
+        rows = [c1, c2]
+        if permitted_user_id is not None:
+            allowed = set(mock_list_machine_ids_by_user(permitted_user_id))
+            rows = [c for c in rows if c.machine_id in allowed]
+        return rows
     
     def mock_list_machine_ids_by_user(user_id):
         return [10]
@@ -439,7 +445,7 @@ def test_list_all_container_bref_information_filters_by_machine_permission(monke
     def mock_get_machine_ip_by_id(machine_id):
         return f"10.0.0.{machine_id}"
     
-    def mock_count_containers(machine_id=None):
+    def mock_count_containers(machine_id=None, permitted_user_id=None):
         return 1
     
     monkeypatch.setattr(ct, "list_containers", mock_list_containers)
@@ -891,4 +897,362 @@ def test_list_all_container_bref_information():
             db.session.delete(container)
         User.query.filter_by(id=user.id).delete(synchronize_session=False)
         Machine.query.filter_by(id=machine.id).delete(synchronize_session=False)
-        db.session.commit()
\ No newline at end of file
+        db.session.commit()
+##################################
+# 批量容器状态查询测试
+def test_get_containers_status_batch_and_fallback(monkeypatch):
+    from ..services import container_tasks as ct
+    from ..utils import node_transport
+
+    sent = []
+
+    def mock_send_to_node(machine_ip, endpoint, payload, timeout=5.0, attempts=1):
+        sent.append((machine_ip, endpoint))
+        if machine_ip == "10.0.0.1":
+            return {"success": 1, "status_code": 200, "containers": [
+                {"container_name": "a", "container_status": "online"},
+                {"container_name": "b", "success": 0, "error_reason": "not_found"},
+            ]}
+        # 旧版 Node：批量接口不存在
+        return {"status_code": 404, "text": "<!doctype html>Not Found"}
+
+    def mock_get_container_status(machine_ip, name, timeout=5.0):
+        return {"container_status": "offline"}
+
+    monkeypatch.setattr(ct, "send_to_node", mock_send_to_node)
+    monkeypatch.setattr(ct, "get_container_status", mock_get_container_status)
+    node_transport.clear_batch_unsupported()
+
+    res = ct.get_containers_status("10.0.0.1", ["a", "b", "c"])
+    assert res["a"]["container_status"] == "online"
+    assert res["b"]["status_code"] == 404
+    assert "error" in res["c"], "批量结果中缺失的容器应视为错误而不是 404"
+    assert sent == [("10.0.0.1", "/containers_status")], "一台机器只应发送一次批量请求"
+
+    res = ct.get_containers_status("10.0.0.2", ["x", "y"])
+    assert res == {"x": {"container_status": "offline"}, "y": {"container_status": "offline"}}
+    # 已确认不支持批量接口的机器不再尝试批量请求
+    ct.get_containers_status("10.0.0.2", ["x"])
+    assert sent.count(("10.0.0.2", "/containers_status")) == 1
+##################################
+# 批量容器状态迁移测试
+def test_transition_machine_containers_single_statement():
+    from sqlalchemy import event
+    from ..repositories import containers_repo
+
+    machine = Machine.query.filter_by(machine_name="test_machine_1").first()
+    other = Machine(machine_name="test_machine_2", machine_ip="127.0.0.2", machine_type=MachineTypes.CPU,
+                    machine_status=MachineStatus.ONLINE, cpu_core_number=4, memory_size_gb=16, disk_size_gb=100)
+    db.session.add(other)
+    db.session.commit()
+    statuses = [ContainerStatus.ONLINE, ContainerStatus.STARTING, ContainerStatus.OFFLINE, ContainerStatus.FAILED]
+    cs = []
+    for i, st in enumerate(statuses):
+        c = Container(name=f"bulk_{i}", image="ubuntu:latest", machine_id=machine.id, container_status=st,
+                      port=21000 + i, memory_gb=1, swap_gb=0, gpu_number=0, cpu_number=1)
+        db.session.add(c)
+        cs.append(c)
+    bystander = Container(name="bulk_other", image="ubuntu:latest", machine_id=other.id,
+                          container_status=ContainerStatus.ONLINE, port=21000,
+                          memory_gb=1, swap_gb=0, gpu_number=0, cpu_number=1)
+    db.session.add(bystander)
+    db.session.commit()
+    ids = [c.id for c in cs]
+
+    statements = []
+    tid = threading.get_ident()
+    # 只统计当前线程的语句，create_app 启动的后台调度线程共用同一个 engine
+    listener = lambda conn, cursor, statement, *a: threading.get_ident() == tid and statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        changed = containers_repo.transition_machine_containers(
+            machine.id, ContainerStatus.OFFLINE,
+            from_statuses=[ContainerStatus.ONLINE, ContainerStatus.STARTING],
+        )
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+
+    assert sorted(changed) == ids[:2]
+    assert len([s for s in statements if s.lstrip().upper().startswith("UPDATE")]) == 1
+    got = {c.id: c.container_status for c in Container.query.all()}
+    assert got[ids[0]] == got[ids[1]] == ContainerStatus.OFFLINE
+    assert got[ids[3]] == ContainerStatus.FAILED
+    assert got[bystander.id] == ContainerStatus.ONLINE, "其它机器上的容器不应受影响"
+
+    # from_statuses 缺省时迁移除目标状态外的全部容器；按 id 批量设置时跳过已是目标状态的行
+    assert containers_repo.transition_machine_containers(machine.id, ContainerStatus.OFFLINE) == [ids[3]]
+    assert containers_repo.set_containers_status(ids + [bystander.id], ContainerStatus.STOPPING) == sorted(ids + [bystander.id])
+    assert containers_repo.set_containers_status(ids, ContainerStatus.STOPPING) == []
+##################################
+# 用户容器统计：整页用户固定两条查询
+def test_compute_users_container_counts_grouped():
+    from sqlalchemy import event
+    from ..repositories import usercontainer_repo
+
+    machine = Machine.query.filter_by(machine_name="test_machine_1").first()
+    users = []
+    for i in range(3):
+        u = User(username=f"cnt_u{i}", email=f"cnt_u{i}@example.com", password_hash="x", graduation_year="2024")
+        db.session.add(u)
+        users.append(u)
+    cs = []
+    for i, st in enumerate([ContainerStatus.ONLINE, ContainerStatus.OFFLINE, ContainerStatus.ONLINE]):
+        c = Container(name=f"cnt_c{i}", image="ubuntu:latest", machine_id=machine.id, container_status=st,
+                      port=23000 + i, memory_gb=1, swap_gb=0, gpu_number=0, cpu_number=1)
+        db.session.add(c)
+        cs.append(c)
+    db.session.commit()
+    for c, role in zip(cs, [ROLE.ROOT, ROLE.ADMIN, ROLE.COLLABORATOR]):
+        usercontainer_repo.add_binding(user_id=users[0].id, container_id=c.id, public_key=None, username="u0", role=role)
+    usercontainer_repo.add_binding(user_id=users[1].id, container_id=cs[2].id, public_key=None, username="u1", role=ROLE.COLLABORATOR)
+
+    user_ids = [u.id for u in users]
+    statements = []
+    tid = threading.get_ident()
+    # 只统计当前线程的语句，create_app 启动的后台调度线程共用同一个 engine
+    listener = lambda conn, cursor, statement, *a: threading.get_ident() == tid and statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        res = usercontainer_repo.compute_users_container_counts(user_ids)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 2
+    assert res[users[0].id] == {'container_ids': sorted(c.id for c in cs), 'total': 3, 'functional': 2, 'managed': 2}
+    assert res[users[1].id] == {'container_ids': [cs[2].id], 'total': 1, 'functional': 1, 'managed': 0}
+    assert res[users[2].id] == {'container_ids': [], 'total': 0, 'functional': 0, 'managed': 0}
+    assert usercontainer_repo.compute_user_container_counts(users[1].id) == res[users[1].id]
+##################################
+# 容器详情：一次联表查询取齐；Node 状态只读缓存，缺失时后台刷新
+def test_get_container_detail_single_query_and_status_cache(monkeypatch):
+    from sqlalchemy import event
+    from ..services import container_tasks
+    from ..utils.status_cache import ContainerStatusCache
+
+    machine = Machine.query.filter_by(machine_name="test_machine_1").first()
+    users = []
+    for i in range(2):
+        u = User(username=f"dt_u{i}", email=f"dt_u{i}@example.com", password_hash="x", graduation_year="2024")
+        db.session.add(u)
+        users.append(u)
+    c = Container(name="dt_c0", image="ubuntu:latest", machine_id=machine.id, container_status=ContainerStatus.ONLINE,
+                  port=24000, memory_gb=1, swap_gb=0, gpu_number=0, cpu_number=1)
+    db.session.add(c)
+    db.session.commit()
+    for u, role in zip(users, [ROLE.ROOT, ROLE.COLLABORATOR]):
+        db.session.add(UserContainer(user_id=u.id, container_id=c.id, username=f"acc_{u.username}", public_key=None, role=role))
+    db.session.commit()
+    cid, cname, uids = c.id, c.name, [u.id for u in users]
+
+    cache = ContainerStatusCache(ttl=60)
+    monkeypatch.setattr(container_tasks, "container_status_cache", cache)
+    probes = []
+    monkeypatch.setattr(container_tasks, "get_container_status",
+                        lambda ip, name: probes.append(name) or {"container_status": ContainerStatus.OFFLINE.value})
+
+    statements = []
+    tid = threading.get_ident()
+    # 只统计当前线程的语句，create_app 启动的后台调度线程共用同一个 engine
+    listener = lambda conn, cursor, statement, *a: threading.get_ident() == tid and statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        res = get_container_detail_information(cid)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 1
+    assert res["machine_ip"] == machine.machine_ip
+    assert res["container_status"] == ContainerStatus.ONLINE.value, "缓存缺失时直接返回数据库内容"
+    assert res["owners"] == ["dt_u0", "dt_u1"]
+    assert [a["user_id"] for a in res["accounts"]] == uids
+    assert res["accounts"][1] == {"user_id": uids[1], "username": "acc_dt_u1", "role": ROLE.COLLABORATOR.value}
+
+    # 后台刷新完成后，下一次读取使用缓存状态并写回数据库
+    cache.drain()
+    assert probes == [cname]
+    res = get_container_detail_information(cid)
+    assert res["container_status"] == ContainerStatus.OFFLINE.value
+    assert probes == [cname], "缓存命中时不应再探测 Node"
+    assert cache.stats()["hits"] == 1
+
+    # 缓存中的 404 会删除本地记录
+    cache.put(machine.id, cname, {"status_code": 404, "error": "not found"})
+    with pytest.raises(ValueError):
+        get_container_detail_information(cid)
+    assert db.session.get(Container, cid) is None
+##################################
+# keyset 分页：游标逐页遍历，非管理员的机器权限在 SQL 中过滤
+def test_list_containers_keyset_cursor_with_permission_join(monkeypatch):
+    from sqlalchemy import event
+    from ..services import container_tasks as ct
+    from ..services import machine_tasks
+    from ..models.machine_permission import MachinePermission
+
+    monkeypatch.setattr(ct, "get_containers_status", lambda ip, names, timeout=5.0: {})
+    allowed_m = Machine.query.filter_by(machine_name="test_machine_1").first()
+    hidden_m = Machine(machine_name="ks_hidden", machine_ip="10.9.0.2", machine_type=MachineTypes.CPU,
+                       machine_status=MachineStatus.OFFLINE, cpu_core_number=4, memory_size_gb=16, disk_size_gb=100)
+    viewer = User(username="ks_viewer", email="ks_viewer@example.com", password_hash="x", graduation_year="2024")
+    db.session.add_all([hidden_m, viewer])
+    db.session.commit()
+    db.session.add(MachinePermission(machine_id=allowed_m.id, user_id=viewer.id))
+    for i in range(7):
+        m = allowed_m if i % 2 == 0 else hidden_m
+        db.session.add(Container(name=f"ks_c{i}", image="ubuntu:latest", machine_id=m.id,
+                                 container_status=ContainerStatus.OFFLINE, port=25000 + i,
+                                 memory_gb=1, swap_gb=0, gpu_number=0, cpu_number=1))
+    db.session.commit()
+    allowed_m.machine_status = MachineStatus.OFFLINE
+    db.session.commit()
+    expected = [c.id for c in Container.query.filter_by(machine_id=allowed_m.id).order_by(Container.id)]
+    viewer_id = viewer.id
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        tid = threading.get_ident()
+        statements = []
+        listener = lambda conn, cur, statement, *a: threading.get_ident() == tid and statements.append(statement)
+        event.listen(db.engine, "before_cursor_execute", listener)
+        try:
+            result = ct.list_all_container_bref_information(machine_id=None, user_id=viewer_id, page_number=0,
+                                                            page_size=2, cursor=cursor)
+        finally:
+            event.remove(db.engine, "before_cursor_execute", listener)
+        pages += 1
+        seen.extend(c.container_id for c in result["containers"])
+        listing = [s for s in statements if "FROM containers" in s and "machine_permissions" in s]
+        # 首页沿用 offset 并给出总页数；带游标的页只做 keyset 查询
+        assert listing and all("containers.id >" in s for s in listing) == (cursor is not None)
+        assert (result["total_page"] is None) == (cursor is not None)
+        cursor = result["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == expected
+    assert pages == 2
+
+    with pytest.raises(ValueError):
+        ct.list_all_container_bref_information(machine_id=None, user_id=viewer_id, page_number=0, page_size=2,
+                                               cursor="not-a-cursor")
+
+    # 机器列表同样只返回授权机器，并通过游标翻页
+    res, next_cursor = machine_tasks.List_machine_bref_information_by_cursor(page_size=1, user_id=viewer_id)
+    assert [m.id for m in res] == [allowed_m.id] and next_cursor is None
+##################################
+# 批量生命周期操作：Node 请求一次性并发发出，单个失败不影响其它容器
+def test_run_container_actions_fans_out_once(monkeypatch):
+    from ..services import container_tasks as ct
+
+    machine = Machine.query.filter_by(machine_name="test_machine_1").first()
+    cs = []
+    for i in range(3):
+        c = Container(name=f"ra_c{i}", image="ubuntu:latest", machine_id=machine.id,
+                      container_status=ContainerStatus.OFFLINE, port=26000 + i,
+                      memory_gb=1, swap_gb=0, gpu_number=0, cpu_number=1)
+        db.session.add(c)
+        cs.append(c)
+    db.session.commit()
+    ids = [c.id for c in cs]
+
+    batches, heartbeats = [], []
+    monkeypatch.setattr(ct, "_ensure_machine_online_for_operation", lambda mid, op='': None)
+    monkeypatch.setattr(ct, "_CONTAINER_ACTIONS", {
+        **ct._CONTAINER_ACTIONS,
+        "start": ("/start_container", lambda ip, name, **kw: heartbeats.append(kw["container_id"])),
+    })
+
+    def fake_run_node_requests(reqs, max_in_flight=None):
+        batches.append([(r.machine_ip, r.endpoint, r.payload["config"]["container_name"]) for r in reqs])
+        return [{"success": 1}, {"success": 0, "error_reason": "docker_check_failed"}, {"success": 1}]
+
+    monkeypatch.setattr(ct, "run_node_requests", fake_run_node_requests)
+    res = ct.run_container_actions(ids + [999999], "start")
+
+    assert batches == [[(machine.machine_ip, "/start_container", f"ra_c{i}") for i in range(3)]]
+    assert res[ids[0]] is True and res[ids[2]] is True
+    assert isinstance(res[ids[1]], ct.NodeServiceError) and res[ids[1]].reason == "docker_check_failed"
+    assert isinstance(res[999999], ValueError)
+    assert heartbeats == [ids[0], ids[2]]
+    with pytest.raises(ValueError):
+        ct.run_container_actions(ids, "explode")
+##################################
+# 批量接口：每台机器只做一次权限/在线检查，返回 job_id 并可轮询收敛进度
+def test_bulk_container_action_groups_by_machine_and_tracks_progress(monkeypatch):
+    from ..services import container_tasks as ct
+    from ..models.machine_permission import MachinePermission
+
+    m1 = Machine.query.filter_by(machine_name="test_machine_1").first()
+    m2 = Machine(machine_name="bulk_m2", machine_ip="10.8.0.2", machine_type=MachineTypes.CPU,
+                 machine_status=MachineStatus.ONLINE, cpu_core_number=4, memory_size_gb=16, disk_size_gb=100)
+    viewer = User(username="bulk_viewer", email="bulk_viewer@example.com", password_hash="x", graduation_year="2024")
+    db.session.add_all([m2, viewer])
+    db.session.commit()
+    db.session.add(MachinePermission(machine_id=m1.id, user_id=viewer.id))
+    cs = []
+    for i, m in enumerate([m1, m1, m1, m2]):
+        c = Container(name=f"bulk_c{i}", image="ubuntu:latest", machine_id=m.id,
+                      container_status=ContainerStatus.ONLINE, port=27000 + i,
+                      memory_gb=1, swap_gb=0, gpu_number=0, cpu_number=1)
+        db.session.add(c)
+        cs.append(c)
+    db.session.commit()
+    ids, viewer_id = [c.id for c in cs], viewer.id
+
+    online_checks = []
+    monkeypatch.setattr(ct, "_ensure_machine_online_for_operation", lambda mid, op='': online_checks.append(mid))
+    monkeypatch.setattr(ct, "_CONTAINER_ACTIONS", {**ct._CONTAINER_ACTIONS, "stop": ("/stop_container", lambda *a, **kw: None)})
+    monkeypatch.setattr(ct, "run_node_requests", lambda reqs, max_in_flight=None: [{"success": 1} for _ in reqs])
+
+    report = ct.bulk_container_action(ids, "stop", operator_user_id=viewer_id)
+    assert online_checks == [m1.id], "每台机器只检查一次；无权限的机器不做在线检查"
+    assert (report["total"], report["dispatched"], report["failed"]) == (4, 3, 1)
+    denied = [r for r in report["results"] if not r["success"]]
+    assert denied == [{"container_id": ids[3], "success": 0, "error_reason": "machine_permission_denied",
+                       "message": denied[0]["message"]}]
+
+    # 派发结果记录在 jobs 表中，任意 worker 都能通过任务状态查询进度
+    from ..services import job_tasks
+    status = job_tasks.Get_job_status(report["job_id"], operator_user_id=viewer_id)
+    assert status["kind"] == "bulk_container_action" and status["status"] == "succeeded"
+    progress = status["progress"]
+    assert (progress["pending"], progress["done"], progress["rejected"], progress["finished"]) == (3, 0, 1, False)
+
+    # 心跳把状态写回数据库后，进度随之收敛
+    Container.query.filter(Container.id.in_(ids[:2])).update({"container_status": ContainerStatus.OFFLINE})
+    Container.query.filter_by(id=ids[2]).update({"container_status": ContainerStatus.FAILED})
+    db.session.commit()
+    progress = job_tasks.Get_job_status(report["job_id"], operator_user_id=viewer_id)["progress"]
+    assert (progress["done"], progress["failed"], progress["pending"], progress["finished"]) == (2, 1, 0, True)
+    assert job_tasks.Get_job_status("missing") is None
+
+
+##################################
+# 端口唯一约束：另一个 worker 抢先落库同一端口时，删除 Node 上的容器并换端口重试
+def test_Create_container_retries_on_port_conflict(monkeypatch):
+    from ..services import container_tasks as ct
+    from ..repositories.containers_repo import create_container
+
+    machine = Machine.query.filter_by(machine_name="test_machine_1").first()
+    machine_id = machine.id
+    create_container(name="other_worker", image="ubuntu:latest", machine_id=machine_id,
+                     memory_gb=1, swap_gb=0, gpu_number=0, cpu_number=1, port=30000)
+
+    ports = iter([30000, 30001])
+    abandoned, node_calls, attempts = [], [], []
+    monkeypatch.setattr(ct, "get_the_first_free_port", lambda machine_id: next(ports))
+    monkeypatch.setattr(ct, "abandon_port", lambda mid, port: abandoned.append(port))
+    monkeypatch.setattr(ct, "send_to_node", lambda ip, path, payload, **kw: node_calls.append((path, payload)) or {"success": 1})
+
+    def fake_create(owner_name, mid, container, free_port, **kwargs):
+        attempts.append(free_port)
+        create_container(name=container.NAME, image=container.image, machine_id=mid,
+                         memory_gb=1, swap_gb=0, gpu_number=0, cpu_number=1, port=free_port)
+        return True
+
+    monkeypatch.setattr(ct, "_create_container_on_port", fake_create)
+    info = Container_info(name="racer", image="ubuntu:latest", gpu_list=[], cpu_number=1, memory=1)
+    assert ct.Create_container("test_operator", machine_id, info) is True
+    assert attempts == [30000, 30001]
+    assert abandoned == [30000]
+    assert node_calls == [("/remove_container", {"config": {"container_name": "racer"}})]
+    assert Container.query.filter_by(name="racer").one().port == 30001
@@ -0,0 +1,212 @@
+import threading
+from collections import defaultdict
+import pytest
+
+from .. import create_app
+from ..extensions import db
+from ..models.machine import Machine
+from ..models.containers import Container
+from ..services import container_tasks
+from ..utils import heartbeat
+from ..utils.heartbeat import HeartbeatEngine, ContainerWatch
+from ..constant import ContainerStatus, MachineStatus, MachineTypes
+
+
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    app.config.update({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+##################################
+# 心跳调度器：大量观察项只占用固定数量的线程
+def test_heartbeat_engine_converges_with_bounded_threads(monkeypatch):
+    calls = defaultdict(int)
+    lock = threading.Lock()
+
+    def fake_send(machine_ip, endpoint, payload, timeout=5.0):
+        name = payload["config"]["container_name"]
+        with lock:
+            calls[name] += 1
+            n = calls[name]
+        # 第二次查询时才到达目标状态
+        return {"container_status": "online" if n >= 2 else "starting"}
+
+    batches = []
+
+    def fake_send_batch(machine_ip, commands, timeout=5.0):
+        with lock:
+            batches.append(len(commands))
+        return [fake_send(machine_ip, endpoint, payload, timeout) for endpoint, payload in commands]
+
+    monkeypatch.setattr(heartbeat, "send", fake_send)
+    monkeypatch.setattr(heartbeat, "send_batch", fake_send_batch)
+
+    engine = HeartbeatEngine(max_workers=2)
+    threads_before = threading.active_count()
+    watches = [
+        engine.submit(ContainerWatch(f"10.0.0.{i % 3}", f"c{i}", None, ContainerStatus.ONLINE,
+                                     timeout=10, interval=0.01, label="start"))
+        for i in range(60)
+    ]
+    for w in watches:
+        assert w.done.wait(5), f"{w.container_name} 未在超时前收敛"
+        assert w.result == ContainerStatus.ONLINE
+
+    # 1 个调度线程 + 最多 2 个工作线程
+    assert threading.active_count() - threads_before <= 3
+    assert engine.stats()["active_watches"] == 0
+    assert all(n == 2 for n in calls.values())
+    # 同一台机器同时到期的观察项合并为一次批量查询
+    assert len(batches) < 120 and max(batches) > 1
+
+
+def test_heartbeat_engine_marks_failed_and_times_out(monkeypatch):
+    def fake_send(machine_ip, endpoint, payload, timeout=5.0):
+        if payload["config"]["container_name"] == "bad":
+            return {"container_status": "failed"}
+        return {"error": "connection refused"}
+
+    monkeypatch.setattr(heartbeat, "send", fake_send)
+    monkeypatch.setattr(heartbeat, "send_batch", lambda ip, cmds, timeout=5.0: [fake_send(ip, e, p, timeout) for e, p in cmds])
+
+    engine = HeartbeatEngine(max_workers=1)
+    bad = engine.submit(ContainerWatch("10.0.0.1", "bad", None, ContainerStatus.OFFLINE,
+                                       timeout=10, interval=0.01, label="stop"))
+    slow = engine.submit(ContainerWatch("10.0.0.2", "slow", None, ContainerStatus.OFFLINE,
+                                        timeout=0.1, interval=0.01, label="stop"))
+    assert bad.done.wait(5)
+    assert bad.result == ContainerStatus.FAILED
+    assert slow.done.wait(5)
+    assert slow.result is None
+
+
+##################################
+# ONLINE -> MAINTENANCE：并发下发 stop，批量轮询且只轮询未收敛的容器，进度可查询
+def test_maintenance_transition_parallel_stop_and_incremental_poll(app, monkeypatch):
+    m = Machine(machine_name="mt", machine_ip="10.4.0.1", machine_type=MachineTypes.GPU,
+                machine_status=MachineStatus.ONLINE, cpu_core_number=4, memory_size_gb=16, disk_size_gb=100)
+    db.session.add(m)
+    db.session.commit()
+    statuses = [ContainerStatus.ONLINE] * 7 + [ContainerStatus.OFFLINE]
+    for i, st in enumerate(statuses):
+        db.session.add(Container(name=f"mt_c{i}", image="ubuntu:latest", machine_id=m.id, container_status=st,
+                                 port=22000 + i, memory_gb=1, swap_gb=0, gpu_number=0, cpu_number=1))
+    db.session.commit()
+
+    stops, polls, stop_batches = [], [], []
+    lock = threading.Lock()
+
+    def fake_send_batch(machine_ip, commands, timeout=5.0):
+        with lock:
+            stop_batches.append(machine_ip)
+            stops.extend(payload["config"]["container_name"] for endpoint, payload in commands)
+        return [{"success": 1} for _ in commands]
+
+    def fake_batch(machine_ip, names, timeout=5.0):
+        polls.append(sorted(names))
+        out = {}
+        for n in names:
+            i = int(n.rsplit("c", 1)[1])
+            if i == 6:
+                out[n] = {"container_status": "failed"}
+            elif i == 5:
+                out[n] = {"status_code": 404, "error": "not found"}
+            # 前一半在第一轮收敛，其余在第二轮
+            elif i < 3 or len(polls) > 1:
+                out[n] = {"container_status": "offline"}
+            else:
+                out[n] = {"container_status": "stopping"}
+        return out
+
+    monkeypatch.setattr(heartbeat, "send_batch", fake_send_batch)
+    monkeypatch.setattr(container_tasks, "get_containers_status", fake_batch)
+
+    t = heartbeat.start_machine_maintenance_transition_heartbeat(m.id, timeout=10, interval=0.01)
+    t.join(5)
+    assert not t.is_alive()
+
+    assert sorted(stops) == [f"mt_c{i}" for i in range(7)], "已离线的容器不应再下发 stop"
+    assert stop_batches == ["10.4.0.1"], "stop 应当合并为一次批量请求"
+    assert len(polls) == 2
+    assert polls[1] == ["mt_c3", "mt_c4"], "第二轮只应轮询未收敛的容器"
+
+    progress = heartbeat.get_maintenance_progress(m.id)
+    assert progress["phase"] == "done" and progress["result"] == MachineStatus.MAINTENANCE.value
+    assert (progress["total"], progress["stopped"], progress["failed"], progress["remaining"]) == (8, 7, 1, 0)
+
+    db.session.expire_all()
+    assert db.session.get(Machine, m.id).machine_status == MachineStatus.MAINTENANCE
+    got = {c.name: c.container_status for c in Container.query.all()}
+    assert got["mt_c6"] == ContainerStatus.FAILED
+    assert all(st == ContainerStatus.OFFLINE for n, st in got.items() if n != "mt_c6")
+
+
+def test_maintenance_transition_stop_timeout_scaled_once_per_chunk(app, monkeypatch):
+    from ..config import CommsConfig
+    from ..utils import node_transport
+
+    m = Machine(machine_name="mt_big", machine_ip="10.4.0.2", machine_type=MachineTypes.GPU,
+                machine_status=MachineStatus.ONLINE, cpu_core_number=4, memory_size_gb=16, disk_size_gb=100)
+    db.session.add(m)
+    db.session.commit()
+    for i in range(30):
+        db.session.add(Container(name=f"mtb_c{i}", image="ubuntu:latest", machine_id=m.id,
+                                 container_status=ContainerStatus.ONLINE, port=23000 + i,
+                                 memory_gb=1, swap_gb=0, gpu_number=0, cpu_number=1))
+    db.session.commit()
+
+    monkeypatch.setattr(CommsConfig, "NODE_BATCH_ENABLED", True)
+    monkeypatch.setattr(CommsConfig, "NODE_BATCH_MAX_COMMANDS", 100)
+    monkeypatch.setattr(CommsConfig, "NODE_BATCH_MAX_MUTATING_COMMANDS", 20)
+    monkeypatch.setattr(CommsConfig, "NODE_BATCH_TIMEOUT_PER_COMMAND", 0.5)
+    node_transport.clear_batch_unsupported()
+    sent = []
+
+    def fake_send_to_node(machine_ip, endpoint, payload, timeout=5.0, attempts=1):
+        commands = payload["config"]["commands"]
+        sent.append((endpoint, len(commands), timeout))
+        return {"success": 1, "results": [{"success": 1} for _ in commands]}
+
+    monkeypatch.setattr(node_transport, "send_to_node", fake_send_to_node)
+    monkeypatch.setattr(container_tasks, "get_containers_status",
+                        lambda machine_ip, names, timeout=5.0: {n: {"container_status": "offline"} for n in names})
+
+    t = heartbeat.start_machine_maintenance_transition_heartbeat(m.id, timeout=10, interval=0.01)
+    t.join(5)
+    assert not t.is_alive()
+    # 每块的超时 = max(单条 3s, 0.5s × 块大小)，不会被再放大一次
+    assert sent == [("/batch", 20, 10.0), ("/batch", 10, 5.0)]
+    assert heartbeat.get_maintenance_progress(m.id)["result"] == MachineStatus.MAINTENANCE.value
+
+
+##################################
+# 心跳的 send 保持 raise_for_status 语义：Node 4xx/5xx 视为错误，不会被当成状态结果
+def test_heartbeat_send_maps_http_errors(monkeypatch):
+    responses = {
+        "/container_status": {"success": 0, "error_reason": "docker_error", "status_code": 500},
+        "/machine_status": {"status_code": 502, "text": "<html>Bad Gateway</html>"},
+        "/ok": {"success": 1, "container_status": "online", "status_code": 200},
+    }
+    monkeypatch.setattr(heartbeat, "send_to_node", lambda ip, endpoint, payload, timeout=5.0: dict(responses[endpoint]))
+    monkeypatch.setattr(heartbeat, "send_batch_to_node",
+                        lambda ip, cmds, timeout=5.0: [dict(responses[e]) for e, _ in cmds])
+
+    res = heartbeat.send("10.0.0.1", "/container_status", {})
+    assert "error" in res and res["status_code"] == 500 and res["error_reason"] == "docker_error"
+    assert "error" in heartbeat.send("10.0.0.1", "/machine_status", {})
+    assert heartbeat.send("10.0.0.1", "/ok", {})["container_status"] == "online"
+
+    batch = heartbeat.send_batch("10.0.0.1", [("/container_status", {}), ("/ok", {})])
+    assert "error" in batch[0] and batch[1]["container_status"] == "online"
+    # 500 不会让观察项误判为终态，继续轮询
+    watch = ContainerWatch("10.0.0.1", "c", None, ContainerStatus.ONLINE, 10, 1, "start")
+    assert watch.handle(batch[0]) is False
@@ -0,0 +1,275 @@
+import datetime as dt
+import threading
+import time
+import pytest
+
+from .. import create_app
+from ..config import JobConfig
+from ..constant import ContainerStatus, JobStatus
+from ..extensions import db
+from ..models.job import Job
+from ..repositories import job_repo
+from ..schemas.job_worker import start_job_workers, stop_job_workers
+from ..services import job_tasks
+
+
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    app.config.update({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        stop_job_workers(app)
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture()
+def file_app(tmp_path, monkeypatch):
+    """
+    多个执行线程并发访问数据库时使用文件数据库：内存数据库在所有线程间共享同一个 sqlite 连接，
+    并发事务会互相干扰（cannot start a transaction within a transaction）。
+    """
+    from ..config import TestingConfig
+    monkeypatch.setattr(TestingConfig, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'jobs.db'}")
+    app = create_app("testing")
+    with app.app_context():
+        db.create_all()
+        yield app
+        stop_job_workers(app)
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture()
+def echo_handler(monkeypatch):
+    calls = []
+
+    def _echo(payload, job):
+        calls.append((job.job_id, job.attempts))
+        if payload.get("fail"):
+            raise job_tasks.JobQueueError("boom", reason="echo_failed")
+        return {"echo": payload.get("value")}
+
+    monkeypatch.setitem(job_tasks._JOB_HANDLERS, "echo", _echo)
+    return calls
+
+
+##################################
+# 入队 -> 领取 -> 执行，状态持久化在 jobs 表中
+def test_enqueue_claim_and_run(app, echo_handler):
+    job = job_tasks.enqueue_job("echo", {"value": 7}, operator_user_id=3)
+    assert job.status == JobStatus.QUEUED and len(job.job_id) == 32
+
+    claimed = job_repo.claim_next("w1", lease_seconds=30)
+    assert claimed.id == job.id
+    assert claimed.status == JobStatus.RUNNING and claimed.attempts == 1 and claimed.worker == "w1"
+    # 同一任务不会被第二个执行者领取
+    assert job_repo.claim_next("w2", lease_seconds=30) is None
+
+    assert job_tasks.run_job(claimed) == JobStatus.SUCCEEDED
+    status = job_tasks.Get_job_status(job.job_id, operator_user_id=3)
+    assert status["status"] == "succeeded"
+    assert status["result"] == {"echo": 7}
+    assert status["eta_seconds"] == 0
+    # 其他非 operator 用户看不到该任务
+    assert job_tasks.Get_job_status(job.job_id, operator_user_id=4) is None
+
+
+def test_failed_job_records_reason(app, echo_handler):
+    job = job_tasks.enqueue_job("echo", {"fail": True})
+    assert job_tasks.run_job(job_repo.claim_next("w1", 30)) == JobStatus.FAILED
+    status = job_tasks.Get_job_status(job.job_id)
+    assert status["status"] == "failed" and status["error_reason"] == "echo_failed"
+
+
+def test_enqueue_rejects_unknown_kind_and_full_queue(app, echo_handler, monkeypatch):
+    with pytest.raises(job_tasks.JobQueueError) as ei:
+        job_tasks.enqueue_job("no_such_kind", {})
+    assert ei.value.reason == "invalid_payload"
+
+    monkeypatch.setattr(JobConfig, "JOB_QUEUE_MAX", 2)
+    job_tasks.enqueue_job("echo", {})
+    job_tasks.enqueue_job("echo", {})
+    with pytest.raises(job_tasks.JobQueueError) as ei:
+        job_tasks.enqueue_job("echo", {})
+    assert ei.value.reason == "queue_full"
+    assert job_repo.count_active() == 2
+
+
+##################################
+# 租约过期（执行进程已退出）的任务重新入队，重试次数用完后标记失败
+def test_expired_lease_is_requeued_then_failed(app, echo_handler, monkeypatch):
+    monkeypatch.setattr(JobConfig, "JOB_MAX_ATTEMPTS", 2)
+    job = job_tasks.enqueue_job("echo", {"value": 1})
+
+    assert job_repo.claim_next("dead-worker", lease_seconds=-1).id == job.id
+    assert job_repo.recover_expired_leases() == (1, 0)
+    db.session.expire_all()
+    assert db.session.get(Job, job.id).status == JobStatus.QUEUED
+
+    resumed = job_repo.claim_next("dead-worker", lease_seconds=-1)
+    assert resumed.attempts == 2
+    assert job_repo.recover_expired_leases() == (0, 1)
+    db.session.expire_all()
+    failed = db.session.get(Job, job.id)
+    assert failed.status == JobStatus.FAILED and failed.error_reason == "lease_expired"
+
+
+def test_renewed_lease_is_not_requeued(app, echo_handler):
+    job = job_tasks.enqueue_job("echo", {})
+    job_repo.claim_next("w1", lease_seconds=-1)
+    assert job_repo.renew_leases([job.id], 30) == 1
+    assert job_repo.recover_expired_leases() == (0, 0)
+
+
+##################################
+# ETA：排队位置 × 同类任务平均耗时 / 执行线程数
+def test_eta_uses_recent_durations_and_queue_position(app, echo_handler, monkeypatch):
+    monkeypatch.setattr(JobConfig, "JOB_WORKERS", 2)
+    now = dt.datetime.utcnow()
+    for secs in (4, 6):
+        done = job_repo.create_job("echo", {})
+        job_repo.finish_job(done.id, JobStatus.SUCCEEDED, result={})
+        db.session.execute(db.update(Job).where(Job.id == done.id).values(
+            started_at=now - dt.timedelta(seconds=secs), finished_at=now))
+    db.session.commit()
+
+    queued = [job_tasks.enqueue_job("echo", {}) for _ in range(5)]
+    first = job_tasks.Get_job_status(queued[0].job_id)
+    last = job_tasks.Get_job_status(queued[-1].job_id)
+    assert first["queue_position"] == 0 and first["eta_seconds"] == pytest.approx(5.0)
+    # 前面 4 个任务由 2 个执行线程分两批完成，再加自身
+    assert last["queue_position"] == 4 and last["eta_seconds"] == pytest.approx(15.0)
+
+
+##################################
+# 执行线程池：有界线程数消费队列，入队即唤醒
+def test_workers_drain_queue(file_app, echo_handler):
+    jobs = [job_tasks.enqueue_job("echo", {"value": i}) for i in range(10)]
+    threads_before = threading.active_count()
+    start_job_workers(file_app, workers=2, lease_seconds=30, poll_interval=0.05)
+    assert threading.active_count() - threads_before == 3
+    assert job_tasks.job_workers_running()
+
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        db.session.expire_all()
+        if all(db.session.get(Job, j.id).status == JobStatus.SUCCEEDED for j in jobs):
+            break
+        time.sleep(0.05)
+    assert sorted(i for i, _ in echo_handler) == sorted(j.job_id for j in jobs)
+    assert job_repo.count_active() == 0
+
+    stop_job_workers(file_app)
+    assert not job_tasks.job_workers_running()
+
+
+##################################
+# 维护过渡的进度写入任务结果：不依赖执行进程的内存，任意 worker 都能读取
+def test_maintenance_progress_is_served_from_job_row(app, monkeypatch):
+    from ..constant import MachineStatus
+    from ..services import machine_tasks
+    from ..utils import heartbeat
+
+    seen = []
+
+    def fake_transition(machine_id, timeout=180, interval=3, app=None, on_progress=None):
+        progress = heartbeat.MaintenanceTransition(machine_id, timeout, on_change=on_progress)
+        progress.update(total=3, phase="polling")
+        progress.settle(stopped=[1, 2])
+        # 其它进程此时读取：本进程内存里没有该机器的过渡记录
+        seen.append(machine_tasks.Get_maintenance_progress(machine_id))
+        progress.settle(stopped=[3])
+        progress.finish(MachineStatus.MAINTENANCE)
+        return MachineStatus.MAINTENANCE
+
+    monkeypatch.setattr(job_tasks, "run_machine_maintenance_transition", fake_transition)
+    monkeypatch.setattr(machine_tasks, "get_maintenance_progress", lambda machine_id: None)
+
+    job = job_tasks.enqueue_job("machine_maintenance", {"machine_id": 42})
+    queued = machine_tasks.Get_maintenance_progress(42)
+    assert (queued["phase"], queued["job_id"]) == ("queued", job.job_id)
+    assert machine_tasks.Get_maintenance_progress(43) is None
+
+    assert job_tasks.run_job(job_repo.claim_next("w1", 30)) == JobStatus.SUCCEEDED
+    assert seen[0]["phase"] == "polling" and seen[0]["total"] == 3 and seen[0]["job_id"] == job.job_id
+
+    done = machine_tasks.Get_maintenance_progress(42)
+    assert (done["phase"], done["stopped"], done["remaining"], done["result"]) == ("done", 3, 0, "maintenance")
+    assert job_tasks.Get_job_status(job.job_id)["result"]["machine_status"] == "maintenance"
+
+
+##################################
+# 创建容器任务：容器离开 CREATING 后才结束；重新执行时为仍在 CREATING 的容器重新登记心跳
+def _creating_container(name="job_c", machine_ip="10.9.0.1"):
+    from ..constant import MachineStatus, MachineTypes
+    from ..models.containers import Container
+    from ..models.machine import Machine
+    m = Machine(machine_name=f"{name}_m", machine_ip=machine_ip, machine_type=MachineTypes.CPU,
+                machine_status=MachineStatus.ONLINE, cpu_core_number=4, memory_size_gb=16, disk_size_gb=100)
+    db.session.add(m)
+    db.session.commit()
+    c = Container(name=name, image="ubuntu:latest", machine_id=m.id, container_status=ContainerStatus.CREATING,
+                  port=23000, memory_gb=1, swap_gb=0, gpu_number=0, cpu_number=1)
+    return m, c
+
+
+def _heartbeat_sets(container_id, status, polls):
+    """代替 time.sleep：第一次等待时模拟心跳把容器状态写回数据库。"""
+    from ..models.containers import Container
+
+    def _sleep(seconds):
+        polls.append(seconds)
+        db.session.execute(db.update(Container).where(Container.id == container_id).values(container_status=status))
+        db.session.commit()
+    return _sleep
+
+
+def _create_payload(machine_id, name="job_c"):
+    return {"owner_name": "alice", "machine_id": machine_id,
+            "container": {"name": name, "image": "ubuntu:latest", "gpu_list": [], "cpu_number": 1, "memory": 1}}
+
+
+def test_create_job_waits_until_container_leaves_creating(app, monkeypatch):
+    from ..services import container_tasks
+    m, c = _creating_container()
+    created, polls = [], []
+
+    def fake_create(owner_name, machine_id, container, public_key=None, operator_user_id=None):
+        db.session.add(c)
+        db.session.commit()
+        created.append(c.id)
+        monkeypatch.setattr(job_tasks.time, "sleep", _heartbeat_sets(c.id, ContainerStatus.ONLINE, polls))
+        return True
+
+    monkeypatch.setattr(container_tasks, "Create_container", fake_create)
+    job = job_tasks.enqueue_job("create_container", _create_payload(m.id))
+    assert job_tasks.run_job(job_repo.claim_next("w1", 30)) == JobStatus.SUCCEEDED
+    assert polls, "容器仍在 CREATING 时任务不应结束"
+    assert job_tasks.Get_job_status(job.job_id)["result"] == {"container_id": created[0], "container_status": "online"}
+
+
+def test_resumed_create_job_reregisters_heartbeat(app, monkeypatch):
+    from ..services import container_tasks
+    m, c = _creating_container(name="job_r", machine_ip="10.9.0.2")
+    db.session.add(c)
+    db.session.commit()
+    watches, polls = [], []
+    monkeypatch.setattr(container_tasks, "Create_container", lambda **kw: pytest.fail("已存在的容器不应重复创建"))
+    monkeypatch.setattr(job_tasks, "container_starting_status_heartbeat",
+                        lambda ip, name, **kw: watches.append((ip, name, kw["container_id"])))
+    monkeypatch.setattr(job_tasks.time, "sleep", _heartbeat_sets(c.id, ContainerStatus.FAILED, polls))
+
+    job = job_tasks.enqueue_job("create_container", _create_payload(m.id, name="job_r"))
+    # 上一个执行进程在容器落库后退出：租约过期，任务重新入队
+    job_repo.claim_next("dead-worker", lease_seconds=-1)
+    job_repo.recover_expired_leases()
+    assert job_tasks.run_job(job_repo.claim_next("w1", 30)) == JobStatus.FAILED
+    assert watches == [("10.9.0.2", "job_r", c.id)]
+    status = job_tasks.Get_job_status(job.job_id)
+    assert status["error_reason"] == "create_failed" and status["attempts"] == 2
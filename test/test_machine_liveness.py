@@ -0,0 +1,124 @@
+from types import SimpleNamespace
+
+import pytest
+
+from .. import create_app
+from ..extensions import db
+from ..models.machine import Machine
+from ..models.containers import Container
+from ..constant import *
+from ..services import machine_tasks
+from ..schemas import machine_liveness_task as liveness_task
+from ..utils.liveness import liveness_table
+
+
+##################################
+# 单元测试创建运行环境
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    app.config.update({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _add_machine(name, ip, status):
+    m = Machine(
+        machine_name=name,
+        machine_ip=ip,
+        machine_type=MachineTypes.CPU,
+        machine_status=status,
+        cpu_core_number=4,
+        memory_size_gb=16,
+        disk_size_gb=100,
+    )
+    db.session.add(m)
+    db.session.commit()
+    return m
+
+
+##################################
+# 存活监控：并发探测，只在状态变化时写库；列表接口不再同步探测
+def test_liveness_monitor_writes_only_on_transition(app, monkeypatch):
+    up = _add_machine("lv_up", "10.3.0.1", MachineStatus.ONLINE)
+    down = _add_machine("lv_down", "10.3.0.2", MachineStatus.ONLINE)
+    maint = _add_machine("lv_maint", "10.3.0.3", MachineStatus.MAINTENANCE)
+    c = Container(name="lv_c0", image="ubuntu:latest", machine_id=down.id,
+                  container_status=ContainerStatus.ONLINE, port=20000,
+                  memory_gb=1, swap_gb=0, gpu_number=0, cpu_number=1)
+    db.session.add(c)
+    db.session.commit()
+
+    reachable = {"10.3.0.1", "10.3.0.3"}
+    monkeypatch.setattr(machine_tasks, "probe_machine_ip", lambda ip, timeout=2.0: ip in reachable)
+    writes = []
+    real_transition = machine_tasks.transition_machine_status
+    monkeypatch.setattr(machine_tasks, "transition_machine_status",
+                        lambda mid, observed, target, **kw: writes.append((mid, target)) or real_transition(mid, observed, target, **kw))
+
+    report = liveness_task.probe_all_machines_once(max_workers=4)
+    assert report["machines"] == 3
+    assert (report["online"], report["offline"]) == (2, 1)
+    assert writes == [(down.id, MachineStatus.OFFLINE)]
+    assert db.session.get(Container, c.id).container_status == ContainerStatus.OFFLINE
+    assert liveness_table.get(up.id)["online"] is True
+    assert liveness_table.get(down.id)["last_seen"] is None
+
+    # 状态未变化的第二轮不写库
+    writes.clear()
+    liveness_task.probe_all_machines_once(max_workers=4)
+    assert writes == []
+
+    # 列表接口只读数据库与存活表
+    monkeypatch.setattr(machine_tasks, "probe_machine_ip", lambda ip, timeout=2.0: pytest.fail("列表接口不应同步探测节点"))
+    res, total_pages = machine_tasks.List_all_machine_bref_information(page_number=0, page_size=10)
+    by_id = {m.id: m for m in res}
+    assert total_pages == 1
+    assert by_id[down.id].machine_status == MachineStatus.OFFLINE.value
+    assert by_id[maint.id].machine_status == MachineStatus.MAINTENANCE.value
+    assert by_id[up.id].last_seen is not None
+
+
+##################################
+# 探测期间机器被切到维护：过期对象上的 ONLINE->OFFLINE 不应覆盖 MAINTENANCE
+def test_liveness_does_not_overwrite_concurrent_status_change(app):
+    m = _add_machine("lv_race", "10.3.0.9", MachineStatus.ONLINE)
+    c = Container(name="lv_race_c", image="ubuntu:latest", machine_id=m.id,
+                  container_status=ContainerStatus.ONLINE, port=20001,
+                  memory_gb=1, swap_gb=0, gpu_number=0, cpu_number=1)
+    db.session.add(c)
+    db.session.commit()
+    stale = SimpleNamespace(id=m.id, machine_status=MachineStatus.ONLINE)  # 探测开始前读出的过期对象
+
+    db.session.execute(db.update(Machine).where(Machine.id == m.id).values(machine_status=MachineStatus.MAINTENANCE))
+    db.session.commit()
+
+    assert machine_tasks.apply_machine_liveness(stale, online=False) is None
+    assert db.session.get(Machine, m.id).machine_status == MachineStatus.MAINTENANCE
+    assert db.session.get(Container, c.id).container_status == ContainerStatus.ONLINE
+
+
+##################################
+# 存活监控周期性打印状态缓存命中率：累计值与距上次打印的窗口值
+def test_log_status_cache_stats_reports_window_hit_rate(monkeypatch, capsys):
+    from ..utils.status_cache import ContainerStatusCache
+
+    cache = ContainerStatusCache(ttl=60)
+    monkeypatch.setattr(liveness_task, "container_status_cache", cache)
+    cache.put(1, "c1", {"container_status": "online"})
+    cache.get(1, "c1")
+    cache.get(1, "missing")
+    first = liveness_task.log_status_cache_stats()
+    assert "hit_rate=50.0%" in capsys.readouterr().out
+
+    for _ in range(3):
+        cache.get(1, "c1")
+    liveness_task.log_status_cache_stats(first)
+    out = capsys.readouterr().out
+    assert "hit_rate=80.0%" in out and "window_hit_rate=100.0% (3/3)" in out
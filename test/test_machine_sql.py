@@ -8,7 +8,7 @@ from .. import create_app
 #单元测试创建运行环境
 @pytest.fixture(scope="session")
 def app():
-    app = create_app()
+    app = create_app("testing")
     app.config.update(TESTING=True)
     with app.app_context():
         # 确保模型已导入，再建表
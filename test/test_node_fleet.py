@@ -0,0 +1,159 @@
+import time
+
+import pytest
+
+from .. import create_app
+from ..benchmarks.node_fleet import FakeNodeFleet, FleetConfig, Latency, probe
+from ..config import CommsConfig
+from ..constant import MachineStatus
+from ..extensions import db
+from ..models.containers import Container
+from ..models.machine import Machine
+from ..services import container_tasks, machine_tasks
+from ..utils import CheckKeys, async_node_transport, node_transport
+from ..utils.CheckKeys import KeyRegistry
+from ..utils.node_session import NodeSessionManager
+from .test_check_keys import _write_pair
+
+
+@pytest.fixture()
+def keys(tmp_path, monkeypatch):
+    private_path, public_path = _write_pair(str(tmp_path))
+    monkeypatch.setattr(CheckKeys, "key_registry", KeyRegistry(private_path, public_path, public_path))
+
+
+def _fleet(monkeypatch, **kwargs):
+    fleet = FakeNodeFleet(FleetConfig(**{"nodes": 3, "containers_per_node": 4, "seed": 7, **kwargs})).start()
+    monkeypatch.setattr(CommsConfig, "NODE_URL_MIDDLE", fleet.url_middle)
+    node_transport.clear_batch_unsupported()
+    return fleet
+
+
+@pytest.fixture()
+def fleet(keys, monkeypatch):
+    fleet = _fleet(monkeypatch)
+    yield fleet
+    fleet.stop()
+
+
+##################################
+# 假 Node 使用真实报文：Ctrl 侧的同步/批量接口可以直接对其调用
+def test_fleet_speaks_signed_protocol(fleet):
+    ip = fleet.ips[1]
+    assert fleet.ips[0] == "127.0.1.1" and len(set(fleet.ips)) == 3
+    assert node_transport.send_to_node(ip, "/machine_status", {"config": {}})["machine_status"] == "online"
+
+    statuses = container_tasks.get_containers_status(ip, ["sim_1_0", "sim_1_3", "missing"])
+    assert statuses["sim_1_0"]["container_status"] == "online"
+    assert statuses["missing"]["status_code"] == 404
+
+    fleet.record_ssh_login(ip, "sim_1_2")
+    last = container_tasks.fetch_containers_last_ssh_time(ip, ["sim_1_2", "sim_1_3"])
+    assert last["sim_1_3"] is None and isinstance(last["sim_1_2"], str)
+    # 两条查询合并为一次 /batch
+    assert fleet.node(ip).commands["/batch"] == 1
+
+
+def test_fleet_rejects_bad_signature(fleet):
+    res = node_transport.node_transport.send(node_transport.node_url(fleet.ips[0], "/machine_status"),
+                                             b"not-a-cipher", b"sig")
+    assert res["status_code"] == 401 and res["error_reason"] == "invalid_signature"
+
+
+##################################
+# 容器状态过渡：start/stop 先进入过渡状态，transition_seconds 后到达终态
+def test_fleet_state_transitions(keys, monkeypatch):
+    fleet = _fleet(monkeypatch, transition_seconds=0.2)
+    try:
+        ip = fleet.ips[0]
+        assert node_transport.send_to_node(ip, "/stop_container", {"config": {"container_name": "sim_0_0"}})["success"] == 1
+        assert container_tasks.get_container_status(ip, "sim_0_0")["container_status"] == "stopping"
+        time.sleep(0.3)
+        assert container_tasks.get_container_status(ip, "sim_0_0")["container_status"] == "offline"
+
+        create = {"owner_name": "alice", "config": {"name": "new_one", "image": "x"}}
+        assert node_transport.send_to_node(ip, "/create_container", create)["success"] == 1
+        assert node_transport.send_to_node(ip, "/create_container", create)["error_reason"] == "container_exists"
+        assert node_transport.send_to_node(ip, "/remove_container", {"config": {"container_name": "new_one"}})["success"] == 0
+
+        fleet.set_machine_status(ip, MachineStatus.MAINTENANCE)
+        assert node_transport.send_to_node(ip, "/machine_status", {"config": {}})["machine_status"] == "maintenance"
+    finally:
+        fleet.stop()
+
+
+##################################
+# 故障注入与旧版 Node 模拟
+def test_fleet_failures_and_unreachable_node(keys, monkeypatch):
+    fleet = _fleet(monkeypatch, failure_rate=1.0)
+    try:
+        res = node_transport.send_to_node(fleet.ips[0], "/machine_status", {"config": {}})
+        assert res["status_code"] == 500 and res["error_reason"] == "node_internal_error"
+        fleet.set_reachable(fleet.ips[1], False)
+        assert "error" in node_transport.send_to_node(fleet.ips[1], "/machine_status", {"config": {}}, timeout=1.0)
+        assert fleet.stats()["injected_failures"] == 1 and fleet.stats()["dropped"] >= 1
+    finally:
+        fleet.stop()
+
+
+def test_fleet_old_nodes_without_batch_or_session(keys, monkeypatch):
+    fleet = _fleet(monkeypatch, supports_batch=False, supports_session=False)
+    monkeypatch.setattr(CommsConfig, "NODE_SESSION_ENABLED", True)
+    manager = NodeSessionManager(ttl=600, retry_seconds=300)
+    monkeypatch.setattr(node_transport, "node_sessions", manager)
+    monkeypatch.setattr(async_node_transport, "node_sessions", manager)
+    try:
+        ip = fleet.ips[2]
+        cmds = [("/container_status", {"config": {"container_name": f"sim_2_{i}"}}) for i in range(4)]
+        results = node_transport.send_batch_to_node(ip, cmds)
+        assert [r["container_status"] for r in results] == ["online"] * 4
+        assert node_transport.is_batch_unsupported(ip)
+        assert manager.stats()["handshake_failures"] == 1 and manager.stats()["handshakes"] == 0
+    finally:
+        fleet.stop()
+
+
+##################################
+# 整个集群巡检一轮：异步客户端按机器合并为 /batch
+def test_fleet_probe_with_latency(keys, monkeypatch):
+    fleet = _fleet(monkeypatch, nodes=5, containers_per_node=10, latency=Latency.parse("uniform:5,15"))
+    try:
+        report = probe(fleet)
+        assert report["requests"] == 5 + 50 and report["errors"] == 0
+        # 每台机器一个批量请求
+        assert report["http_requests"] == 5
+        assert fleet.stats()["commands"]["/container_status"] == 50
+    finally:
+        fleet.stop()
+
+
+def test_latency_parse():
+    assert Latency.parse("lognormal:20,0.5") == Latency("lognormal", 20, 0.5)
+    assert Latency.parse("fixed:3").sample(None) == pytest.approx(0.003)
+    with pytest.raises(ValueError):
+        Latency.parse("gamma:1")
+
+
+##################################
+# 为假 Node 写入对应的数据库记录，Ctrl 侧按 machine_id 的调用直接落到假 Node 上
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    app.config.update({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_fleet_seed_database(app, fleet):
+    machine_ids = fleet.seed_database()
+    assert set(machine_ids) == set(fleet.ips)
+    assert Machine.query.count() == 3 and Container.query.count() == 12
+    ip = fleet.ips[0]
+    assert db.session.get(Machine, machine_ids[ip]).machine_ip == ip
+    assert machine_tasks.is_machine_online_remote(machine_ids[ip])
@@ -0,0 +1,232 @@
+import asyncio
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ..config import CommsConfig
+from ..utils import CheckKeys, async_node_transport, node_transport
+from ..utils.CheckKeys import KeyRegistry
+from ..utils.async_node_transport import AsyncNodeTransport
+from ..utils.node_session import (NodeSessionManager, NodeSessionStore, SessionError, SessionKey, handshake_payload,
+                                  seal_session_message)
+from .test_check_keys import _write_pair
+
+
+class _FakeNode(ThreadingHTTPServer):
+    daemon_threads = True
+    supports_session = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.store = NodeSessionStore()
+        self.counts = {"handshake": 0, "rsa": 0, "session": 0, "rejected": 0}
+        self.lock = threading.Lock()
+
+    def bump(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+
+def _verify_rsa(body):
+    # 报文中的密文与签名为 base64
+    return CheckKeys.get_verified_msg({"message": base64.b64decode(body["message"]),
+                                       "signature": base64.b64decode(body["signature"])})
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, out, code=200):
+        data = json.dumps(out).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        node = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path.endswith("/session_handshake"):
+            if not node.supports_session:
+                return self._reply({"message": "not found"}, 404)
+            node.bump("handshake")
+            return self._reply({"success": 1 if node.store.accept_handshake(_verify_rsa(body)) else 0})
+        if "session_id" in body:
+            try:
+                msg = node.store.open(body)
+            except SessionError as e:
+                node.bump("rejected")
+                return self._reply({"success": 0, "error_reason": e.reason}, 401)
+            node.bump("session")
+        else:
+            msg = _verify_rsa(body)
+            if not msg:
+                return self._reply({"success": 0, "error_reason": "invalid_signature"}, 401)
+            node.bump("rsa")
+        return self._reply({"success": 1, "echo": msg})
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def keys(tmp_path, monkeypatch):
+    private_path, public_path = _write_pair(str(tmp_path))
+    monkeypatch.setattr(CheckKeys, "key_registry", KeyRegistry(private_path, public_path, public_path))
+
+
+@pytest.fixture()
+def node(keys, monkeypatch):
+    server = _FakeNode(("127.0.0.1", 0), _Handler)
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    monkeypatch.setattr(CommsConfig, "NODE_URL_MIDDLE", f":{server.server_address[1]}/api")
+    monkeypatch.setattr(CommsConfig, "NODE_SESSION_ENABLED", True)
+    manager = NodeSessionManager(ttl=600, retry_seconds=300)
+    monkeypatch.setattr(node_transport, "node_sessions", manager)
+    monkeypatch.setattr(async_node_transport, "node_sessions", manager)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def rsa_signs(monkeypatch):
+    calls = []
+    original = node_transport.signature
+
+    def _counting(message):
+        calls.append(message)
+        return original(message)
+
+    monkeypatch.setattr(node_transport, "signature", _counting)
+    return calls
+
+
+##################################
+# 会话建立后消息只做 AES-GCM：整批轮询只有握手那一次 RSA 签名
+def test_session_removes_rsa_from_hot_path(node, rsa_signs):
+    for i in range(20):
+        res = node_transport.send_to_node("127.0.0.1", "/container_status", {"config": {"container_name": f"c{i}"}})
+        assert res["success"] == 1 and res["echo"] == {"config": {"container_name": f"c{i}"}}
+
+    assert node.counts == {"handshake": 1, "rsa": 0, "session": 20, "rejected": 0}
+    assert len(rsa_signs) == 1
+    stats = node_transport.node_sessions.stats()
+    assert stats["handshakes"] == 1 and stats["session_messages"] == 20 and stats["fallbacks"] == 0
+
+
+def test_old_node_falls_back_to_rsa_envelope(node, rsa_signs):
+    node.supports_session = False
+    for _ in range(5):
+        assert node_transport.send_to_node("127.0.0.1", "/machine_status", {"config": {}})["success"] == 1
+    # 握手失败后在退避期内不再重试
+    assert node.counts["rsa"] == 5 and node.counts["session"] == 0
+    assert node_transport.node_sessions.stats()["handshake_failures"] == 1
+    assert len(rsa_signs) == 6
+
+
+def test_rejected_session_is_resent_with_rsa_and_rehandshaked(node):
+    assert node_transport.send_to_node("127.0.0.1", "/machine_status", {"config": {}})["success"] == 1
+    # Node 重启：会话丢失
+    node.store = NodeSessionStore()
+    assert node_transport.send_to_node("127.0.0.1", "/machine_status", {"config": {}})["success"] == 1
+    assert node.counts["rejected"] == 1 and node.counts["rsa"] == 1
+    assert node_transport.send_to_node("127.0.0.1", "/machine_status", {"config": {}})["success"] == 1
+    assert node.counts["handshake"] == 2 and node.counts["session"] == 2
+
+
+def test_session_rotates_before_expiry(node):
+    node_transport.send_to_node("127.0.0.1", "/machine_status", {"config": {}})
+    manager = node_transport.node_sessions
+    first, _ = manager.acquire("127.0.0.1")
+    # 进入轮换窗口：新会话建立前旧会话仍可用
+    first.expires_at = first.expires_at - manager.ttl + manager.rotate_margin / 2
+    node_transport.send_to_node("127.0.0.1", "/machine_status", {"config": {}})
+    second, pending = manager.acquire("127.0.0.1")
+    assert pending is None and second is not first
+    assert node.counts["handshake"] == 2 and node.counts["rejected"] == 0
+
+
+def test_async_transport_uses_session(node, rsa_signs):
+    async def run():
+        transport = AsyncNodeTransport(max_in_flight=16)
+        try:
+            return await asyncio.gather(*(
+                transport.send_to_node("127.0.0.1", "/container_status", {"config": {"container_name": f"c{i}"}})
+                for i in range(10)
+            ))
+        finally:
+            await transport.close()
+
+    node_transport.send_to_node("127.0.0.1", "/machine_status", {"config": {}})
+    results = asyncio.run(run())
+    assert all(r["success"] == 1 for r in results)
+    assert node.counts["session"] == 11 and len(rsa_signs) == 1
+
+
+##################################
+# 接收方：篡改与重放都会被拒绝
+def test_session_store_rejects_tamper_and_replay():
+    store = NodeSessionStore(replay_window=4)
+    session = SessionKey.generate(60)
+    assert store.accept_handshake(handshake_payload(session))
+    body = seal_session_message(session, {"config": {"x": 1}})
+    assert store.open(body) == {"config": {"x": 1}}
+    with pytest.raises(SessionError) as ei:
+        store.open(body)
+    assert ei.value.reason == "invalid_signature"
+
+    tampered = dict(seal_session_message(session, {"config": {"x": 2}}), session_id="other")
+    with pytest.raises(SessionError) as ei:
+        store.open(tampered)
+    assert ei.value.reason == "invalid_session"
+
+    # 乱序到达（窗口内）可以接受，落后窗口之外的拒绝
+    late = seal_session_message(session, {"n": 0})
+    for i in range(6):
+        store.open(seal_session_message(session, {"n": i}))
+    with pytest.raises(SessionError):
+        store.open(late)
+
+
+##################################
+# 握手防重放：过期/未来的握手被拒绝；已知 session_id（含已过期的墓碑）不能被重新安装
+def test_session_store_rejects_replayed_handshake(monkeypatch):
+    store = NodeSessionStore(max_handshake_age=60, max_clock_skew=5, grace_seconds=0)
+    session = SessionKey.generate(30)
+    handshake = handshake_payload(session)
+    assert store.accept_handshake(handshake)
+    store.open(seal_session_message(session, {"n": 1}))
+    replayed_counter = seal_session_message(session, {"n": 2})
+    store.open(replayed_counter)
+
+    # 重放同一握手：会话不会被重新安装，计数器窗口不会被重置
+    assert not store.accept_handshake(handshake)
+    with pytest.raises(SessionError):
+        store.open(replayed_counter)
+
+    # 缺少签发时间或签发时间超出允许范围
+    legacy = {"config": {k: v for k, v in handshake_payload(SessionKey.generate(30))["config"].items() if k != "issued_at"}}
+    assert not store.accept_handshake(legacy)
+    for offset in (-120, 60):
+        fresh = handshake_payload(SessionKey.generate(30))
+        fresh["config"]["issued_at"] += offset
+        assert not store.accept_handshake(fresh)
+
+    # 会话过期后仍保留墓碑：在握手尚能通过时间校验的窗口内重放依旧被拒绝
+    real_time = time.time
+    monkeypatch.setattr(time, "time", lambda: real_time() + 40)
+    with pytest.raises(SessionError) as ei:
+        store.open(seal_session_message(session, {"n": 3}))
+    assert ei.value.reason == "invalid_session"
+    assert not store.accept_handshake(handshake)
+    # 握手本身过期之后墓碑被清理
+    monkeypatch.setattr(time, "time", lambda: real_time() + 200)
+    assert store.accept_handshake(handshake_payload(SessionKey.generate(30)))
+    assert session.session_id not in store._sessions
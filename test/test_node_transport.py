@@ -0,0 +1,118 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ..utils.node_transport import NodeTransport, parse_node_response
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers["Content-Length"]))
+        with server.lock:
+            server.requests += 1
+            server.connections.add(self.client_address)
+        if self.path.endswith("/slow"):
+            time.sleep(0.5)
+        if self.path.endswith("/html"):
+            data, code, ctype = b"<html>Internal Server Error</html>", 500, "text/html"
+        elif self.path.endswith("/reason"):
+            data, code, ctype = json.dumps({"success": 0, "error_reason": "not_found"}).encode(), 404, "application/json"
+        else:
+            data, code, ctype = json.dumps({"success": 1}).encode(), 200, "application/json"
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def node_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.connections = set()
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _url(server, path):
+    return f"http://127.0.0.1:{server.server_address[1]}/api{path}"
+
+
+##################################
+# 连接池：同一台机器复用同一个 Session 与 keep-alive 连接
+def test_transport_reuses_pooled_connection(node_server):
+    transport = NodeTransport(pool_maxsize=2, retry_total=0)
+    try:
+        for _ in range(10):
+            assert transport.send(_url(node_server, "/ping"), b"c", b"s") == {"success": 1, "status_code": 200}
+        assert transport.session_for(_url(node_server, "/other")) is transport.session_for(_url(node_server, "/ping"))
+        assert node_server.requests == 10 and len(node_server.connections) == 1
+        assert transport.stats()["pools"] == 1
+    finally:
+        transport.close()
+
+
+##################################
+# 响应解析：4xx/5xx 保留 JSON 中的 error_reason，非 JSON 返回 text
+def test_transport_parses_json_and_non_json(node_server):
+    transport = NodeTransport(retry_total=0)
+    try:
+        assert transport.send(_url(node_server, "/reason"), b"c", b"s") == {
+            "success": 0, "error_reason": "not_found", "status_code": 404}
+        res = transport.send(_url(node_server, "/html"), b"c", b"s")
+        assert res["status_code"] == 500 and "Internal Server Error" in res["text"]
+    finally:
+        transport.close()
+    assert parse_node_response(200, "[1, 2]") == [1, 2]
+
+
+##################################
+# 重试只覆盖连接阶段：读超时（Node 可能已执行）不会被自动重放
+def test_transport_does_not_retry_read_timeouts(node_server):
+    transport = NodeTransport(retry_total=3, backoff_factor=0)
+    try:
+        res = transport.send(_url(node_server, "/slow"), b"c", b"s", timeout=0.1)
+        assert set(res) == {"error"}
+        time.sleep(0.6)
+        assert node_server.requests == 1
+        # 调用方显式 attempts 时才重发
+        transport.send(_url(node_server, "/slow"), b"c", b"s", timeout=0.1, attempts=2)
+        time.sleep(0.6)
+        assert node_server.requests == 3
+    finally:
+        transport.close()
+
+
+def test_transport_retries_connect_errors(monkeypatch):
+    from urllib3.util import connection
+
+    attempts = []
+
+    def refuse(address, *args, **kwargs):
+        attempts.append(address)
+        raise ConnectionRefusedError("refused")
+
+    monkeypatch.setattr(connection, "create_connection", refuse)
+    transport = NodeTransport(retry_total=2, backoff_factor=0)
+    try:
+        res = transport.send("http://127.0.0.1:9/api/ping", b"c", b"s", timeout=1.0)
+        assert set(res) == {"error"}
+        # 请求尚未到达 Node：首次 + 2 次重试
+        assert len(attempts) == 3
+    finally:
+        transport.close()
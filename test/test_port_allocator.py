@@ -0,0 +1,127 @@
+import threading
+import pytest
+
+from ..utils.port_allocator import FreePortIntervals, PortAllocator, PORT_START, PORT_END
+
+
+##################################
+# 空闲区间：最小端口分配、释放后合并
+def test_free_port_intervals_pop_and_merge():
+    free = FreePortIntervals(used=[1024, 1025, 1027, 2000], start=1024, end=2000)
+    assert free.intervals() == [(1026, 1026), (1028, 1999)]
+
+    assert free.pop_lowest() == 1026
+    assert free.pop_lowest() == 1028
+    assert not free.is_free(1025)
+
+    assert free.release(1025) is True
+    assert free.release(1025) is False, "重复释放应被忽略"
+    assert free.release(5000) is False, "越界端口应被忽略"
+    assert free.pop_lowest() == 1025
+
+    # 释放 1026/1027/1028 后与右侧区间合并成一个区间
+    for p in (1027, 1026, 1028):
+        free.release(p)
+    assert free.intervals() == [(1026, 1999)]
+    assert len(free) == 1999 - 1026 + 1
+
+
+##################################
+# 并发预留不会拿到重复端口；pending 端口在对账后仍视为占用
+def test_port_allocator_concurrent_reserve_is_collision_free():
+    loads = []
+
+    def loader(machine_id):
+        loads.append(machine_id)
+        return [PORT_START, PORT_START + 2]
+
+    alloc = PortAllocator(loader, resync_seconds=0)
+    got, lock = [], threading.Lock()
+
+    def worker():
+        for _ in range(50):
+            p = alloc.reserve(1)
+            with lock:
+                got.append(p)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(got) == len(set(got)) == 400
+    assert PORT_START not in got and PORT_START + 2 not in got
+    assert loads == [1], "只应在首次使用时从数据库重建"
+
+    # 重建后，尚未 confirm 的端口仍被保护；release 后可再次分配
+    alloc.rebuild(1)
+    assert alloc.reserve(1) == PORT_START + 402
+    alloc.release(1, PORT_START + 1)
+    assert alloc.reserve(1) == PORT_START + 1
+
+
+def test_port_allocator_exhaustion():
+    alloc = PortAllocator(lambda mid: range(PORT_START, PORT_END), resync_seconds=0)
+    assert alloc.reserve(7) == PORT_END
+    with pytest.raises(RuntimeError):
+        alloc.reserve(7)
+
+
+##################################
+# 多进程：另一个 worker 已落库的端口在本进程缓存中仍是空闲，reserve 须以数据库为准跳过
+def test_port_allocator_skips_ports_taken_by_other_workers():
+    db_ports = set()
+
+    def loader(machine_id):
+        return sorted(db_ports)
+
+    def is_taken(machine_id, port):
+        return port in db_ports
+
+    worker_a = PortAllocator(loader, resync_seconds=0, is_taken=is_taken)
+    worker_b = PortAllocator(loader, resync_seconds=0, is_taken=is_taken)
+    assert worker_a.reserve(1) == PORT_START
+    assert worker_b.reserve(1) == PORT_START
+    db_ports.add(PORT_START)
+    worker_a.confirm(1, PORT_START)
+
+    # worker_b 的 PORT_START 未能落库：abandon 后缓存认为它空闲，但数据库已占用
+    worker_b.abandon(1, PORT_START)
+    assert worker_b.reserve(1) == PORT_START + 1
+
+    # 连续命中被占用端口后强制重建，不会逐个探测到 MAX_PROBES
+    db_ports.update(range(PORT_START + 2, PORT_START + 40))
+    assert worker_a.reserve(1) == PORT_START + 1
+    assert worker_b.reserve(1) == PORT_START + 40
+
+
+def test_port_allocator_abandon_keeps_confirmed_ports():
+    alloc = PortAllocator(lambda mid: [], resync_seconds=0)
+    p = alloc.reserve(3)
+    alloc.confirm(3, p)
+    alloc.abandon(3, p)
+    assert alloc.reserve(3) == p + 1
+
+
+##################################
+# 从数据库重建时不持有全局锁：一台机器的慢查询不阻塞其它机器的分配
+def test_port_allocator_loads_outside_global_lock():
+    started, proceed = threading.Event(), threading.Event()
+
+    def loader(machine_id):
+        if machine_id == 1:
+            started.set()
+            proceed.wait(5)
+        return []
+
+    alloc = PortAllocator(loader, resync_seconds=0)
+    slow = threading.Thread(target=alloc.reserve, args=(1,))
+    slow.start()
+    assert started.wait(5)
+    try:
+        assert alloc.reserve(2) == PORT_START
+    finally:
+        proceed.set()
+        slow.join()
+    assert alloc.stats()["pending"] == 2
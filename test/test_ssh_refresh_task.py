@@ -0,0 +1,119 @@
+import pytest
+
+from .. import create_app
+from ..extensions import db
+from ..models.machine import Machine
+from ..models.containers import Container
+from ..models.container_ssh_login import ContainerSSHLogin
+from ..constant import *
+from ..services import container_tasks
+from ..repositories import container_ssh_login_repo
+from ..schemas import container_ssh_refresh_task as refresh_task
+
+
+##################################
+# 单元测试创建运行环境
+@pytest.fixture()
+def app():
+    app = create_app("testing")
+    app.config.update({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+    })
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _add_machine(name, ip, status):
+    m = Machine(
+        machine_name=name,
+        machine_ip=ip,
+        machine_type=MachineTypes.CPU,
+        machine_status=status,
+        cpu_core_number=4,
+        memory_size_gb=16,
+        disk_size_gb=100,
+    )
+    db.session.add(m)
+    db.session.commit()
+    return m
+
+
+def _add_containers(machine, n):
+    cs = []
+    for i in range(n):
+        c = Container(name=f"{machine.machine_name}_c{i}", image="ubuntu:latest", machine_id=machine.id,
+                      container_status=ContainerStatus.ONLINE, port=20000 + i,
+                      memory_gb=1, swap_gb=0, gpu_number=0, cpu_number=1)
+        db.session.add(c)
+        cs.append(c)
+    db.session.commit()
+    return cs
+
+
+##################################
+# SSH 登录时间刷新：并发、跳过维护中的机器、批量落库
+def test_refresh_sweep_skips_unavailable_machines(app, monkeypatch):
+    online = _add_machine("m_online", "10.1.0.1", MachineStatus.ONLINE)
+    maint = _add_machine("m_maint", "10.1.0.2", MachineStatus.MAINTENANCE)
+    online_cs = _add_containers(online, 5)
+    _add_containers(maint, 3)
+
+    queried = []
+
+    def fake_fetch(machine_ip, container_name, timeout=5.0):
+        queried.append((machine_ip, container_name))
+        if container_name.endswith("c4"):
+            raise container_tasks.NodeServiceError("boom", reason="NODE_error")
+        if container_name.endswith("c3"):
+            return None
+        return "2026-01-01T00:00:00"
+
+    def fake_fetch_many(machine_ip, container_names, timeout=5.0):
+        out = {}
+        for name in container_names:
+            try:
+                out[name] = fake_fetch(machine_ip, name, timeout)
+            except Exception as e:
+                out[name] = e
+        return out
+
+    monkeypatch.setattr(container_tasks, "fetch_containers_last_ssh_time", fake_fetch_many)
+
+    report = refresh_task.refresh_all_containers_last_ssh_login_time_once(page_size=2, max_workers=4)
+
+    assert {ip for ip, _ in queried} == {"10.1.0.1"}, "维护中的机器不应被查询"
+    assert report["containers"] == 8
+    assert report["updated"] == 4
+    assert report["failed"] == 1
+    assert report["skipped_machines"] == [maint.id]
+    assert online.id in report["machine_latency"]
+
+    records = {r.container_id: r.last_ssh_login_time for r in ContainerSSHLogin.query.all()}
+    assert len(records) == 4
+    assert records[online_cs[0].id] == "2026-01-01T00:00:00"
+    assert records[online_cs[3].id] is None
+
+
+##################################
+# 批量 upsert：插入新行、覆盖已有行、同批重复键以最后一次为准
+def test_bulk_upsert_last_ssh_login_time(app):
+    m = _add_machine("m_bulk", "10.1.0.9", MachineStatus.ONLINE)
+    cs = _add_containers(m, 3)
+    container_ssh_login_repo.upsert_last_ssh_login_time(m.id, cs[0].id, "old")
+
+    n = container_ssh_login_repo.bulk_upsert_last_ssh_login_time([
+        (m.id, cs[0].id, "new"),
+        (m.id, cs[1].id, None),
+        (m.id, cs[2].id, "first"),
+        (m.id, cs[2].id, "last"),
+    ])
+    assert n == 3
+    assert container_ssh_login_repo.bulk_upsert_last_ssh_login_time([]) == 0
+
+    db.session.expire_all()
+    records = {r.container_id: r.last_ssh_login_time for r in ContainerSSHLogin.query.all()}
+    assert records == {cs[0].id: "new", cs[1].id: None, cs[2].id: "last"}
@@ -0,0 +1,96 @@
+import threading
+import time
+import pytest
+
+from ..utils.status_cache import ContainerStatusCache
+
+
+##################################
+# 共享状态缓存：TTL 过期、只缓存成功结果、命中率统计
+def test_status_cache_ttl_and_stats():
+    cache = ContainerStatusCache(ttl=0.05)
+    cache.put(1, "c0", {"container_status": "online"})
+    cache.put(1, "c1", {"error": "timeout"})
+    cache.put(1, "c2", {"status_code": 404, "error": "not found"})
+
+    assert cache.get(1, "c0") == {"container_status": "online"}
+    assert cache.get(1, "c1") is None, "网络错误不应入缓存"
+    assert cache.get(1, "c2")["status_code"] == 404
+    assert cache.get(2, "c0") is None, "不同机器上的同名容器互不影响"
+
+    time.sleep(0.06)
+    assert cache.get(1, "c0") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 3)
+    assert stats["hit_rate"] == 2 / 5
+
+    cache.put(1, "c0", {"container_status": "online"}, from_heartbeat=True)
+    cache.put(1, "c3", {"container_status": "offline"})
+    cache.invalidate(1)
+    assert cache.get(1, "c0") is None and cache.get(1, "c3") is None
+    assert cache.stats()["heartbeat_updates"] == 1
+
+
+##################################
+# single-flight：并发请求同一批容器只探测一次 Node
+def test_status_cache_single_flight_batch():
+    cache = ContainerStatusCache(ttl=60)
+    calls = []
+    gate = threading.Event()
+
+    def fetch_many(names):
+        calls.append(list(names))
+        gate.wait(2)
+        return {n: {"container_status": "online"} for n in names}
+
+    results = []
+    lock = threading.Lock()
+
+    def viewer():
+        r = cache.get_many(7, ["a", "b"], fetch_many)
+        with lock:
+            results.append(r)
+
+    threads = [threading.Thread(target=viewer) for _ in range(20)]
+    for t in threads:
+        t.start()
+    while not calls:
+        time.sleep(0.001)
+    time.sleep(0.05)
+    gate.set()
+    for t in threads:
+        t.join()
+
+    assert calls == [["a", "b"]]
+    assert len(results) == 20
+    assert all(r == {"a": {"container_status": "online"}, "b": {"container_status": "online"}} for r in results)
+    stats = cache.stats()
+    assert stats["probes"] == 1
+    assert stats["shared_probes"] == 19 * 2
+
+    # 命中后不再探测；单个容器的同步读取复用同一份缓存
+    assert cache.get_or_probe(7, "a", lambda: pytest.fail("缓存命中时不应探测 Node")) == {"container_status": "online"}
+    assert cache.get_or_probe(7, "c", lambda: {"container_status": "offline"}) == {"container_status": "offline"}
+    assert calls == [["a", "b"]]
+
+
+##################################
+# drain：等待后台刷新回填缓存，之后仍可继续提交刷新
+def test_status_cache_drain_waits_for_background_refresh():
+    cache = ContainerStatusCache(ttl=60, max_workers=2)
+    release = threading.Event()
+
+    def slow_fetch():
+        release.wait(5)
+        return {"container_status": "online"}
+
+    assert cache.refresh_async(1, "c1", slow_fetch) is True
+    assert cache.refresh_async(1, "c1", slow_fetch) is False, "在途探测不重复提交"
+    threading.Timer(0.05, release.set).start()
+    cache.drain()
+    assert cache.get(1, "c1") == {"container_status": "online"}
+
+    assert cache.refresh_async(1, "c2", lambda: {"container_status": "offline"}) is True
+    cache.drain()
+    assert cache.get(1, "c2") == {"container_status": "offline"}
+    cache.drain()
@@ -8,7 +8,7 @@ from .. import create_app
 #单元测试创建运行环境
 @pytest.fixture(scope="session")
 def app():
-    app = create_app()
+    app = create_app("testing")
     app.config.update(TESTING=True)
     with app.app_context():
         # 确保模型已导入，再建表
@@ -438,4 +438,53 @@ def test_Reset_password():
 ##################################
 
 ##################################
-##################################
\ No newline at end of file
+##################################
+
+
+##################################
+#token 缓存单元测试：同一 token 只查询一次数据库，登出/删除用户后失效
+def test_token_cache_resolves_once_and_invalidates():
+    import uuid
+    import datetime as dt
+    from sqlalchemy import event
+    from ..repositories import authentications_repo, user_repo
+    from ..constant import PERMISSION
+
+    username = f"tc_{uuid.uuid4().hex[:8]}"
+    reg_success, user, _ = Register(username, f"{username}@example.com", f"P@ss_{uuid.uuid4().hex[:6]}", "2026")
+    if not reg_success:
+        pytest.skip("随机用户名或邮箱冲突，跳过测试")
+    user_id = user.id
+    expires_at = dt.datetime.utcnow() + dt.timedelta(hours=1)
+    token = f"tok_{uuid.uuid4().hex}"
+    authentications_repo.create_auth(token, user_id, expires_at)
+
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", _count)
+    try:
+        assert authentications_repo.is_token_valid(token) is True
+        assert authentications_repo.get_user_id_by_token(token) == user_id
+        assert user_repo.check_permission(token, PERMISSION.USER) is True
+        assert user_repo.check_permission(token, PERMISSION.OPERATOR) is False
+        assert len(statements) == 1, f"同一 token 应只查询一次数据库: {statements}"
+    finally:
+        event.remove(db.engine, "before_cursor_execute", _count)
+
+    # 登出（删除 token）后立即失效
+    authentications_repo.delete_auth(token)
+    assert authentications_repo.is_token_valid(token) is False
+
+    # 删除用户后，该用户其它已缓存的 token 失效
+    token2 = f"tok_{uuid.uuid4().hex}"
+    authentications_repo.create_auth(token2, user_id, expires_at)
+    assert authentications_repo.resolve_token(token2).user_id == user_id
+    try:
+        user_repo.delete_user(user_id)
+        assert authentications_repo.token_cache.get(token2) is None
+    finally:
+        authentications_repo.delete_auth(token2)
+##################################
@@ -1,13 +1,15 @@
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric.rsa import RSAPrivateKey, RSAPublicKey
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import rsa, ed25519
 from ..config import KeyConfig
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+import abc
 import json
 import base64
 import os
+import threading
 # 加载公钥和私钥，返回公钥和私钥对象
 def load_keys(private_key_path:str,pub_key_path:str,pub_key_node_path)->tuple[RSAPrivateKey,RSAPublicKey,RSAPublicKey]:
     with open(private_key_path, "rb") as f:
@@ -29,6 +31,13 @@ def generate_keys()->tuple[RSAPrivateKey,RSAPublicKey]:
     public_key_A = private_key_A.public_key()
     return (private_key_A,public_key_A)
 
+def generate_signing_keys(suite: str | None = None):
+    """按签名套件生成签名密钥对；RSA 套件与 generate_keys 相同（同一对密钥也用于加密）。"""
+    if (suite or KeyConfig.SIGNATURE_SUITE) == ED25519:
+        private_key = ed25519.Ed25519PrivateKey.generate()
+        return (private_key, private_key.public_key())
+    return generate_keys()
+
 def write_keys(path:str,key):
     # 保存私钥到文件
     if type(key)==RSAPrivateKey:
@@ -49,10 +58,186 @@ def write_keys(path:str,key):
                 )
             )
 
+class KeyRegistry:
+    """
+    进程级密钥缓存：启动时加载一次 PEM，之后按文件 mtime 判断是否需要热重载。
+    heartbeat / ssh-refresh 等后台线程会并发调用，所有读写都在锁内完成。
+    """
+
+    def __init__(self, private_key_path: str, pub_key_path: str, pub_key_node_path: str,
+                 signing_key_path: str | None = None, node_signing_key_path: str | None = None):
+        self._lock = threading.Lock()
+        self._paths = {
+            "private": private_key_path,
+            "public": pub_key_path,
+            "node_public": pub_key_node_path,
+        }
+        # 签名密钥与加密密钥分开配置时（如 Ed25519 签名 + RSA-OAEP 加密）才有这两项，否则复用 RSA 密钥
+        if signing_key_path:
+            self._paths["signing_private"] = signing_key_path
+        if node_signing_key_path:
+            self._paths["node_signing_public"] = node_signing_key_path
+        # name -> (path, mtime_ns, key)
+        self._entries: dict[str, tuple[str, int, object]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def configure(self, private_key_path: str | None = None, pub_key_path: str | None = None,
+                  pub_key_node_path: str | None = None, signing_key_path: str | None = None,
+                  node_signing_key_path: str | None = None) -> None:
+        """修改密钥路径；路径变化的条目会在下次访问时重新加载。"""
+        with self._lock:
+            for name, path in (("private", private_key_path), ("public", pub_key_path),
+                               ("node_public", pub_key_node_path), ("signing_private", signing_key_path),
+                               ("node_signing_public", node_signing_key_path)):
+                if path and path != self._paths.get(name):
+                    self._paths[name] = path
+                    self._entries.pop(name, None)
+
+    def _get(self, name: str):
+        with self._lock:
+            path = self._paths[name]
+            mtime = os.stat(path).st_mtime_ns
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == path and entry[1] == mtime:
+                self.hits += 1
+                return entry[2]
+            with open(path, "rb") as f:
+                data = f.read()
+            if name.endswith("private"):
+                key = serialization.load_pem_private_key(data, password=None)
+            else:
+                key = serialization.load_pem_public_key(data)
+            if entry is not None and entry[0] == path:
+                self.reloads += 1
+            else:
+                self.misses += 1
+            self._entries[name] = (path, mtime, key)
+            return key
+
+    def private_key(self) -> RSAPrivateKey:
+        return self._get("private")
+
+    def public_key(self) -> RSAPublicKey:
+        return self._get("public")
+
+    def node_public_key(self) -> RSAPublicKey:
+        return self._get("node_public")
+
+    def signing_private_key(self):
+        return self._get("signing_private") if "signing_private" in self._paths else self.private_key()
+
+    def node_signing_public_key(self):
+        return self._get("node_signing_public") if "node_signing_public" in self._paths else self.node_public_key()
+
+    def preload(self) -> None:
+        """一次性加载全部密钥，文件缺失时抛出 OSError。"""
+        for name in self._paths:
+            self._get(name)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "cached": sorted(self._entries.keys()),
+            }
+
+
+# 与原 load_keys 调用保持一致：对端公钥同样读取 PUBLIC_KEY_PATH
+key_registry = KeyRegistry(KeyConfig.PRIVATE_KEY_PATH, KeyConfig.PUBLIC_KEY_PATH, KeyConfig.PUBLIC_KEY_PATH,
+                           KeyConfig.SIGNING_KEY_PATH, KeyConfig.NODE_SIGNING_KEY_PATH)
+
+
+def init_key_registry(app) -> KeyRegistry:
+    """在 create_app 时按 app.config 配置密钥路径并预加载。"""
+    private_path = app.config.get("PRIVATE_KEY_PATH", KeyConfig.PRIVATE_KEY_PATH)
+    public_path = app.config.get("PUBLIC_KEY_PATH", KeyConfig.PUBLIC_KEY_PATH)
+    key_registry.configure(private_path, public_path, public_path,
+                           app.config.get("SIGNING_KEY_PATH", KeyConfig.SIGNING_KEY_PATH),
+                           app.config.get("NODE_SIGNING_KEY_PATH", KeyConfig.NODE_SIGNING_KEY_PATH))
+    try:
+        key_registry.preload()
+    except OSError as e:
+        print(f"Warning: failed to preload keys, will retry on first use: {e}")
+    app.extensions["key_registry"] = key_registry
+    return key_registry
+
+#######################################
+# 签名套件：报文通过 "sig_suite" 字段声明所用套件，缺省为原有的 RSA-PSS（保持与旧报文兼容）
+
+RSA_PSS_SHA256 = "rsa-pss-sha256"
+ED25519 = "ed25519"
+
+
+class SignatureSuite(abc.ABC):
+    """签名套件接口；name 写入报文的 "sig_suite" 字段。verify 失败时返回 False 而不抛异常。"""
+    name = ""
+
+    @abc.abstractmethod
+    def sign(self, private_key, data: bytes) -> bytes:
+        ...
+
+    @abc.abstractmethod
+    def verify(self, public_key, sig: bytes, data: bytes) -> bool:
+        ...
+
+
+class RsaPssSuite(SignatureSuite):
+    """原有格式：RSA-PSS + SHA256，MGF1，salt 长度 MAX_LENGTH。"""
+    name = RSA_PSS_SHA256
+
+    _padding = padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH)
+
+    def sign(self, private_key, data: bytes) -> bytes:
+        return private_key.sign(data, self._padding, hashes.SHA256())
+
+    def verify(self, public_key, sig: bytes, data: bytes) -> bool:
+        try:
+            public_key.verify(sig, data, self._padding, hashes.SHA256())
+            return True
+        except Exception:
+            return False
+
+
+class Ed25519Suite(SignatureSuite):
+    name = ED25519
+
+    def sign(self, private_key, data: bytes) -> bytes:
+        if not isinstance(private_key, ed25519.Ed25519PrivateKey):
+            raise ValueError("ed25519 signature suite requires an Ed25519 signing key (SIGNING_KEY_PATH)")
+        return private_key.sign(data)
+
+    def verify(self, public_key, sig: bytes, data: bytes) -> bool:
+        try:
+            public_key.verify(sig, data)
+            return True
+        except Exception:
+            return False
+
+
+SIGNATURE_SUITES: dict[str, SignatureSuite] = {s.name: s for s in (RsaPssSuite(), Ed25519Suite())}
+
+
+def get_signature_suite(name: str | None = None) -> SignatureSuite:
+    """name 为空时返回配置的签名套件（KeyConfig.SIGNATURE_SUITE）；未知套件抛出 ValueError。"""
+    name = name or KeyConfig.SIGNATURE_SUITE
+    suite = SIGNATURE_SUITES.get(name)
+    if suite is None:
+        raise ValueError(f"unknown signature suite: {name}")
+    return suite
+#######################################
+
 #加密信息
 def encryption(message:str)->bytes:
     # Hybrid encryption: AES-GCM for message, RSA-OAEP to encrypt AES key
-    _,_,PUBLIC_KEY_B = load_keys(KeyConfig.PRIVATE_KEY_PATH, KeyConfig.PUBLIC_KEY_PATH, KeyConfig.PUBLIC_KEY_PATH)
+    PUBLIC_KEY_B = key_registry.node_public_key()
     if isinstance(message, str):
         message = message.encode('utf-8')
     # generate AES key
@@ -74,22 +259,21 @@ def encryption(message:str)->bytes:
     }
     return json.dumps(payload).encode('utf-8')
 
-#签名信息
-def signature(message:str)->bytes:
-    PRIVATE_KEY_A,_,_=load_keys(KeyConfig.PRIVATE_KEY_PATH,KeyConfig.PUBLIC_KEY_PATH,KeyConfig.PUBLIC_KEY_PATH)
+#签名信息（使用配置的签名套件；报文中的 sig_suite 由 node_transport.build_envelope 填写）
+def signature(message:str, suite: str | None = None)->bytes:
+    signer = get_signature_suite(suite)
+    # RSA-PSS 始终使用 RSA 私钥；其他套件使用单独配置的签名私钥
+    if signer.name == RSA_PSS_SHA256:
+        PRIVATE_KEY_A = key_registry.private_key()
+    else:
+        PRIVATE_KEY_A = key_registry.signing_private_key()
     # 将字符串编码为 bytes
     message_bytes = message.encode('utf-8') if isinstance(message, str) else message
-    signature = PRIVATE_KEY_A.sign(
-        message_bytes,
-        padding.PSS(mgf=padding.MGF1(hashes.SHA256()),
-                    salt_length=padding.PSS.MAX_LENGTH),
-        hashes.SHA256()
-    )
-    return signature
+    return signer.sign(PRIVATE_KEY_A, message_bytes)
 
-#解密信息
-def decryption(ciphertext:bytes)->bytes:
-    PRIVATE_KEY_A,_,_=load_keys(KeyConfig.PRIVATE_KEY_PATH,KeyConfig.PUBLIC_KEY_PATH,KeyConfig.PUBLIC_KEY_PATH)
+#解密信息（registry 为空时使用进程级 key_registry；模拟 Node 等接收方可传入自己的密钥）
+def decryption(ciphertext:bytes, registry: KeyRegistry | None = None)->bytes:
+    PRIVATE_KEY_A = (registry or key_registry).private_key()
     # Try hybrid format (JSON with enc_key/nonce/ciphertext)
     try:
         raw = ciphertext.decode('utf-8')
@@ -120,25 +304,26 @@ def decryption(ciphertext:bytes)->bytes:
         except Exception as e:
             raise
 
-#验证签名
-def verify_signature(message:bytes, signature:bytes)->bool:
-    _,_,PUBLIC_KEY_B=load_keys(KeyConfig.PRIVATE_KEY_PATH,KeyConfig.PUBLIC_KEY_PATH,KeyConfig.PUBLIC_KEY_PATH)
+#验证签名：suite 为空表示旧报文（未声明套件），按 RSA-PSS 校验
+def verify_signature(message:bytes, signature:bytes, suite: str | None = None,
+                     registry: KeyRegistry | None = None)->bool:
+    registry = registry or key_registry
     try:
-        PUBLIC_KEY_B.verify(
-            signature,
-            message,
-            padding.PSS(mgf=padding.MGF1(hashes.SHA256()),
-                       salt_length=padding.PSS.MAX_LENGTH),
-            hashes.SHA256()
-        )
-        return True
+        verifier = SIGNATURE_SUITES[suite or RSA_PSS_SHA256]
+        if verifier.name == RSA_PSS_SHA256:
+            PUBLIC_KEY_B = registry.node_public_key()
+        else:
+            PUBLIC_KEY_B = registry.node_signing_public_key()
     except Exception:
         return False
-    
-def get_verified_msg(recived_message:dict)->dict:
+    return verifier.verify(PUBLIC_KEY_B, signature, message)
+
+
+def get_verified_msg(recived_message:dict, registry: KeyRegistry | None = None)->dict:
     """
     解密并验证签名的消息
-    :param recived_message: 包含加密消息和签名的字典 {"message": bytes/str, "signature": bytes/str}
+    :param recived_message: 包含加密消息和签名的字典 {"message": bytes/str, "signature": bytes/str, ["sig_suite": str]}
+    :param registry: 接收方密钥（private 用于解密，node_public 为发送方公钥），为空时使用 key_registry
     :return: 验证成功返回解密后的字典，失败返回空字典
     """
     try:
@@ -156,10 +341,10 @@ def get_verified_msg(recived_message:dict)->dict:
             signature_data = signature_data.encode()
         
         # 解密消息
-        decrypted_msg = decryption(encrypted_msg)
+        decrypted_msg = decryption(encrypted_msg, registry)
         
         # 验证签名
-        if not verify_signature(decrypted_msg, signature_data):
+        if not verify_signature(decrypted_msg, signature_data, recived_message.get("sig_suite"), registry):
             return {}
         
         # 将解密后的消息转换为字典
@@ -0,0 +1,323 @@
+"""Ctrl -> Node 异步通信传输层。
+
+与 node_transport 使用相同的签名/加密报文、会话通道和响应解析，基于 asyncio 原生连接实现 HTTP/1.1，
+不引入额外依赖：单个线程中即可维持数千个并发在途请求，供批量操作、巡检等扇出场景使用。
+同步接口（send_to_node 等）保持不变；同步代码可通过 run_node_requests 一次性跑完一批请求，
+其中发往同一台机器的多条请求会合并为一个 /batch 请求。
+"""
+
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Callable
+from urllib.parse import urlsplit
+
+from ..config import CommsConfig
+from .node_session import HANDSHAKE_ENDPOINT, SessionKey, handshake_payload, seal_session_message
+from .node_transport import (
+    BATCH_ENDPOINT, batch_chunk_size, batch_payload, batch_timeout, build_envelope, is_batch_unsupported,
+    mark_batch_unsupported, node_sessions, node_url, parse_node_response, sign_payload, split_batch_response,
+)
+
+
+class _ConnectError(Exception):
+    """连接阶段失败：请求尚未发出，重试是安全的。"""
+
+
+class _StaleConnection(ConnectionError):
+    """复用的空闲连接在收到任何响应字节之前就被关闭/重置：Node 没有处理该请求，可以换新连接重发。"""
+
+
+@dataclass
+class NodeRequest:
+    machine_ip: str
+    endpoint: str
+    payload: dict
+    timeout: float = 5.0
+    attempts: int = 1
+
+
+class AsyncNodeTransport:
+    """
+    按 host:port 维护 keep-alive 连接池的 asyncio Node 客户端。
+
+    - max_in_flight 限制全局并发在途请求数，pool_maxsize 限制每台机器保留的空闲连接数
+    - 与同步传输一致：只对连接失败按退避重试；请求已发出后的失败只在 attempts > 1 时重放
+    - 实例绑定创建它的事件循环，用完后调用 close()
+    """
+
+    def __init__(self, max_in_flight: int = 1000, pool_maxsize: int = 8,
+                 retry_total: int = 2, backoff_factor: float = 0.25):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.pool_maxsize = max(1, int(pool_maxsize))
+        self.retry_total = max(0, int(retry_total))
+        self.backoff_factor = float(backoff_factor)
+        self._idle: dict[tuple[str, int], list[tuple[asyncio.StreamReader, asyncio.StreamWriter]]] = {}
+        self._sem: asyncio.Semaphore | None = None
+        self.requests = 0
+        self.connections_opened = 0
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_in_flight)
+        return self._sem
+
+    async def _connect(self, host: str, port: int, timeout: float):
+        idle = self._idle.get((host, port))
+        while idle:
+            reader, writer = idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        for attempt in range(self.retry_total + 1):
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+                self.connections_opened += 1
+                return reader, writer, False
+            except (OSError, asyncio.TimeoutError) as e:
+                if attempt >= self.retry_total:
+                    raise _ConnectError(str(e) or type(e).__name__) from e
+                await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+
+    def _release(self, host: str, port: int, reader, writer) -> None:
+        idle = self._idle.setdefault((host, port), [])
+        if len(idle) < self.pool_maxsize and not reader.at_eof():
+            idle.append((reader, writer))
+        else:
+            writer.close()
+
+    @staticmethod
+    async def _read_response(reader: asyncio.StreamReader, status_line: bytes) -> tuple[int, bytes, bool]:
+        parts = status_line.decode('latin-1').split(None, 2)
+        status_code = int(parts[1])
+        keep_alive = parts[0].upper() == "HTTP/1.1"
+        headers: dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(":")
+            headers[name.strip().lower()] = value.strip()
+        conn = headers.get("connection", "").lower()
+        if conn == "close":
+            keep_alive = False
+        elif conn == "keep-alive":
+            keep_alive = True
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return status_code, body, keep_alive
+
+    async def _exchange(self, reader, writer, request: bytes) -> tuple[int, bytes, bool]:
+        try:
+            writer.write(request)
+            await writer.drain()
+            status_line = await reader.readline()
+        except ConnectionError as e:
+            raise _StaleConnection(str(e) or type(e).__name__) from e
+        if not status_line:
+            raise _StaleConnection("connection closed by node")
+        # 已收到响应的第一个字节：之后的任何失败都说明 Node 已经处理了请求，不能再重发
+        return await self._read_response(reader, status_line)
+
+    async def _post_once(self, url: str, body: dict, timeout: float) -> tuple[int, str]:
+        parts = urlsplit(url)
+        host, port = parts.hostname, parts.port or 80
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        data = json.dumps(body).encode('utf-8')
+        head = (
+            f"POST {path} HTTP/1.1\r\n"
+            f"Host: {parts.netloc}\r\n"
+            "Content-Type: application/json\r\n"
+            "Accept: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode('latin-1')
+
+        reader, writer, reused = await self._connect(host, port, timeout)
+        try:
+            status_code, raw, keep_alive = await asyncio.wait_for(self._exchange(reader, writer, head + data), timeout)
+        except _StaleConnection as e:
+            writer.close()
+            if reused:
+                # 复用的空闲连接在响应开始前已被 Node 关闭：请求未被处理，换新连接重发一次。
+                # 响应读到一半断开（IncompleteReadError 等）说明请求已被处理，直接向上抛出
+                return await self._post_once(url, body, timeout)
+            raise e
+        except BaseException:
+            writer.close()
+            raise
+        if keep_alive:
+            self._release(host, port, reader, writer)
+        else:
+            writer.close()
+        return status_code, raw.decode('utf-8', errors='replace')
+
+    async def send(self, url: str, ciphertext: bytes, sig: bytes, timeout: float = 5.0, attempts: int = 1) -> dict:
+        """与 NodeTransport.send 语义一致：返回解析后的响应，网络层错误返回 {"error": ...}。"""
+        return await self.send_body(url, build_envelope(ciphertext, sig), timeout=timeout, attempts=attempts)
+
+    async def send_body(self, url: str, body: dict | Callable[[], dict], timeout: float = 5.0, attempts: int = 1) -> dict:
+        """发送任意请求体；body 为可调用对象时每次尝试重新生成。"""
+        last_exc: BaseException | None = None
+        async with self._semaphore():
+            self.requests += 1
+            for attempt in range(max(1, attempts)):
+                try:
+                    status_code, text = await self._post_once(url, body() if callable(body) else body, timeout)
+                    return parse_node_response(status_code, text)
+                except (_ConnectError, OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                    last_exc = e
+                    print(f"Async request error (attempt {attempt+1}) to {url}: {e!r}")
+                    if attempt + 1 < attempts:
+                        await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+        if last_exc is None:
+            return {"error": "unknown error"}
+        return {"error": str(last_exc) or type(last_exc).__name__}
+
+    @staticmethod
+    async def _sign(payload: dict) -> tuple[bytes, bytes]:
+        """RSA 签名 + 加密是 CPU 密集操作，放到默认线程池执行，避免阻塞事件循环上的其它在途请求。"""
+        return await asyncio.get_running_loop().run_in_executor(None, sign_payload, payload)
+
+    async def _session_for(self, machine_ip: str, timeout: float) -> SessionKey | None:
+        current, pending = node_sessions.acquire(machine_ip)
+        if pending is None:
+            return current
+        res = None
+        try:
+            enc, sig = await self._sign(handshake_payload(pending))
+            res = await self.send(node_url(machine_ip, HANDSHAKE_ENDPOINT), enc, sig, timeout=timeout)
+        finally:
+            installed = node_sessions.complete(machine_ip, pending, res)
+        return installed or current
+
+    async def send_to_node(self, machine_ip: str, endpoint: str, payload: dict,
+                           timeout: float = 5.0, attempts: int = 1) -> dict:
+        """对 payload 做签名 + 加密后发送到指定 Node 接口（异步版 send_to_node，会话通道逻辑相同）。"""
+        url = node_url(machine_ip, endpoint)
+        if CommsConfig.NODE_SESSION_ENABLED:
+            session = await self._session_for(machine_ip, timeout)
+            if session is not None:
+                res = await self.send_body(url, lambda: seal_session_message(session, payload),
+                                           timeout=timeout, attempts=attempts)
+                if not node_sessions.is_rejected(res):
+                    node_sessions.note_sent(True)
+                    return res
+                node_sessions.invalidate(machine_ip, session)
+            node_sessions.note_sent(False)
+        enc, sig = await self._sign(payload)
+        return await self.send(url, enc, sig, timeout=timeout, attempts=attempts)
+
+    async def _send_each(self, machine_ip: str, commands: list[tuple[str, dict]], timeout: float,
+                         attempts: int) -> list[dict]:
+        async def _one(cmd) -> dict:
+            try:
+                return await self.send_to_node(machine_ip, cmd[0], cmd[1], timeout=timeout, attempts=attempts)
+            except Exception as e:
+                return {"error": str(e)}
+        return list(await asyncio.gather(*(_one(c) for c in commands)))
+
+    async def send_batch(self, machine_ip: str, commands: list[tuple[str, dict]], timeout: float = 5.0,
+                         attempts: int = 1) -> list[dict]:
+        """异步版 send_batch_to_node：同一台机器的多条命令合并为 /batch 请求，分块之间并发。"""
+        if not commands:
+            return []
+        if len(commands) == 1 or not CommsConfig.NODE_BATCH_ENABLED or is_batch_unsupported(machine_ip):
+            return await self._send_each(machine_ip, commands, timeout, attempts)
+
+        async def _chunk(chunk) -> list[dict]:
+            res = await self.send_to_node(machine_ip, BATCH_ENDPOINT, batch_payload(chunk),
+                                          timeout=batch_timeout(timeout, len(chunk)), attempts=attempts)
+            results = split_batch_response(res, len(chunk))
+            if results is None:
+                print(f"send_batch: node {machine_ip} has no batch endpoint, falling back")
+                mark_batch_unsupported(machine_ip)
+                results = await self._send_each(machine_ip, chunk, timeout, attempts)
+            return results
+
+        size = batch_chunk_size(commands)
+        chunks = [commands[i:i + size] for i in range(0, len(commands), size)]
+        return [r for part in await asyncio.gather(*(_chunk(c) for c in chunks)) for r in part]
+
+    async def send_many(self, requests: list[NodeRequest]) -> list[dict]:
+        """
+        并发发送一批请求，结果顺序与输入一致；单个请求的异常转换为 {"error": ...}。
+        发往同一台机器（且超时/重试参数相同）的多条请求合并为一个 /batch 请求。
+        """
+        groups: dict[tuple[str, float, int], list[int]] = {}
+        for i, r in enumerate(requests):
+            groups.setdefault((r.machine_ip, r.timeout, r.attempts), []).append(i)
+
+        out: list[dict] = [{}] * len(requests)
+
+        async def _group(key, indexes):
+            machine_ip, timeout, attempts = key
+            try:
+                results = await self.send_batch(
+                    machine_ip, [(requests[i].endpoint, requests[i].payload) for i in indexes],
+                    timeout=timeout, attempts=attempts,
+                )
+            except Exception as e:
+                results = [{"error": str(e)} for _ in indexes]
+            for i, res in zip(indexes, results):
+                out[i] = res
+
+        await asyncio.gather(*(_group(k, v) for k, v in groups.items()))
+        return out
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for _, writer in conns:
+                writer.close()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "idle_connections": sum(len(v) for v in self._idle.values()),
+            "max_in_flight": self.max_in_flight,
+            "pool_maxsize": self.pool_maxsize,
+        }
+
+
+def new_async_transport(max_in_flight: int | None = None) -> AsyncNodeTransport:
+    return AsyncNodeTransport(
+        max_in_flight=max_in_flight or CommsConfig.NODE_ASYNC_MAX_IN_FLIGHT,
+        pool_maxsize=CommsConfig.NODE_POOL_MAXSIZE,
+        retry_total=CommsConfig.NODE_RETRY_TOTAL,
+        backoff_factor=CommsConfig.NODE_RETRY_BACKOFF,
+    )
+
+
+def run_node_requests(requests: list[NodeRequest], max_in_flight: int | None = None) -> list[dict]:
+    """
+    同步入口：在一个新的事件循环中并发完成一批 Node 请求后返回（顺序与输入一致）。
+    供后台线程中的巡检、批量操作使用；不能在已运行的事件循环中调用。
+    """
+    if not requests:
+        return []
+
+    async def _run():
+        transport = new_async_transport(max_in_flight)
+        try:
+            return await transport.send_many(requests)
+        finally:
+            await transport.close()
+
+    return asyncio.run(_run())
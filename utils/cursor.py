@@ -0,0 +1,25 @@
+import base64
+import json
+
+
+def encode_cursor(kind: str, last_id: int) -> str:
+    """
+    列表接口返回给客户端的不透明游标：记录本页最后一行的 id（keyset 分页），
+    kind 区分不同列表，避免把容器列表的游标用到机器列表上。
+    """
+    raw = json.dumps({"k": kind, "id": int(last_id)}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(kind: str, cursor: str | None) -> int | None:
+    """解析游标，返回上一页最后一行的 id；cursor 为空表示第一页。格式错误时抛出 ValueError。"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if data.get("k") != kind:
+            raise ValueError("cursor kind mismatch")
+        return int(data["id"])
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {e}") from e
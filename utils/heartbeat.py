@@ -1,307 +1,483 @@
+import heapq
+import itertools
 import threading
 import time
-import json
-import base64
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
 
 from ..config import CommsConfig
-from ..utils.CheckKeys import signature, encryption
-from ..repositories.containers_repo import update_container, list_containers as repo_list_containers
+
+from ..utils.node_transport import send_to_node, send_batch_to_node
+from ..utils.status_cache import container_status_cache
+from ..repositories.containers_repo import (
+    update_container,
+    list_containers as repo_list_containers,
+    transition_machine_containers,
+    set_containers_status,
+)
 from ..repositories.machine_repo import get_by_id as get_machine_by_id, update_machine
 from ..constant import ContainerStatus, MachineStatus
 from flask import current_app
 
 
+def _as_heartbeat_result(res):
+    """
+    保持原 send 的 raise_for_status 语义：Node 返回 4xx/5xx 时视为错误（{"error": ...}），
+    心跳据此继续轮询而不是误读响应内容；status_code / error_reason 保留以便排查。
+    """
+    if isinstance(res, dict) and 'error' not in res:
+        try:
+            code = int(res.get('status_code') or 0)
+        except (TypeError, ValueError):
+            code = 0
+        if code >= 400:
+            reason = res.get('error_reason')
+            out = {"error": f"{code} Error from node" + (f": {reason}" if reason else ""), "status_code": code}
+            if reason:
+                out["error_reason"] = reason
+            return out
+    return res
+
+
 def send(machine_ip: str, endpoint: str, payload: dict, timeout: float = 5.0):
-    url = f"http://{machine_ip}{CommsConfig.NODE_URL_MIDDLE}{endpoint}"
-    body = json.dumps(payload)
-    sig = signature(body)
-    enc = encryption(body)
     try:
-        resp = requests.post(url, json={
-            "message": base64.b64encode(enc).decode('utf-8'),
-            "signature": base64.b64encode(sig).decode('utf-8')
-        }, timeout=timeout)
-        resp.raise_for_status()
-        try:
-            return resp.json()
-        except ValueError:
-            return {"text": resp.text, "status_code": resp.status_code}
+        return _as_heartbeat_result(send_to_node(machine_ip, endpoint, payload, timeout=timeout))
     except Exception as e:
         return {"error": str(e)}
 
 
-def container_starting_status_heartbeat(machine_ip: str, container_name: str, container_id: int | None = None,
-                                     timeout: int = 180, interval: int = 3):
-    """
-    以background thread的方式定期向远程机器发送请求查询容器状态，直到收到容器在线或失败的状态，或者超时。
-    当状态变为RUNNING时，更新数据库中的容器记录（如果提供了container_id）并停止。
-    """
-    # capture Flask app if available so background thread can use its app_context
-    app = None
+def send_batch(machine_ip: str, commands: list[tuple[str, dict]], timeout: float = 5.0) -> list[dict]:
+    """同一台机器的多条命令合并为一次 /batch 请求；只有一条时与 send 相同。"""
+    if len(commands) == 1:
+        endpoint, payload = commands[0]
+        return [send(machine_ip, endpoint, payload, timeout=timeout)]
     try:
-        app = current_app._get_current_object()
+        return [_as_heartbeat_result(r) for r in send_batch_to_node(machine_ip, commands, timeout=timeout)]
+    except Exception as e:
+        return [{"error": str(e)} for _ in commands]
+
+
+def _current_app_or_none():
+    # capture Flask app if available so background workers can use its app_context
+    try:
+        return current_app._get_current_object()
     except RuntimeError:
-        app = None
+        return None
 
-    def _worker():
-        start = time.time()
-        while time.time() - start < timeout:
-            print(f"Heartbeat check for container '{container_name}' at {machine_ip}...")
-            payload = {"config": {"container_name": container_name}}
-            res = send(machine_ip, "/container_status", payload, timeout=5.0)
-            if isinstance(res, dict) and 'container_status' in res:
-                st = res.get('container_status')
-                print(f"Received container_status: {st}")
-                # if remote reports a creation failure, mark local container as FAILED and stop
-                if res.get('container_status') == 'failed' or res.get('error_reason'):
-                    try:
-                        if container_id is not None:
-                            if app is not None:
-                                with app.app_context():
-                                    update_container(container_id, container_status=ContainerStatus.FAILED)
-                            else:
-                                update_container(container_id, container_status=ContainerStatus.FAILED)
-                    except Exception as e:
-                        print(f"Error updating container status to FAILED: {e}")
-                    return
-                if isinstance(st, str) and st.lower() == 'online':
-                    if container_id is not None:
-                        try:
-                            if app is not None:
-                                with app.app_context():
-                                    update_container(container_id, container_status=ContainerStatus.ONLINE)
-                            else:
-                                update_container(container_id, container_status=ContainerStatus.ONLINE)
-                        except Exception as e:
-                            print(f"Error updating container status: {e}")
-                    return
-            time.sleep(interval)
-
-    t = threading.Thread(target=_worker, daemon=True)
-    t.start()
-    return t
+
+class ContainerWatch:
+    """一个待收敛的容器状态观察项：轮询直到 target 状态、FAILED 或超时。"""
+
+    def __init__(self, machine_ip: str, container_name: str, container_id: int | None,
+                 target: ContainerStatus, timeout: float, interval: float, label: str, app=None,
+                 machine_id: int | None = None):
+        self.machine_ip = machine_ip
+        self.machine_id = machine_id
+        self.container_name = container_name
+        self.container_id = container_id
+        self.target = target
+        self.interval = interval
+        self.deadline = time.time() + timeout
+        self.label = label
+        self.app = app
+        self.done = threading.Event()
+        self.result: ContainerStatus | None = None
+
+    def _update_db(self, status: ContainerStatus):
+        if self.container_id is None:
+            return
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    update_container(self.container_id, container_status=status)
+            else:
+                update_container(self.container_id, container_status=status)
+        except Exception as e:
+            print(f"Error updating container status to {status.value}: {e}")
+
+    def handle(self, res) -> bool:
+        """处理一次 /container_status 结果，返回 True 表示该观察项已结束。"""
+        if not (isinstance(res, dict) and 'container_status' in res):
+            return False
+        st = res.get('container_status')
+        print(f"Received container_status ({self.label}): {st}")
+        # if remote reports a failure, mark local container as FAILED and stop
+        if st == 'failed' or res.get('error_reason'):
+            self._update_db(ContainerStatus.FAILED)
+            self.result = ContainerStatus.FAILED
+            return True
+        if isinstance(st, str) and st.lower() == self.target.value:
+            self._update_db(self.target)
+            self.result = self.target
+            return True
+        return False
+
+
+class HeartbeatEngine:
+    """
+    统一的容器状态心跳调度器。
+
+    所有观察项放在按下次轮询时间排序的优先队列中，由单个调度线程取出到期项，
+    按机器分组后交给有界线程池：同一台机器同一时刻只有一个轮询任务，
+    因此线程数与正在过渡的容器数量无关。
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max(1, int(max_workers))
+        self._heap: list[tuple[float, int, ContainerWatch]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._busy_machines: set[str] = set()
+        self._active = 0
+        self._executor: ThreadPoolExecutor | None = None
+        self._thread: threading.Thread | None = None
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="heartbeat")
+        self._thread = threading.Thread(target=self._run, daemon=True, name="heartbeat-scheduler")
+        self._thread.start()
+
+    def submit(self, watch: ContainerWatch, delay: float = 0.0) -> ContainerWatch:
+        with self._cond:
+            self._active += 1
+            heapq.heappush(self._heap, (time.time() + delay, next(self._seq), watch))
+            self._ensure_started()
+            self._cond.notify()
+        return watch
+
+    def _reschedule(self, watch: ContainerWatch, delay: float):
+        with self._cond:
+            heapq.heappush(self._heap, (time.time() + delay, next(self._seq), watch))
+            self._cond.notify()
+
+    def _finish(self, watch: ContainerWatch):
+        with self._cond:
+            self._active -= 1
+        watch.done.set()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.time():
+                    timeout = (self._heap[0][0] - time.time()) if self._heap else None
+                    self._cond.wait(timeout)
+                now = time.time()
+                due: dict[str, list[ContainerWatch]] = {}
+                deferred: list[ContainerWatch] = []
+                while self._heap and self._heap[0][0] <= now:
+                    _, _, w = heapq.heappop(self._heap)
+                    if w.machine_ip in self._busy_machines:
+                        deferred.append(w)
+                        continue
+                    due.setdefault(w.machine_ip, []).append(w)
+                for w in deferred:
+                    heapq.heappush(self._heap, (now + w.interval, next(self._seq), w))
+                for machine_ip in due:
+                    self._busy_machines.add(machine_ip)
+            for machine_ip, watches in due.items():
+                self._executor.submit(self._poll_machine, machine_ip, watches)
+
+    def _poll_machine(self, machine_ip: str, watches: list[ContainerWatch]):
+        try:
+            live = []
+            for w in watches:
+                if time.time() > w.deadline:
+                    self._finish(w)
+                else:
+                    live.append(w)
+            if not live:
+                return
+            print(f"Heartbeat check for {len(live)} container(s) at {machine_ip}...")
+            # 同一台机器到期的观察项合并为一次批量查询
+            results = send_batch(
+                machine_ip,
+                [("/container_status", {"config": {"container_name": w.container_name}}) for w in live],
+                timeout=5.0,
+            )
+            for w, res in zip(live, results):
+                # 心跳结果顺带写入共享状态缓存，详情/列表接口可直接复用
+                if w.machine_id is not None:
+                    container_status_cache.put(w.machine_id, w.container_name, res, from_heartbeat=True)
+                try:
+                    finished = w.handle(res)
+                except Exception as e:
+                    print(f"Heartbeat ({w.label}) error for '{w.container_name}': {e}")
+                    finished = False
+                if finished:
+                    self._finish(w)
+                else:
+                    self._reschedule(w, w.interval)
+        finally:
+            with self._cond:
+                self._busy_machines.discard(machine_ip)
+                self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "active_watches": self._active,
+                "queued": len(self._heap),
+                "busy_machines": len(self._busy_machines),
+                "max_workers": self.max_workers,
+            }
+
+
+heartbeat_engine = HeartbeatEngine(max_workers=CommsConfig.HEARTBEAT_MAX_WORKERS)
+
+
+def container_starting_status_heartbeat(machine_ip: str, container_name: str, container_id: int | None = None,
+                                     timeout: int = 180, interval: int = 3, machine_id: int | None = None):
+    """
+    向心跳调度器登记观察项，定期查询容器状态，直到收到容器在线或失败的状态，或者超时。
+    当状态变为ONLINE时，更新数据库中的容器记录（如果提供了container_id）并停止。
+    """
+    watch = ContainerWatch(machine_ip, container_name, container_id, ContainerStatus.ONLINE,
+                           timeout, interval, "start", app=_current_app_or_none(), machine_id=machine_id)
+    return heartbeat_engine.submit(watch)
 
 
 def container_stopping_status_heartbeat(machine_ip: str, container_name: str, container_id: int | None = None,
-                                      timeout: int = 180, interval: int = 3):
+                                      timeout: int = 180, interval: int = 3, machine_id: int | None = None):
     """
     Heartbeat for stop action: initial state 'stoping', terminal state 'offline'.
     """
-    app = None
-    try:
-        app = current_app._get_current_object()
-    except RuntimeError:
-        app = None
-
-    def _worker():
-        start = time.time()
-        while time.time() - start < timeout:
-            print(f"Stop-heartbeat check for '{container_name}' at {machine_ip}...")
-            payload = {"config": {"container_name": container_name}}
-            res = send(machine_ip, "/container_status", payload, timeout=5.0)
-            if isinstance(res, dict) and 'container_status' in res:
-                st = res.get('container_status')
-                print(f"Received container_status (stop): {st}")
-                if res.get('container_status') == 'failed' or res.get('error_reason'):
-                    try:
-                        if container_id is not None:
-                            if app is not None:
-                                with app.app_context():
-                                    update_container(container_id, container_status=ContainerStatus.FAILED)
-                            else:
-                                update_container(container_id, container_status=ContainerStatus.FAILED)
-                    except Exception as e:
-                        print(f"Error updating container status to FAILED: {e}")
-                    return
-                if isinstance(st, str) and st.lower() == 'offline':
-                    if container_id is not None:
-                        try:
-                            if app is not None:
-                                with app.app_context():
-                                    update_container(container_id, container_status=ContainerStatus.OFFLINE)
-                            else:
-                                update_container(container_id, container_status=ContainerStatus.OFFLINE)
-                        except Exception as e:
-                            print(f"Error updating container status: {e}")
-                    return
-            time.sleep(interval)
-
-    t = threading.Thread(target=_worker, daemon=True)
-    t.start()
-    return t
+    watch = ContainerWatch(machine_ip, container_name, container_id, ContainerStatus.OFFLINE,
+                           timeout, interval, "stop", app=_current_app_or_none(), machine_id=machine_id)
+    return heartbeat_engine.submit(watch)
 
 
 def container_restart_status_heartbeat(machine_ip: str, container_name: str, container_id: int | None = None,
-                                       timeout: int = 180, interval: int = 3):
+                                       timeout: int = 180, interval: int = 3, machine_id: int | None = None):
     """
     Heartbeat for restart action: initial 'stoping' then terminal 'online'.
     """
-    app = None
-    try:
-        app = current_app._get_current_object()
-    except RuntimeError:
-        app = None
+    watch = ContainerWatch(machine_ip, container_name, container_id, ContainerStatus.ONLINE,
+                           timeout, interval, "restart", app=_current_app_or_none(), machine_id=machine_id)
+    return heartbeat_engine.submit(watch)
 
-    def _worker():
-        start = time.time()
-        while time.time() - start < timeout:
-            print(f"Restart-heartbeat check for '{container_name}' at {machine_ip}...")
-            payload = {"config": {"container_name": container_name}}
-            res = send(machine_ip, "/container_status", payload, timeout=5.0)
-            if isinstance(res, dict) and 'container_status' in res:
-                st = res.get('container_status')
-                print(f"Received container_status (restart): {st}")
-                if res.get('container_status') == 'failed' or res.get('error_reason'):
-                    try:
-                        if container_id is not None:
-                            if app is not None:
-                                with app.app_context():
-                                    update_container(container_id, container_status=ContainerStatus.FAILED)
-                            else:
-                                update_container(container_id, container_status=ContainerStatus.FAILED)
-                    except Exception as e:
-                        print(f"Error updating container status to FAILED: {e}")
-                    return
-                if isinstance(st, str) and st.lower() == 'online':
-                    if container_id is not None:
-                        try:
-                            if app is not None:
-                                with app.app_context():
-                                    update_container(container_id, container_status=ContainerStatus.ONLINE)
-                            else:
-                                update_container(container_id, container_status=ContainerStatus.ONLINE)
-                        except Exception as e:
-                            print(f"Error updating container status: {e}")
-                    return
-            time.sleep(interval)
-
-    t = threading.Thread(target=_worker, daemon=True)
+
+class MaintenanceTransition:
+    """
+    一次 ONLINE -> MAINTENANCE 过渡的进度：总容器数、已停止/失败数量、当前阶段。
+    由过渡线程更新，本进程通过 get_maintenance_progress 读取快照；
+    on_change 在每次变化后收到新快照（任务队列用它把进度写入 jobs 表，供其它 worker 读取）。
+    """
+
+    def __init__(self, machine_id: int, timeout: float, on_change: Callable[[dict], None] | None = None):
+        self.machine_id = machine_id
+        self.on_change = on_change
+        self.timeout = timeout
+        self.started_at = time.time()
+        self.finished_at: float | None = None
+        self.phase = "pending"  # pending -> stopping -> polling -> done
+        self.total = 0
+        self.stopped: set[int] = set()
+        self.failed: set[int] = set()
+        self.polls = 0
+        self.result: MachineStatus | None = None
+        self._lock = threading.Lock()
+
+    def _changed(self):
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(self.snapshot())
+        except Exception as e:
+            print(f"[maintenance] failed to publish progress for machine {self.machine_id}: {e}")
+
+    def update(self, **fields):
+        with self._lock:
+            for k, v in fields.items():
+                setattr(self, k, v)
+        self._changed()
+
+    def settle(self, stopped=(), failed=()):
+        with self._lock:
+            self.stopped.update(stopped)
+            self.failed.update(failed)
+        self._changed()
+
+    def finish(self, result: MachineStatus):
+        with self._lock:
+            self.phase = "done"
+            self.result = result
+            self.finished_at = time.time()
+        self._changed()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "machine_id": self.machine_id,
+                "phase": self.phase,
+                "total": self.total,
+                "stopped": len(self.stopped),
+                "failed": len(self.failed),
+                "remaining": max(0, self.total - len(self.stopped) - len(self.failed)),
+                "polls": self.polls,
+                "started_at": self.started_at,
+                "elapsed": (self.finished_at or time.time()) - self.started_at,
+                "timeout": self.timeout,
+                "result": self.result.value if self.result else None,
+            }
+
+
+_maintenance_lock = threading.Lock()
+_maintenance_transitions: dict[int, MaintenanceTransition] = {}
+
+
+def get_maintenance_progress(machine_id: int) -> dict | None:
+    """返回机器最近一次维护过渡的进度快照（n of N stopped），没有记录时返回 None。"""
+    with _maintenance_lock:
+        tr = _maintenance_transitions.get(machine_id)
+    return tr.snapshot() if tr else None
+
+
+def start_machine_maintenance_transition_heartbeat(machine_id: int, timeout: int = 180, interval: int = 3):
+    """在后台线程中执行 run_machine_maintenance_transition。"""
+    app = _current_app_or_none()
+    t = threading.Thread(target=run_machine_maintenance_transition, args=(machine_id, timeout, interval, app),
+                         daemon=True, name=f"maintenance-{machine_id}")
     t.start()
     return t
 
 
-def start_machine_maintenance_transition_heartbeat(machine_id: int, timeout: int = 180, interval: int = 3):
+def run_machine_maintenance_transition(machine_id: int, timeout: int = 180, interval: int = 3, app=None,
+                                       on_progress: Callable[[dict], None] | None = None) -> MachineStatus:
     """
-    Ctrl-side transition worker for ONLINE -> MAINTENANCE.
-    1) Send stop requests to containers on the machine.
-    2) Poll each container status and update DB until all OFFLINE (or FAILED).
+    Ctrl-side transition worker for ONLINE -> MAINTENANCE (blocking).
+    1) Send stop requests to all non-offline containers concurrently.
+    2) Poll only the containers that have not converged yet, with one batched
+       /containers_status call per pass, until all OFFLINE (or FAILED).
     3) Set machine status to MAINTENANCE when converged; if node unreachable, mark OFFLINE.
+    Progress is tracked in a MaintenanceTransition, see get_maintenance_progress();
+    on_progress, if given, receives every progress snapshot.
+    Returns the final machine status.  app 为 None 时要求调用方已处于 app context。
     """
-    app = None
-    try:
-        app = current_app._get_current_object()
-    except RuntimeError:
-        app = None
+    # container_tasks 依赖本模块，批量状态查询在此处延迟导入
+    from ..services.container_tasks import get_containers_status
+
+    progress = MaintenanceTransition(machine_id, timeout, on_change=on_progress)
+    with _maintenance_lock:
+        _maintenance_transitions[machine_id] = progress
+
+    def _in_ctx(fn, *args, **kwargs):
+        if app is not None:
+            with app.app_context():
+                return fn(*args, **kwargs)
+        return fn(*args, **kwargs)
 
     def _db_update_machine(mid: int, status: MachineStatus):
         try:
-            if app is not None:
-                with app.app_context():
-                    update_machine(mid, machine_status=status)
-            else:
-                update_machine(mid, machine_status=status)
+            _in_ctx(update_machine, mid, machine_status=status)
         except Exception:
             pass
 
-    def _db_update_container(cid: int, status: ContainerStatus):
+    def _db_transition_containers(from_statuses, status: ContainerStatus):
         try:
-            if app is not None:
-                with app.app_context():
-                    update_container(cid, container_status=status)
-            else:
-                update_container(cid, container_status=status)
+            _in_ctx(transition_machine_containers, machine_id, status, from_statuses=from_statuses)
         except Exception:
             pass
 
+    def _db_set_containers_status(cids, status: ContainerStatus):
+        if not cids:
+            return
+        try:
+            _in_ctx(set_containers_status, cids, status)
+        except Exception:
+            pass
+
+    def _finish(status: MachineStatus):
+        _db_update_machine(machine_id, status)
+        progress.finish(status)
+        return status
+
     def _worker():
         start_ts = time.time()
-        while True:
-            if time.time() - start_ts > timeout:
-                break
+        try:
+            m = _in_ctx(get_machine_by_id, machine_id)
+        except Exception:
+            m = None
+        if not m:
+            progress.finish(MachineStatus.OFFLINE)
+            return MachineStatus.OFFLINE
 
-            try:
-                if app is not None:
-                    with app.app_context():
-                        m = get_machine_by_id(machine_id)
-                else:
-                    m = get_machine_by_id(machine_id)
-            except Exception:
-                m = None
-            if not m:
-                return
+        machine_ip = getattr(m, 'machine_ip', None)
+        if not machine_ip:
+            return _finish(MachineStatus.OFFLINE)
 
-            machine_ip = getattr(m, 'machine_ip', None)
-            if not machine_ip:
-                _db_update_machine(machine_id, MachineStatus.OFFLINE)
-                return
+        try:
+            containers = _in_ctx(lambda: [
+                (c.id, c.name, str(getattr(c.container_status, 'value', c.container_status)).lower())
+                for c in repo_list_containers(limit=10000, offset=0, machine_id=machine_id)
+            ])
+        except Exception:
+            containers = []
+        progress.update(total=len(containers))
 
-            try:
-                if app is not None:
-                    with app.app_context():
-                        containers = repo_list_containers(limit=10000, offset=0, machine_id=machine_id)
-                else:
-                    containers = repo_list_containers(limit=10000, offset=0, machine_id=machine_id)
-            except Exception:
-                containers = []
+        if not containers:
+            return _finish(MachineStatus.MAINTENANCE)
 
-            if not containers:
-                _db_update_machine(machine_id, MachineStatus.MAINTENANCE)
-                return
+        # 已经 OFFLINE 的容器直接视为收敛，其余批量下发 stop（best-effort）
+        pending = {cid: name for cid, name, st in containers if st != ContainerStatus.OFFLINE.value}
+        progress.settle(stopped=[cid for cid, _, st in containers if st == ContainerStatus.OFFLINE.value])
+        progress.update(phase="stopping")
+        if pending:
+            # 批量报文下发全部 stop；结果不在这里判断，由下面的轮询确认收敛。
+            # timeout 为单条命令的超时，send_batch_to_node 按块大小放宽每个 /batch 请求的超时
+            send_batch(machine_ip,
+                       [("/stop_container", {"config": {"container_name": name}}) for name in pending.values()],
+                       timeout=3.0)
+            # 一条 UPDATE 把所有非 OFFLINE 容器置为 STOPPING
+            _db_transition_containers(
+                [s for s in ContainerStatus if s not in (ContainerStatus.OFFLINE, ContainerStatus.STOPPING)],
+                ContainerStatus.STOPPING,
+            )
 
-            # send stop command best-effort to non-offline containers
-            for c in containers:
-                c_status = c.container_status.value if hasattr(c.container_status, 'value') else str(c.container_status)
-                if str(c_status).lower() == ContainerStatus.OFFLINE.value:
-                    continue
-                send(machine_ip, "/stop_container", {"config": {"container_name": c.name}}, timeout=3.0)
-                _db_update_container(c.id, ContainerStatus.STOPPING)
+        # 只轮询尚未到达终态的容器，每轮一次批量查询
+        progress.update(phase="polling")
+        while pending and time.time() - start_ts <= timeout:
+            try:
+                results = get_containers_status(machine_ip, list(pending.values()), timeout=3.0)
+            except Exception as e:
+                print(f"Maintenance transition poll failed for machine {machine_id}: {e}")
+                results = {}
+            progress.update(polls=progress.polls + 1)
+            for name, res in results.items():
+                container_status_cache.put(machine_id, name, res, from_heartbeat=True)
 
-            # poll statuses
-            all_done = True
-            for c in containers:
-                res = send(machine_ip, "/container_status", {"config": {"container_name": c.name}}, timeout=3.0)
+            offline_ids, failed_ids = [], []
+            for cid, name in list(pending.items()):
+                res = results.get(name)
                 if isinstance(res, dict) and res.get('status_code') == 404:
-                    _db_update_container(c.id, ContainerStatus.OFFLINE)
+                    offline_ids.append(cid)
                     continue
-                if isinstance(res, dict) and res.get('error'):
-                    all_done = False
+                if not isinstance(res, dict) or res.get('error'):
                     continue
-                st = (res.get('container_status') if isinstance(res, dict) else None) or ''
-                st = str(st).lower()
+                st = str(res.get('container_status') or '').lower()
                 if st == ContainerStatus.OFFLINE.value:
-                    _db_update_container(c.id, ContainerStatus.OFFLINE)
+                    offline_ids.append(cid)
                 elif st == ContainerStatus.FAILED.value:
-                    _db_update_container(c.id, ContainerStatus.FAILED)
-                else:
-                    all_done = False
+                    failed_ids.append(cid)
+            # 每种终态一条 UPDATE
+            _db_set_containers_status(offline_ids, ContainerStatus.OFFLINE)
+            _db_set_containers_status(failed_ids, ContainerStatus.FAILED)
+            for cid in offline_ids + failed_ids:
+                pending.pop(cid, None)
+            progress.settle(stopped=offline_ids, failed=failed_ids)
 
-            if all_done:
-                _db_update_machine(machine_id, MachineStatus.MAINTENANCE)
-                return
+            if pending:
+                time.sleep(interval)
 
-            time.sleep(interval)
+        if not pending:
+            return _finish(MachineStatus.MAINTENANCE)
 
         # timeout fallback
-        m2 = None
-        try:
-            if app is not None:
-                with app.app_context():
-                    m2 = get_machine_by_id(machine_id)
-            else:
-                m2 = get_machine_by_id(machine_id)
-        except Exception:
-            m2 = None
-
-        machine_ip = getattr(m2, 'machine_ip', None) if m2 else None
-        if not machine_ip:
-            _db_update_machine(machine_id, MachineStatus.OFFLINE)
-            return
         check = send(machine_ip, "/machine_status", {"config": {}}, timeout=2.0)
         ms = (check.get('machine_status') if isinstance(check, dict) else '') or ''
         ok = isinstance(check, dict) and check.get('success') in (1, True) and str(ms).lower() == MachineStatus.ONLINE.value
-        _db_update_machine(machine_id, MachineStatus.MAINTENANCE if ok else MachineStatus.OFFLINE)
+        return _finish(MachineStatus.MAINTENANCE if ok else MachineStatus.OFFLINE)
 
-    t = threading.Thread(target=_worker, daemon=True)
-    t.start()
-    return t
+    return _worker()
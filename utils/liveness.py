@@ -0,0 +1,43 @@
+import threading
+import time
+
+
+class LivenessTable:
+    """
+    机器存活表：由后台存活监控写入，列表接口只读。
+    每台机器记录最近一次探测结果、探测时间、最近一次在线时间以及探测耗时。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[int, dict] = {}
+
+    def record(self, machine_id: int, online: bool, latency: float, probed_at: float | None = None) -> bool:
+        """写入一次探测结果，返回在线状态相对上一次是否发生变化（首次记录视为变化）。"""
+        now = probed_at if probed_at is not None else time.time()
+        with self._lock:
+            prev = self._entries.get(machine_id)
+            entry = {
+                "online": bool(online),
+                "last_probe": now,
+                "last_seen": now if online else (prev or {}).get("last_seen"),
+                "latency": latency,
+            }
+            self._entries[machine_id] = entry
+            return prev is None or prev["online"] != entry["online"]
+
+    def get(self, machine_id: int) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(machine_id)
+            return dict(entry) if entry else None
+
+    def forget(self, machine_id: int) -> None:
+        with self._lock:
+            self._entries.pop(machine_id, None)
+
+    def snapshot(self) -> dict[int, dict]:
+        with self._lock:
+            return {mid: dict(e) for mid, e in self._entries.items()}
+
+
+liveness_table = LivenessTable()
@@ -0,0 +1,275 @@
+"""Ctrl <-> Node 会话密钥通道。
+
+默认的报文（CheckKeys.encryption + signature）每条消息都要做一次 RSA-OAEP 加密和一次 RSA-PSS 签名。
+会话模式下，Ctrl 先用原有 RSA 报文向 Node 的 /session_handshake 下发一个短期 AES-256 会话密钥，
+之后发往该 Node 的消息只做 AES-GCM 加密（GCM 自带认证，防篡改），不再涉及 RSA：
+
+    {"session_id": "...", "nonce": base64, "message": base64(AES-GCM(key, nonce, plaintext, aad=session_id))}
+
+nonce = 4 字节会话随机前缀 + 8 字节递增计数器，接收方按计数器做滑动窗口防重放。
+握手本身带签名的绝对签发时间与到期时间，Node 拒绝过期的握手和已知的 session_id（到期前一直保留记录），
+重放截获的握手报文既不能重新安装会话，也不能重置计数器窗口。两端时钟偏差需在 max_clock_skew 以内。
+会话到期前自动轮换；Node 不支持握手（404）或拒绝会话（error_reason=invalid_session）时，
+退回到原有 RSA 报文，保证与旧版 Node 兼容。
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+HANDSHAKE_ENDPOINT = "/session_handshake"
+# Node 拒绝会话消息时返回的 error_reason；Ctrl 收到后丢弃会话并用 RSA 报文重发
+SESSION_REJECT_REASONS = ("invalid_session", "session_expired")
+# GCM 同一密钥下的消息数上限远大于此，这里只是为了让长时间高频轮询的会话也会定期轮换
+MAX_MESSAGES_PER_SESSION = 1 << 24
+
+
+class SessionError(Exception):
+    """接收方校验会话消息失败；reason 为返回给对端的 error_reason。"""
+
+    def __init__(self, message: str, reason: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+@dataclass
+class SessionKey:
+    session_id: str
+    key: bytes
+    expires_at: float
+    nonce_prefix: bytes = field(default_factory=lambda: os.urandom(4))
+    counter: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @classmethod
+    def generate(cls, ttl: float) -> "SessionKey":
+        return cls(session_id=uuid.uuid4().hex, key=AESGCM.generate_key(bit_length=256),
+                   expires_at=time.time() + ttl)
+
+    def next_nonce(self) -> bytes:
+        with self._lock:
+            self.counter += 1
+            return self.nonce_prefix + self.counter.to_bytes(8, "big")
+
+    def usable(self, margin: float = 0.0) -> bool:
+        return time.time() + margin < self.expires_at and self.counter < MAX_MESSAGES_PER_SESSION
+
+
+def handshake_payload(session: SessionKey) -> dict:
+    """
+    通过 RSA 报文发往 /session_handshake 的内容。issued_at / expires_at 为绝对时间（秒），
+    随报文一起签名，Node 据此拒绝被截获后重放的旧握手；ttl 为相对时间，两者取先到者。
+    """
+    now = time.time()
+    return {
+        "config": {
+            "session_id": session.session_id,
+            "session_key": base64.b64encode(session.key).decode('utf-8'),
+            "ttl": max(1, int(session.expires_at - now)),
+            "issued_at": now,
+            "expires_at": session.expires_at,
+        }
+    }
+
+
+def seal_session_message(session: SessionKey, payload: dict | str | bytes) -> dict:
+    """用会话密钥加密一条消息，返回可直接 POST 的请求体。"""
+    if isinstance(payload, dict):
+        payload = json.dumps(payload)
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    nonce = session.next_nonce()
+    ct = AESGCM(session.key).encrypt(nonce, payload, session.session_id.encode())
+    return {
+        "session_id": session.session_id,
+        "nonce": base64.b64encode(nonce).decode('utf-8'),
+        "message": base64.b64encode(ct).decode('utf-8'),
+    }
+
+
+def is_session_message(body: dict) -> bool:
+    return isinstance(body, dict) and "session_id" in body
+
+
+class NodeSessionManager:
+    """
+    Ctrl 侧：按机器维护当前会话。
+
+    acquire() 返回 (当前可用会话, 待握手的新会话)：需要轮换时只有一个线程拿到待握手会话，
+    其余线程继续使用旧会话（未过期时）或本条消息退回 RSA 报文，不会在握手上排队等待。
+    握手方发送 handshake_payload 后必须调用 complete()。
+    """
+
+    def __init__(self, ttl: float = 600.0, retry_seconds: float = 300.0):
+        self.ttl = float(ttl)
+        self.retry_seconds = float(retry_seconds)
+        # 剩余有效期少于该值时开始轮换，轮换期间旧会话仍可使用
+        self.rotate_margin = self.ttl / 10
+        self._lock = threading.Lock()
+        self._sessions: dict[str, SessionKey] = {}
+        self._handshaking: set[str] = set()
+        # 握手失败（旧版 Node / 不可达）后的退避截止时间，期间直接使用 RSA 报文
+        self._retry_after: dict[str, float] = {}
+        self.handshakes = 0
+        self.handshake_failures = 0
+        self.session_messages = 0
+        self.fallbacks = 0
+        self.rejections = 0
+
+    def acquire(self, machine_ip: str) -> tuple[SessionKey | None, SessionKey | None]:
+        with self._lock:
+            current = self._sessions.get(machine_ip)
+            if current is not None and not current.usable():
+                self._sessions.pop(machine_ip, None)
+                current = None
+            if current is not None and current.usable(self.rotate_margin):
+                return current, None
+            pending = None
+            if machine_ip not in self._handshaking and time.time() >= self._retry_after.get(machine_ip, 0):
+                self._handshaking.add(machine_ip)
+                pending = SessionKey.generate(self.ttl)
+            return current, pending
+
+    def complete(self, machine_ip: str, pending: SessionKey, res: dict | None) -> SessionKey | None:
+        """记录握手结果：成功时安装新会话并返回，失败时进入退避并返回 None。"""
+        ok = isinstance(res, dict) and res.get('success') in (1, True) and 'error' not in res
+        with self._lock:
+            self._handshaking.discard(machine_ip)
+            if ok:
+                self.handshakes += 1
+                self._sessions[machine_ip] = pending
+                self._retry_after.pop(machine_ip, None)
+                return pending
+            self.handshake_failures += 1
+            self._retry_after[machine_ip] = time.time() + self.retry_seconds
+        if isinstance(res, dict) and res.get('status_code') == 404 and not res.get('error_reason'):
+            print(f"[node-session] node {machine_ip} has no session endpoint, using RSA envelope")
+        else:
+            print(f"[node-session] handshake with {machine_ip} failed: {res}")
+        return None
+
+    def note_sent(self, via_session: bool) -> None:
+        with self._lock:
+            if via_session:
+                self.session_messages += 1
+            else:
+                self.fallbacks += 1
+
+    def invalidate(self, machine_ip: str, session: SessionKey | None = None) -> None:
+        """Node 拒绝会话（重启后丢失会话等）时丢弃；下一条消息会重新握手。"""
+        with self._lock:
+            current = self._sessions.get(machine_ip)
+            if current is not None and (session is None or current is session):
+                self._sessions.pop(machine_ip, None)
+            if session is not None:
+                self.rejections += 1
+
+    @staticmethod
+    def is_rejected(res: dict) -> bool:
+        return isinstance(res, dict) and res.get('error_reason') in SESSION_REJECT_REASONS
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+            self._handshaking.clear()
+            self._retry_after.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "handshakes": self.handshakes,
+                "handshake_failures": self.handshake_failures,
+                "session_messages": self.session_messages,
+                "fallbacks": self.fallbacks,
+                "rejections": self.rejections,
+            }
+
+
+class NodeSessionStore:
+    """
+    Node 侧（接收方）：保存 Ctrl 下发的会话密钥并校验会话消息。
+    /session_handshake 在 get_verified_msg 校验通过后调用 accept_handshake；
+    其他接口收到 is_session_message(body) 的请求体时调用 open 代替 get_verified_msg。
+
+    握手防重放：issued_at 早于 max_handshake_age 或晚于当前时间（均允许 max_clock_skew 偏差）的握手被拒绝；
+    已知的 session_id 不会被重新安装。会话过期后记录保留为墓碑，直到该会话的握手本身也已过期，
+    因此任何仍能通过时间校验的重放都会命中已知 session_id。
+    """
+
+    def __init__(self, replay_window: int = 4096, grace_seconds: float = 5.0,
+                 max_handshake_age: float = 60.0, max_clock_skew: float = 30.0):
+        self.replay_window = int(replay_window)
+        self.grace_seconds = float(grace_seconds)
+        self.max_handshake_age = float(max_handshake_age)
+        self.max_clock_skew = float(max_clock_skew)
+        self._lock = threading.Lock()
+        # session_id -> [key, expires_at, max_counter, recent counters, retain_until]
+        self._sessions: dict[str, list] = {}
+
+    def accept_handshake(self, verified_msg: dict) -> bool:
+        config = (verified_msg or {}).get("config") or {}
+        try:
+            session_id = str(config["session_id"])
+            key = base64.b64decode(config["session_key"])
+            ttl = float(config.get("ttl") or 0)
+            issued_at = float(config["issued_at"])
+            expires_at = float(config.get("expires_at") or issued_at + ttl)
+        except Exception:
+            return False
+        if len(key) not in (16, 24, 32) or ttl <= 0:
+            return False
+        now = time.time()
+        if issued_at > now + self.max_clock_skew or issued_at < now - self.max_handshake_age - self.max_clock_skew:
+            print(f"[node-session] rejected stale handshake {session_id} (issued_at={issued_at:.0f}, now={now:.0f})")
+            return False
+        expiry = min(now + ttl, expires_at + self.max_clock_skew) + self.grace_seconds
+        if expiry <= now:
+            return False
+        # 墓碑保留到该握手在时间校验上也不再可能被接受
+        retain_until = max(expiry, issued_at + self.max_handshake_age + 2 * self.max_clock_skew)
+        with self._lock:
+            for sid in [s for s, v in self._sessions.items() if v[4] < now]:
+                self._sessions.pop(sid, None)
+            if session_id in self._sessions:
+                print(f"[node-session] rejected handshake for known session {session_id}")
+                return False
+            self._sessions[session_id] = [key, expiry, 0, set(), retain_until]
+        return True
+
+    def open(self, body: dict) -> dict:
+        """解密并校验会话消息，返回消息 dict；失败时抛出 SessionError。"""
+        session_id = str(body.get("session_id") or "")
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            # 过期的会话保留为墓碑（由 accept_handshake 清理），这里只拒绝
+            if entry is None or entry[1] < time.time():
+                raise SessionError("unknown or expired session", reason="invalid_session")
+            key = entry[0]
+        try:
+            nonce = base64.b64decode(body.get("nonce") or "")
+            ct = base64.b64decode(body.get("message") or "")
+            plaintext = AESGCM(key).decrypt(nonce, ct, session_id.encode())
+        except Exception as e:
+            raise SessionError(f"session message authentication failed: {e!r}", reason="invalid_signature") from e
+        counter = int.from_bytes(nonce[4:], "big")
+        with self._lock:
+            max_counter, seen = entry[2], entry[3]
+            if counter <= max_counter - self.replay_window or counter in seen:
+                raise SessionError("replayed session message", reason="invalid_signature")
+            seen.add(counter)
+            if counter > max_counter:
+                entry[2] = counter
+                floor = counter - self.replay_window
+                if len(seen) > 2 * self.replay_window:
+                    entry[3] = {c for c in seen if c > floor}
+        try:
+            return json.loads(plaintext.decode('utf-8'))
+        except ValueError as e:
+            raise SessionError("invalid session payload", reason="invalid_json") from e
@@ -0,0 +1,314 @@
+"""Ctrl -> Node 通信传输层。
+
+所有发往 Node（`http://<ip>:5789/api/...`）的请求统一经过这里：
+每台机器复用一个 keep-alive 连接池，连接失败按退避策略重试。
+开启 NODE_SESSION_ENABLED 后，send_to_node 优先走会话密钥通道（见 node_session），RSA 报文作为回退。
+同一台机器的多条命令通过 send_batch_to_node 合并到 /batch 接口，一次签名、一次 POST。
+"""
+
+import json
+import time
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ..config import CommsConfig, KeyConfig
+from .CheckKeys import RSA_PSS_SHA256, signature, encryption
+from .node_session import (
+    HANDSHAKE_ENDPOINT, NodeSessionManager, SessionKey, handshake_payload, seal_session_message,
+)
+
+
+def node_url(machine_ip: str, endpoint: str) -> str:
+    return f"http://{machine_ip}{CommsConfig.NODE_URL_MIDDLE}{endpoint}"
+
+
+def build_envelope(ciphertext: bytes, sig: bytes, suite: str | None = None) -> dict:
+    """
+    Ctrl -> Node 请求体：密文与签名均为 base64。同步/异步传输共用。
+    非默认签名套件时附带 sig_suite；RSA-PSS 报文不带该字段，与旧版 Node 完全兼容。
+    """
+    body = {
+        "message": base64.b64encode(ciphertext).decode('utf-8'),
+        "signature": base64.b64encode(sig).decode('utf-8'),
+    }
+    suite = suite or KeyConfig.SIGNATURE_SUITE
+    if suite != RSA_PSS_SHA256:
+        body["sig_suite"] = suite
+    return body
+
+
+def sign_payload(payload: dict) -> tuple[bytes, bytes]:
+    """对 payload 做签名 + 加密，返回 (密文, 签名)。"""
+    body = json.dumps(payload)
+    return encryption(body), signature(body)
+
+
+def parse_node_response(status_code: int, text: str) -> dict:
+    """
+    解析 Node 响应：优先 JSON 并补充 status_code（4xx/5xx 也保留 body 中的 error_reason），
+    非 JSON 时返回 {"status_code", "text"}。
+    """
+    try:
+        j = json.loads(text)
+    except ValueError:
+        return {"status_code": status_code, "text": text}
+    if isinstance(j, dict):
+        j.setdefault('status_code', status_code)
+    return j
+
+
+class NodeTransport:
+    """
+    按机器（host:port）维护 requests.Session 连接池。
+
+    Retry 只覆盖连接阶段的失败：此时请求尚未到达 Node，重试是安全的；
+    读超时等“可能已执行”的失败不会被自动重放，幂等调用方可通过 attempts 显式重试。
+    """
+
+    def __init__(self, pool_maxsize: int = 8, retry_total: int = 2, backoff_factor: float = 0.25):
+        self.pool_maxsize = max(1, int(pool_maxsize))
+        self.retry_total = max(0, int(retry_total))
+        self.backoff_factor = float(backoff_factor)
+        self._sessions: dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def _new_session(self) -> requests.Session:
+        retry = Retry(
+            total=self.retry_total,
+            connect=self.retry_total,
+            read=0,
+            status=0,
+            redirect=0,
+            other=0,
+            backoff_factor=self.backoff_factor,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize,
+                              max_retries=retry, pool_block=False)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def session_for(self, url: str) -> requests.Session:
+        key = urlsplit(url).netloc
+        session = self._sessions.get(key)
+        if session is not None:
+            return session
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._new_session()
+                self._sessions[key] = session
+            return session
+
+    def post(self, url: str, body: dict, timeout: float = 5.0) -> requests.Response:
+        return self.session_for(url).post(url, json=body, timeout=timeout)
+
+    def send(self, url: str, ciphertext: bytes, sig: bytes, timeout: float = 5.0, attempts: int = 1) -> dict:
+        """
+        发送已签名加密的报文，返回解析后的响应（优先 JSON，并补充 status_code）；
+        网络层错误返回 {"error": ...}。
+        """
+        return self.send_body(url, build_envelope(ciphertext, sig), timeout=timeout, attempts=attempts)
+
+    def send_body(self, url: str, body: dict | Callable[[], dict], timeout: float = 5.0, attempts: int = 1) -> dict:
+        """发送任意请求体；body 为可调用对象时每次尝试重新生成（会话消息每次重发都要换 nonce）。"""
+        last_exc = None
+        for attempt in range(max(1, attempts)):
+            try:
+                resp = self.post(url, body() if callable(body) else body, timeout=timeout)
+            except requests.RequestException as e:
+                last_exc = e
+                print(f"Request error (attempt {attempt+1}) to {url}: {e}")
+                if attempt + 1 < attempts:
+                    time.sleep(self.backoff_factor * (2 ** attempt))
+                continue
+            # 即使是 4xx/5xx，也优先解析 body 中的 JSON，以保留 Node 返回的 error_reason
+            return parse_node_response(resp.status_code, resp.text)
+        return {"error": str(last_exc) if last_exc is not None else "unknown error"}
+
+    def close(self) -> None:
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for s in sessions:
+            try:
+                s.close()
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pools": len(self._sessions), "pool_maxsize": self.pool_maxsize}
+
+
+node_transport = NodeTransport(
+    pool_maxsize=CommsConfig.NODE_POOL_MAXSIZE,
+    retry_total=CommsConfig.NODE_RETRY_TOTAL,
+    backoff_factor=CommsConfig.NODE_RETRY_BACKOFF,
+)
+
+
+node_sessions = NodeSessionManager(
+    ttl=CommsConfig.NODE_SESSION_TTL,
+    retry_seconds=CommsConfig.NODE_SESSION_RETRY_SECONDS,
+)
+
+
+def _session_for(machine_ip: str, timeout: float) -> SessionKey | None:
+    """返回该机器可用的会话；需要（重新）握手时由当前线程用 RSA 报文完成握手。"""
+    current, pending = node_sessions.acquire(machine_ip)
+    if pending is None:
+        return current
+    res = None
+    try:
+        enc, sig = sign_payload(handshake_payload(pending))
+        res = node_transport.send(node_url(machine_ip, HANDSHAKE_ENDPOINT), enc, sig, timeout=timeout)
+    finally:
+        installed = node_sessions.complete(machine_ip, pending, res)
+    return installed or current
+
+
+def send_to_node(machine_ip: str, endpoint: str, payload: dict, timeout: float = 5.0, attempts: int = 1) -> dict:
+    """对 payload 做签名 + 加密后发送到指定 Node 接口。"""
+    url = node_url(machine_ip, endpoint)
+    if CommsConfig.NODE_SESSION_ENABLED:
+        session = _session_for(machine_ip, timeout)
+        if session is not None:
+            res = node_transport.send_body(url, lambda: seal_session_message(session, payload),
+                                           timeout=timeout, attempts=attempts)
+            if not node_sessions.is_rejected(res):
+                node_sessions.note_sent(True)
+                return res
+            # Node 已不认识该会话（如 Node 重启）：消息未被处理，丢弃会话后用 RSA 报文重发
+            node_sessions.invalidate(machine_ip, session)
+        node_sessions.note_sent(False)
+    enc, sig = sign_payload(payload)
+    return node_transport.send(url, enc, sig, timeout=timeout, attempts=attempts)
+
+
+#######################################
+# 批量报文：{"config": {"commands": [{"endpoint", "payload"}, ...]}} 发往 /batch，
+# Node 返回 {"success": 1, "results": [...]}，results 与 commands 一一对应，
+# 每一项即对应接口单独调用时的响应（含各自的 status_code / error_reason）。
+
+BATCH_ENDPOINT = "/batch"
+
+# 只读接口；批量中只要含有其它（会改变 Node 状态的）命令，就按 NODE_BATCH_MAX_MUTATING_COMMANDS 分块
+READ_ONLY_ENDPOINTS = frozenset({
+    "/machine_status", "/container_status", "/containers_status", "/container_last_ssh_time",
+})
+
+# 不支持批量接口的旧版 Node：(machine_ip, endpoint) -> 下次重试时间。
+# 避免每次都先试一次批量接口；NODE_BATCH_RETRY_SECONDS 后重新探测，Node 升级后无需重启 Ctrl 即可恢复批量
+_batch_unsupported_lock = threading.Lock()
+_batch_unsupported_until: dict[tuple[str, str], float] = {}
+
+
+def is_batch_unsupported(machine_ip: str, endpoint: str = BATCH_ENDPOINT) -> bool:
+    with _batch_unsupported_lock:
+        until = _batch_unsupported_until.get((machine_ip, endpoint))
+        if until is None:
+            return False
+        if time.time() >= until:
+            _batch_unsupported_until.pop((machine_ip, endpoint), None)
+            return False
+        return True
+
+
+def mark_batch_unsupported(machine_ip: str, endpoint: str = BATCH_ENDPOINT) -> None:
+    with _batch_unsupported_lock:
+        _batch_unsupported_until[(machine_ip, endpoint)] = time.time() + CommsConfig.NODE_BATCH_RETRY_SECONDS
+
+
+def clear_batch_unsupported() -> None:
+    with _batch_unsupported_lock:
+        _batch_unsupported_until.clear()
+
+
+def batch_chunk_size(commands: list[tuple[str, dict]]) -> int:
+    """只读命令按 NODE_BATCH_MAX_COMMANDS 分块；含有写操作时用更小的块，单个块失败/超时影响的命令更少。"""
+    if all(endpoint in READ_ONLY_ENDPOINTS for endpoint, _ in commands):
+        return max(1, CommsConfig.NODE_BATCH_MAX_COMMANDS)
+    return max(1, min(CommsConfig.NODE_BATCH_MAX_COMMANDS, CommsConfig.NODE_BATCH_MAX_MUTATING_COMMANDS))
+
+
+def batch_timeout(timeout: float, n: int) -> float:
+    """/batch 请求的超时随块大小增长：Node 逐条执行块内命令，单条命令的超时不够整个块用。"""
+    return max(timeout, CommsConfig.NODE_BATCH_TIMEOUT_PER_COMMAND * n)
+
+
+def batch_payload(commands: list[tuple[str, dict]]) -> dict:
+    return {"config": {"commands": [{"endpoint": endpoint, "payload": payload} for endpoint, payload in commands]}}
+
+
+def split_batch_response(res: dict, n: int) -> list[dict] | None:
+    """
+    把 /batch 响应拆成 n 个单条结果；Node 没有 /batch 接口（404 且无 error_reason）时返回 None。
+    整个批量请求失败（网络错误、格式不符）时每条命令都得到同一个错误。
+    """
+    if isinstance(res, dict) and res.get('status_code') == 404 and not res.get('error_reason'):
+        return None
+    if not isinstance(res, dict) or 'error' in res:
+        err = res.get('error') if isinstance(res, dict) else f"unexpected response: {res}"
+        return [{"error": err} for _ in range(n)]
+    results = res.get('results')
+    if not isinstance(results, list) or len(results) != n:
+        return [{"error": f"unexpected batch response: {res}"} for _ in range(n)]
+    return [dict(item) if isinstance(item, dict) else {"error": f"unexpected response: {item}"} for item in results]
+
+
+def _chunks(commands: list, size: int):
+    size = max(1, int(size))
+    for i in range(0, len(commands), size):
+        yield commands[i:i + size]
+
+
+def _send_each(machine_ip: str, commands: list[tuple[str, dict]], timeout: float, attempts: int) -> list[dict]:
+    """逐条发送（旧版 Node 回退路径），按连接池大小并发。"""
+    def _one(cmd):
+        try:
+            return send_to_node(machine_ip, cmd[0], cmd[1], timeout=timeout, attempts=attempts)
+        except Exception as e:
+            return {"error": str(e)}
+    if len(commands) == 1:
+        return [_one(commands[0])]
+    with ThreadPoolExecutor(max_workers=min(len(commands), CommsConfig.NODE_POOL_MAXSIZE),
+                            thread_name_prefix="node-batch-fallback") as executor:
+        return list(executor.map(_one, commands))
+
+
+def send_batch_to_node(machine_ip: str, commands: list[tuple[str, dict]], timeout: float = 5.0,
+                       attempts: int = 1) -> list[dict]:
+    """
+    向同一台机器发送多条命令 [(endpoint, payload), ...]，返回与输入顺序一致的结果列表。
+    多于一条时合并为 /batch 请求（按 batch_chunk_size 分块），只签名/加密一次；
+    timeout 为单条命令的超时，/batch 请求按 batch_timeout 放宽。
+    """
+    if not commands:
+        return []
+    if len(commands) == 1 or not CommsConfig.NODE_BATCH_ENABLED or is_batch_unsupported(machine_ip):
+        return _send_each(machine_ip, commands, timeout, attempts)
+    out: list[dict] = []
+    for chunk in _chunks(commands, batch_chunk_size(commands)):
+        if is_batch_unsupported(machine_ip):
+            out.extend(_send_each(machine_ip, chunk, timeout, attempts))
+            continue
+        res = send_to_node(machine_ip, BATCH_ENDPOINT, batch_payload(chunk),
+                           timeout=batch_timeout(timeout, len(chunk)), attempts=attempts)
+        results = split_batch_response(res, len(chunk))
+        if results is None:
+            print(f"send_batch_to_node: node {machine_ip} has no batch endpoint, falling back")
+            mark_batch_unsupported(machine_ip)
+            results = _send_each(machine_ip, chunk, timeout, attempts)
+        out.extend(results)
+    return out
+
@@ -0,0 +1,203 @@
+import threading
+import time
+from bisect import bisect_right
+from typing import Callable, Iterable
+
+# 容器 SSH 端口范围 (1024-49151)
+PORT_START = 1024
+PORT_END = 49151
+
+
+class FreePortIntervals:
+    """
+    单台机器的空闲端口集合，用有序、互不相交的闭区间 [start, end] 表示。
+    - 取最小空闲端口：O(1)
+    - 释放任意端口：二分定位 O(log n) + 相邻区间合并
+    端口基本连续分配时区间数量很少，内存占用与已用端口数无关。
+    """
+
+    def __init__(self, used: Iterable[int] = (), start: int = PORT_START, end: int = PORT_END):
+        self.start = start
+        self.end = end
+        self._starts: list[int] = []
+        self._ends: list[int] = []
+        cursor = start
+        for p in sorted({int(p) for p in used if start <= int(p) <= end}):
+            if p > cursor:
+                self._starts.append(cursor)
+                self._ends.append(p - 1)
+            cursor = p + 1
+        if cursor <= end:
+            self._starts.append(cursor)
+            self._ends.append(end)
+
+    def __len__(self) -> int:
+        return sum(e - s + 1 for s, e in zip(self._starts, self._ends))
+
+    def intervals(self) -> list[tuple[int, int]]:
+        return list(zip(self._starts, self._ends))
+
+    def is_free(self, port: int) -> bool:
+        i = bisect_right(self._starts, port) - 1
+        return i >= 0 and port <= self._ends[i]
+
+    def pop_lowest(self) -> int | None:
+        if not self._starts:
+            return None
+        port = self._starts[0]
+        if port == self._ends[0]:
+            del self._starts[0]
+            del self._ends[0]
+        else:
+            self._starts[0] = port + 1
+        return port
+
+    def release(self, port: int) -> bool:
+        """归还端口并与相邻区间合并；端口越界或本就空闲时返回 False。"""
+        if not (self.start <= port <= self.end):
+            return False
+        i = bisect_right(self._starts, port)
+        if i > 0 and port <= self._ends[i - 1]:
+            return False
+        join_left = i > 0 and self._ends[i - 1] == port - 1
+        join_right = i < len(self._starts) and self._starts[i] == port + 1
+        if join_left and join_right:
+            self._ends[i - 1] = self._ends[i]
+            del self._starts[i]
+            del self._ends[i]
+        elif join_left:
+            self._ends[i - 1] = port
+        elif join_right:
+            self._starts[i] = port
+        else:
+            self._starts.insert(i, port)
+            self._ends.insert(i, port)
+        return True
+
+
+class PortAllocator:
+    """
+    按机器维护空闲端口区间，分配在锁内原子完成，避免并发创建容器拿到同一端口。
+
+    每台机器首次使用时通过 loader(machine_id) 从数据库重建；之后每隔 resync_seconds
+    重新对账一次。已分配但尚未写入数据库的端口记为 pending，对账时仍视为占用，
+    直到 confirm()/release()。
+
+    缓存只对本进程准确：多进程部署时其它 worker 落库的端口在下次对账前仍会出现在空闲区间里，
+    因此传入 is_taken(machine_id, port) 时，每个弹出的端口都会先到数据库核对，已被占用则跳过。
+    """
+
+    # 连续命中多少个已被占用的端口后强制重建该机器的区间
+    REBUILD_AFTER_TAKEN = 3
+    # 单次 reserve 最多核对的端口数
+    MAX_PROBES = 16
+
+    def __init__(self, loader: Callable[[int], Iterable[int]], resync_seconds: float = 300.0,
+                 start: int = PORT_START, end: int = PORT_END,
+                 is_taken: Callable[[int, int], bool] | None = None):
+        self._loader = loader
+        self._is_taken = is_taken
+        self.resync_seconds = resync_seconds
+        self.start = start
+        self.end = end
+        self._lock = threading.Lock()
+        self._load_locks: dict[int, threading.Lock] = {}
+        self._free: dict[int, FreePortIntervals] = {}
+        self._pending: dict[int, set[int]] = {}
+        self._loaded_at: dict[int, float] = {}
+
+    def _stale(self, machine_id: int) -> bool:
+        loaded = self._loaded_at.get(machine_id)
+        return loaded is None or bool(self.resync_seconds and time.time() - loaded > self.resync_seconds)
+
+    def _ensure(self, machine_id: int) -> None:
+        """必要时从数据库重建。查询不持有全局锁，同一台机器同时只有一个线程查询。"""
+        with self._lock:
+            if not self._stale(machine_id):
+                return
+            load_lock = self._load_locks.setdefault(machine_id, threading.Lock())
+        with load_lock:
+            with self._lock:
+                if not self._stale(machine_id):
+                    return
+            used = set(int(p) for p in self._loader(machine_id) if p is not None)
+            with self._lock:
+                used |= self._pending.get(machine_id, set())
+                self._free[machine_id] = FreePortIntervals(used, self.start, self.end)
+                self._loaded_at[machine_id] = time.time()
+
+    def _pop(self, machine_id: int) -> int | None:
+        """弹出最小空闲端口并记为 pending；区间刚被 rebuild 丢弃时返回 None，由调用方重试。"""
+        with self._lock:
+            free = self._free.get(machine_id)
+            if free is None:
+                return None
+            port = free.pop_lowest()
+            if port is None:
+                raise RuntimeError(f"No free ports available on machine {machine_id}")
+            self._pending.setdefault(machine_id, set()).add(port)
+            return port
+
+    def reserve(self, machine_id: int) -> int:
+        taken = 0
+        for _ in range(self.MAX_PROBES):
+            self._ensure(machine_id)
+            port = self._pop(machine_id)
+            if port is None:
+                continue
+            if self._is_taken is None or not self._is_taken(machine_id, port):
+                return port
+            # 其它进程已落库：移出 pending，且不放回空闲区间
+            print(f"[port_allocator] port {port} on machine {machine_id} already in use, skipping")
+            with self._lock:
+                self._pending.get(machine_id, set()).discard(port)
+            taken += 1
+            if taken % self.REBUILD_AFTER_TAKEN == 0:
+                self.rebuild(machine_id)
+        raise RuntimeError(f"Could not reserve a free port on machine {machine_id} after {self.MAX_PROBES} attempts")
+
+    def confirm(self, machine_id: int, port: int) -> None:
+        """端口已随容器记录落库，不再需要 pending 保护。"""
+        with self._lock:
+            self._pending.get(machine_id, set()).discard(port)
+
+    def release(self, machine_id: int, port: int | None) -> None:
+        """容器被删除时归还端口。"""
+        if port is None:
+            return
+        with self._lock:
+            self._pending.get(machine_id, set()).discard(port)
+            free = self._free.get(machine_id)
+            if free is not None:
+                free.release(int(port))
+
+    def abandon(self, machine_id: int, port: int | None) -> None:
+        """创建失败时归还端口；已 confirm（容器记录已落库）的端口保持占用。"""
+        if port is None:
+            return
+        with self._lock:
+            pending = self._pending.get(machine_id, set())
+            if port not in pending:
+                return
+            pending.discard(port)
+            free = self._free.get(machine_id)
+            if free is not None:
+                free.release(int(port))
+
+    def rebuild(self, machine_id: int | None = None) -> None:
+        """丢弃缓存，下次分配时从数据库重建（None 表示全部机器）。"""
+        with self._lock:
+            if machine_id is None:
+                self._loaded_at.clear()
+                self._free.clear()
+            else:
+                self._loaded_at.pop(machine_id, None)
+                self._free.pop(machine_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "machines": len(self._free),
+                "pending": sum(len(v) for v in self._pending.values()),
+                "intervals": {mid: len(f.intervals()) for mid, f in self._free.items()},
+            }
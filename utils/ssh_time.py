@@ -0,0 +1,52 @@
+import re
+from datetime import datetime, timezone
+
+MONTH_ABBR_TO_NUM = {
+    "Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
+    "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12,
+}
+
+_MON_DAY_TIME_RE = re.compile(r"\b([A-Z][a-z]{2})\s+(\d{1,2})\s+(\d{2}:\d{2}(?::\d{2})?)\b")
+
+
+def parse_last_ssh_time(raw: str | None) -> datetime | None:
+    """
+    尝试把 Node 返回的 last ssh 时间解析为 datetime（naive UTC）。
+    支持：
+    - ISO/常见 datetime 字符串
+    - syslog 风格：`Mar 20 12:34:56 ...`
+    - `last` 输出中的日期片段：`Fri Mar 20 12:34 ...`
+    """
+    if not raw:
+        return None
+    s = str(raw).strip()
+    if not s:
+        return None
+
+    # 1) 直接尝试 fromisoformat / 通用格式
+    try:
+        v = datetime.fromisoformat(s.replace("Z", "+00:00"))
+        # 带时区的时间统一换算为 naive UTC，便于与 utcnow() 比较及落库
+        if v.tzinfo is not None:
+            v = v.astimezone(timezone.utc).replace(tzinfo=None)
+        return v
+    except Exception:
+        pass
+
+    # 2) 提取 "Mon DD HH:MM[:SS]" 片段（无年份时使用当前年）
+    m = _MON_DAY_TIME_RE.search(s)
+    if not m:
+        return None
+    mon = MONTH_ABBR_TO_NUM.get(m.group(1))
+    if not mon:
+        return None
+    day = int(m.group(2))
+    parts = m.group(3).split(":")
+    hour = int(parts[0])
+    minute = int(parts[1])
+    second = int(parts[2]) if len(parts) > 2 else 0
+    now = datetime.utcnow()
+    try:
+        return datetime(now.year, mon, day, hour, minute, second)
+    except Exception:
+        return None
@@ -0,0 +1,191 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from ..config import CommsConfig
+
+
+class _Flight:
+    """一次在途的 Node 探测；其它请求同一 key 的线程等待它的结果而不是重复探测。"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: dict | None = None
+
+
+class ContainerStatusCache:
+    """
+    (machine_id, container_name) -> Node 返回的 /container_status 结果，带短 TTL。
+    - 详情、列表接口与心跳共享同一份缓存，心跳轮询结果顺带写入
+    - 同一个 key 同时只有一个探测在途（single-flight），并发请求共享结果
+    - 只缓存成功的结果（含 404），网络错误不入缓存
+    这样 Node 流量只与容器数量相关，与同时查看页面的用户数量无关。
+    """
+
+    def __init__(self, ttl: float = 5.0, max_workers: int = 4):
+        self.ttl = ttl
+        self.max_workers = max(1, int(max_workers))
+        self._lock = threading.Lock()
+        self._entries: dict[tuple[int, str], tuple[float, dict]] = {}
+        self._inflight: dict[tuple[int, str], _Flight] = {}
+        self._executor: ThreadPoolExecutor | None = None
+        self._hits = 0
+        self._misses = 0
+        self._probes = 0
+        self._shared = 0
+        self._heartbeat_updates = 0
+
+    @staticmethod
+    def _cacheable(result) -> bool:
+        return isinstance(result, dict) and (not result.get('error') or result.get('status_code') == 404)
+
+    def _fresh(self, key: tuple[int, str]) -> dict | None:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        if item[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        return item[1]
+
+    def get(self, machine_id: int, container_name: str) -> dict | None:
+        """只读缓存，不触发探测；过期或缺失返回 None。"""
+        with self._lock:
+            st = self._fresh((machine_id, container_name))
+            if st is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+            return st
+
+    def put(self, machine_id: int, container_name: str, result: dict, *, from_heartbeat: bool = False) -> None:
+        if not self._cacheable(result):
+            return
+        with self._lock:
+            self._entries[(machine_id, container_name)] = (time.monotonic() + self.ttl, result)
+            if from_heartbeat:
+                self._heartbeat_updates += 1
+
+    def invalidate(self, machine_id: int, container_name: str | None = None) -> None:
+        """container_name 为 None 时清除整台机器的缓存。"""
+        with self._lock:
+            if container_name is not None:
+                self._entries.pop((machine_id, container_name), None)
+                return
+            for key in [k for k in self._entries if k[0] == machine_id]:
+                del self._entries[key]
+
+    def _land(self, key: tuple[int, str], flight: _Flight, result: dict | None) -> None:
+        flight.result = result
+        with self._lock:
+            if self._cacheable(result):
+                self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._inflight.pop(key, None)
+        flight.done.set()
+
+    def get_many(self, machine_id: int, container_names: Iterable[str],
+                 fetch_many: Callable[[list[str]], dict[str, dict]], timeout: float = 10.0) -> dict[str, dict]:
+        """
+        同一台机器上一批容器的状态：新鲜的直接取缓存；缺失的由当前线程用 fetch_many 一次批量探测；
+        已被其它线程在探测的 key 等待其结果。探测失败的容器不出现在返回值中。
+        """
+        names = list(dict.fromkeys(n for n in container_names if n))
+        out: dict[str, dict] = {}
+        mine: dict[str, _Flight] = {}
+        waiting: dict[str, _Flight] = {}
+        with self._lock:
+            for name in names:
+                key = (machine_id, name)
+                st = self._fresh(key)
+                if st is not None:
+                    self._hits += 1
+                    out[name] = st
+                    continue
+                self._misses += 1
+                flight = self._inflight.get(key)
+                if flight is not None:
+                    self._shared += 1
+                    waiting[name] = flight
+                else:
+                    flight = _Flight()
+                    self._inflight[key] = flight
+                    mine[name] = flight
+            if mine:
+                self._probes += 1
+
+        if mine:
+            results: dict[str, dict] = {}
+            try:
+                results = fetch_many(list(mine)) or {}
+            except Exception as e:
+                print(f"[status-cache] probe failed for machine_id={machine_id}: {e}")
+            finally:
+                for name, flight in mine.items():
+                    self._land((machine_id, name), flight, results.get(name))
+            for name in mine:
+                if isinstance(results.get(name), dict):
+                    out[name] = results[name]
+
+        for name, flight in waiting.items():
+            if flight.done.wait(timeout) and isinstance(flight.result, dict):
+                out[name] = flight.result
+        return out
+
+    def get_or_probe(self, machine_id: int, container_name: str,
+                     fetch: Callable[[], dict], timeout: float = 10.0) -> dict | None:
+        """单个容器的 single-flight 读取：缓存命中直接返回，否则探测一次（或等待在途探测）。"""
+        return self.get_many(
+            machine_id, [container_name], lambda names: {container_name: fetch()}, timeout=timeout,
+        ).get(container_name)
+
+    def refresh_async(self, machine_id: int, container_name: str, fetch: Callable[[], dict]) -> bool:
+        """在后台调用 fetch() 并回填缓存；已有在途探测时返回 False。"""
+        key = (machine_id, container_name)
+        with self._lock:
+            if key in self._inflight:
+                self._shared += 1
+                return False
+            flight = _Flight()
+            self._inflight[key] = flight
+            self._probes += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="status-probe")
+            executor = self._executor
+
+        def _run():
+            result = None
+            try:
+                result = fetch()
+            except Exception as e:
+                print(f"[status-cache] probe failed for {container_name}@{machine_id}: {e}")
+            finally:
+                self._land(key, flight, result)
+
+        executor.submit(_run)
+        return True
+
+    def drain(self) -> None:
+        """等待所有后台刷新完成并回填缓存（测试、优雅退出）；之后的 refresh_async 会重新创建线程池。"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "inflight": len(self._inflight),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits / lookups) if lookups else 0.0,
+                "probes": self._probes,
+                "shared_probes": self._shared,
+                "heartbeat_updates": self._heartbeat_updates,
+                "ttl": self.ttl,
+            }
+
+
+container_status_cache = ContainerStatusCache(ttl=CommsConfig.CONTAINER_STATUS_TTL)